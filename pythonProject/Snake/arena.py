@@ -0,0 +1,387 @@
+import argparse
+import time
+
+import numpy as np
+from state_encoding import direction_octants, encode_state
+
+
+class SnakeArena:
+    """
+    多蛇竞技场：num_snakes 条蛇在同一个棋盘上同时移动，争夺 num_food 个食物并躲避 num_poison 个毒药。
+    所有蛇身、食物和毒药共用一张占用索引 cell_owner（按格子编号 y * grid_size + x）：
+    EMPTY 表示空格，>= 0 为占据该格的蛇的编号，<= ITEM_BASE 为物品（槽位 ITEM_BASE - 值，前 num_food 个槽位是食物）。
+    step(actions) 一次处理所有蛇：撞墙、撞到任何蛇身（含尾部，与 SnakeGame 相同）只需按新蛇头查一次 cell_owner，
+    蛇头相撞（多个新蛇头落在同一格，双方都死）由一次 np.unique 判定，不遍历任何一条蛇的身体。
+    每条蛇的观察与 SnakeGame 相同：14 维状态（食物/毒药取曼哈顿距离最近的一个，其他蛇的身体算作障碍），
+    discrete_state=True 时为 QLAgent 的离散状态键。奖励与 SnakeGame.step 相同。
+    物品没有生命周期，被吃掉后立即在随机空格重新放置；没有空格时暂时消失，之后每一步重试。
+    respawn=True 时死亡的蛇在同一步内于随机空位重生（长度 3），找不到空位的之后每一步重试；
+    否则留在场外（alive 为 False，观察与奖励为 0）。
+    max_length: 蛇身的最大长度，默认 grid_size * grid_size；达到后吃东西不再变长。
+    蛇身环形缓冲区从 INITIAL_CAPACITY 开始，有蛇长到缓冲区大小时加倍（不超过 max_length）
+    """
+    # 动作 0-3 对应 上、下、左、右（与 SnakeGame.step 的 action_map 相同）
+    ACTION_DX = np.array([0, 0, -1, 1], dtype=np.int64)
+    ACTION_DY = np.array([-1, 1, 0, 0], dtype=np.int64)
+    # 射线方向顺序与 SnakeGame._get_state 中的 dirs 相同：右、左、下、上
+    RAY_DIRS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+    _RAY_X = (np.array([d[0] for d in RAY_DIRS])[:, None] * np.arange(1, 4))[:, :, None]
+    _RAY_Y = (np.array([d[1] for d in RAY_DIRS])[:, None] * np.arange(1, 4))[:, :, None]
+    EMPTY = -1
+    ITEM_BASE = -2
+    # final_cause 的取值：撞墙、撞到自身、撞到其他蛇的身体、蛇头相撞
+    CAUSE_WALL = 0
+    CAUSE_SELF = 1
+    CAUSE_BODY = 2
+    CAUSE_HEAD = 3
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, num_snakes=32, grid_size=64, num_food=16, num_poison=0, respawn=True,
+                 max_length=None, seed=None, discrete_state=False):
+        if num_food < 1:
+            raise ValueError("竞技场至少需要一个食物")
+        self.num_snakes = num_snakes
+        self.grid_size = grid_size
+        self.num_cells = grid_size * grid_size
+        self.num_food = num_food
+        self.num_poison = num_poison
+        self.respawn = respawn
+        self.max_length = self.num_cells if max_length is None else max_length
+        self.discrete_state = discrete_state
+        self.rng = np.random.default_rng(seed)
+
+        n = num_snakes
+        self.cell_owner = np.full(self.num_cells, self.EMPTY, dtype=np.int32)
+        # 蛇身：环形缓冲区保存格子编号，head_idx 指向蛇头；缓冲区大小为 body.shape[1]，见 _grow_body
+        self.body = np.zeros((n, min(self.max_length, self.INITIAL_CAPACITY)), dtype=np.int32)
+        self.head_idx = np.zeros(n, dtype=np.int64)
+        self.length = np.zeros(n, dtype=np.int64)
+        self.alive = np.zeros(n, dtype=bool)
+        self.head_x = np.zeros(n, dtype=np.int64)
+        self.head_y = np.zeros(n, dtype=np.int64)
+        self.dir_x = np.zeros(n, dtype=np.int64)
+        self.dir_y = np.zeros(n, dtype=np.int64)
+        # 物品所在的格子编号：前 num_food 个是食物，之后是毒药
+        self.item_cells = np.zeros(num_food + num_poison, dtype=np.int64)
+
+        self.score = np.zeros(n, dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.foods = np.zeros(n, dtype=np.int64)
+        self.prev_food_dist = np.zeros(n, dtype=np.int64)
+        self.ticks = 0
+
+        # 上一次 step 中死亡的蛇在重生前的得分、步数、吃到的食物数和死亡原因
+        self.final_score = np.zeros(n, dtype=np.int64)
+        self.final_steps = np.zeros(n, dtype=np.int64)
+        self.final_foods = np.zeros(n, dtype=np.int64)
+        self.final_cause = np.zeros(n, dtype=np.int8)
+
+        self.reset()
+
+    def reset(self):
+        self.cell_owner[:] = self.EMPTY
+        self.alive[:] = False
+        self.ticks = 0
+        self._spawn(np.arange(self.num_snakes))
+        self._place_items(np.arange(len(self.item_cells)))
+        alive_ids = np.flatnonzero(self.alive)
+        self.prev_food_dist[alive_ids] = self._nearest(alive_ids, self.item_cells[:self.num_food])[2]
+        return self.observe()
+
+    @property
+    def num_alive(self):
+        return int(np.count_nonzero(self.alive))
+
+    def _spawn(self, ids):
+        """
+        把 ids 中的蛇放到随机位置（长度 3，蛇头朝向远离身体的方向）；只使用空格（不覆盖物品），
+        多次尝试都找不到位置的蛇保持死亡（respawn=True 时 step 每一步重试）
+        """
+        g = self.grid_size
+        for i in ids:
+            for _ in range(100):
+                hx, hy = self.rng.integers(0, g, size=2)
+                a = self.rng.integers(0, 4)
+                dx, dy = self.ACTION_DX[a], self.ACTION_DY[a]
+                xs = hx - dx * np.arange(3)
+                ys = hy - dy * np.arange(3)
+                if xs.min() < 0 or xs.max() >= g or ys.min() < 0 or ys.max() >= g:
+                    continue
+                cells = ys * g + xs
+                if (self.cell_owner[cells] != self.EMPTY).any():
+                    continue
+                self.cell_owner[cells] = i
+                self.body[i, :3] = cells
+                self.head_idx[i] = 0
+                self.length[i] = 3
+                self.head_x[i] = hx
+                self.head_y[i] = hy
+                self.dir_x[i] = dx
+                self.dir_y[i] = dy
+                self.alive[i] = True
+                self.score[i] = 0
+                self.steps[i] = 0
+                self.foods[i] = 0
+                break
+
+    def _grow_body(self, min_capacity):
+        """把蛇身缓冲区加倍到至少 min_capacity（不超过 max_length），同时展开环形缓冲区（head_idx 归零）"""
+        capacity = self.body.shape[1]
+        new_capacity = capacity
+        while new_capacity < min_capacity:
+            new_capacity *= 2
+        new_capacity = min(new_capacity, self.max_length)
+        body = np.zeros((self.num_snakes, new_capacity), dtype=np.int32)
+        pos = (self.head_idx[:, None] + np.arange(capacity)) % capacity
+        body[:, :capacity] = np.take_along_axis(self.body, pos, axis=1)
+        self.body = body
+        self.head_idx[:] = 0
+
+    def _place_items(self, slots):
+        """把 slots 中的物品放到随机空格（拒绝采样，棋盘很满时改为从全部空格中选）；没有空格时物品暂时消失"""
+        cells = np.empty(len(slots), dtype=np.int64)
+        pending = np.arange(len(slots))
+        for _ in range(32):
+            if len(pending) == 0:
+                break
+            cand = self.rng.integers(0, self.num_cells, size=len(pending))
+            # 同一批中选到同一格的只保留第一个
+            first = np.zeros(len(cand), dtype=bool)
+            first[np.unique(cand, return_index=True)[1]] = True
+            ok = first & (self.cell_owner[cand] == self.EMPTY)
+            cells[pending[ok]] = cand[ok]
+            self.cell_owner[cand[ok]] = self.ITEM_BASE - slots[pending[ok]]
+            pending = pending[~ok]
+        for k in pending:
+            free = np.flatnonzero(self.cell_owner == self.EMPTY)
+            if len(free) == 0:
+                cells[k] = -1
+                continue
+            cells[k] = free[self.rng.integers(0, len(free))]
+            self.cell_owner[cells[k]] = self.ITEM_BASE - slots[k]
+        self.item_cells[slots] = cells
+
+    def _nearest(self, ids, item_cells):
+        """每条蛇到 item_cells 中最近物品的 (x, y, 曼哈顿距离)；没有可用物品的蛇返回蛇头坐标和距离 -1"""
+        hx, hy = self.head_x[ids], self.head_y[ids]
+        item_cells = item_cells[item_cells >= 0]
+        if len(item_cells) == 0:
+            return hx, hy, np.full(len(hx), -1, dtype=np.int64)
+        ix, iy = item_cells % self.grid_size, item_cells // self.grid_size
+        dist = np.abs(hx[:, None] - ix) + np.abs(hy[:, None] - iy)
+        k = dist.argmin(axis=1)
+        return ix[k], iy[k], dist[np.arange(len(k)), k]
+
+    def observe(self):
+        """所有蛇的当前观察：14 维状态 [N, 14]，或 discrete_state=True 时的离散状态键 [N]；死亡的蛇为 0"""
+        ids = np.nonzero(self.alive)[0]
+        if self.discrete_state:
+            out = np.zeros(self.num_snakes, dtype=np.int64)
+            out[ids] = self._get_state_keys(ids)
+        else:
+            out = np.zeros((self.num_snakes, 14), dtype=np.float32)
+            out[ids] = self._get_states(ids)
+        return out
+
+    def _rays(self, ids):
+        """四个方向（右、左、下、上）的空格数，最多看 3 格；任何蛇的身体都是障碍，物品不是"""
+        g = self.grid_size
+        # 12 个射线格子（4 个方向 × 距离 1-3）一次取出：x、y 的形状为 [4, 3, N]
+        x = self.head_x[ids] + self._RAY_X
+        y = self.head_y[ids] + self._RAY_Y
+        in_bounds = (x >= 0) & (x < g) & (y >= 0) & (y < g)
+        free = in_bounds & (self.cell_owner[np.where(in_bounds, y * g + x, 0)] < 0)
+        # 距离 = 从近到远连续空格的个数
+        return np.cumprod(free, axis=1).sum(axis=1)
+
+    def _get_states(self, ids):
+        g = self.grid_size
+        hx, hy = self.head_x[ids], self.head_y[ids]
+        fx, fy, _ = self._nearest(ids, self.item_cells[:self.num_food])
+        states = np.zeros((len(ids), 14), dtype=np.float32)
+        states[:, 0] = hx / g
+        states[:, 1] = hy / g
+        states[:, 2] = fx / g
+        states[:, 3] = fy / g
+        states[:, 4] = (fx - hx) / g
+        states[:, 5] = (fy - hy) / g
+        states[:, 6:10] = self._rays(ids).T
+
+        px, py, pdist = self._nearest(ids, self.item_cells[self.num_food:])
+        p = pdist >= 0
+        states[:, 10] = p
+        states[:, 11] = np.where(p, (px - hx) / g, 0.0)
+        states[:, 12] = np.where(p, (py - hy) / g, 0.0)
+        states[:, 13] = np.where(p, pdist / (2 * g), 0.0)
+        return states
+
+    def _get_state_keys(self, ids):
+        """与 _get_states 相同的观察直接编码为离散状态键（整数运算，同 SnakeGame._get_state_key）"""
+        g = self.grid_size
+        hx, hy = self.head_x[ids], self.head_y[ids]
+        fx, fy, _ = self._nearest(ids, self.item_cells[:self.num_food])
+        food_dir = direction_octants(fx - hx, fy - hy)
+        rays = self._rays(ids)
+        danger_code = rays[0] | (rays[1] << 2) | (rays[2] << 4) | (rays[3] << 6)
+
+        px, py, pdist = self._nearest(ids, self.item_cells[self.num_food:])
+        p = pdist >= 0
+        poison_dir = np.where(p, direction_octants(px - hx, py - hy), 8)
+        poison_dist_level = np.where(p, 5 * pdist // (2 * g), 5)
+        return encode_state(food_dir, danger_code, poison_dir, poison_dist_level)
+
+    def step(self, actions):
+        """
+        所有存活的蛇同时移动一步（actions 为长度 num_snakes 的动作数组，死亡的蛇的动作被忽略）
+        返回 (observations, rewards[N], dones[N])：dones[i] 为 True 表示第 i 条蛇在这一步死亡
+        （respawn=True 时它已重生，观察是新位置的）
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        g = self.grid_size
+        n = self.num_snakes
+        ids = np.nonzero(self.alive)[0]
+        self.ticks += 1
+        self.steps[ids] += 1
+
+        # 禁止直接掉头
+        new_dx = self.ACTION_DX[actions[ids]]
+        new_dy = self.ACTION_DY[actions[ids]]
+        reverse = (new_dx == -self.dir_x[ids]) & (new_dy == -self.dir_y[ids])
+        self.dir_x[ids] = np.where(reverse, self.dir_x[ids], new_dx)
+        self.dir_y[ids] = np.where(reverse, self.dir_y[ids], new_dy)
+        nx = self.head_x[ids] + self.dir_x[ids]
+        ny = self.head_y[ids] + self.dir_y[ids]
+
+        # 所有碰撞一次判定：新蛇头出界、落在任何蛇身上、或与其他新蛇头重合
+        in_bounds = (nx >= 0) & (nx < g) & (ny >= 0) & (ny < g)
+        new_cell = np.where(in_bounds, ny * g + nx, 0)
+        owner = np.where(in_bounds, self.cell_owner[new_cell], self.EMPTY)
+        hit_body = owner >= 0
+        _, inverse, counts = np.unique(np.where(in_bounds, new_cell, -1 - np.arange(len(ids))),
+                                       return_inverse=True, return_counts=True)
+        head_on = counts[inverse] > 1
+        dead = ~in_bounds | hit_body | head_on
+
+        rewards = np.zeros(n, dtype=np.float64)
+        dones = np.zeros(n, dtype=bool)
+        dead_ids = ids[dead]
+        rewards[dead_ids] = -200
+        dones[dead_ids] = True
+        self.final_score[dead_ids] = self.score[dead_ids]
+        self.final_steps[dead_ids] = self.steps[dead_ids]
+        self.final_foods[dead_ids] = self.foods[dead_ids]
+        self.final_cause[dead_ids] = np.where(~in_bounds, self.CAUSE_WALL,
+                                              np.where(head_on, self.CAUSE_HEAD,
+                                                       np.where(owner == ids, self.CAUSE_SELF, self.CAUSE_BODY)))[dead]
+        # 移除死亡的蛇（存活的蛇的新蛇头不可能落在它们身上，先后顺序无关）
+        capacity = self.body.shape[1]
+        for i in dead_ids:
+            pos = (self.head_idx[i] + np.arange(self.length[i])) % capacity
+            self.cell_owner[self.body[i, pos]] = self.EMPTY
+        self.alive[dead_ids] = False
+
+        live = ~dead
+        s = ids[live]
+        cell = new_cell[live]
+        item = owner[live]
+        ate_food = (item <= self.ITEM_BASE) & (self.ITEM_BASE - item < self.num_food)
+        ate_poison = (item <= self.ITEM_BASE) & ~ate_food
+        grow = (ate_food | ate_poison) & (self.length[s] < self.max_length)
+        if grow.any() and self.length[s[grow]].max() >= capacity:
+            self._grow_body(capacity + 1)
+            capacity = self.body.shape[1]
+
+        # 不变长的蛇移除蛇尾，再写入所有新蛇头
+        movers = s[~grow]
+        tail_pos = (self.head_idx[movers] + self.length[movers] - 1) % capacity
+        self.cell_owner[self.body[movers, tail_pos]] = self.EMPTY
+        self.length[s[grow]] += 1
+        self.head_idx[s] = (self.head_idx[s] - 1) % capacity
+        self.body[s, self.head_idx[s]] = cell
+        self.cell_owner[cell] = s
+        self.head_x[s] = nx[live]
+        self.head_y[s] = ny[live]
+
+        eat_food = s[ate_food]
+        self.foods[eat_food] += 1
+        self.score[eat_food] += 10
+        rewards[eat_food] = 50
+        eat_poison = s[ate_poison]
+        self.score[eat_poison] -= 5
+        rewards[eat_poison] = -50
+        # 被吃掉的物品和之前因没有空格而消失的物品一起（重新）放置
+        self._place_items(np.concatenate([self.ITEM_BASE - item[ate_food | ate_poison],
+                                          np.flatnonzero(self.item_cells < 0)]))
+
+        # 普通移动的引导奖励（与 SnakeGame 相同，距离取最近的食物/毒药）
+        move = s[~ate_food & ~ate_poison]
+        _, _, food_dist = self._nearest(move, self.item_cells[:self.num_food])
+        _, _, poison_dist = self._nearest(move, self.item_cells[self.num_food:])
+        guide_reward = np.where(food_dist == 1, 0.5, np.where(food_dist == 2, 0.3, 0.0))
+        penalty = np.where(food_dist > self.prev_food_dist[move], -0.3, 0.0)
+        poison_penalty = np.where((poison_dist >= 0) & (poison_dist <= 1), -0.5,
+                                  np.where(poison_dist == 2, -0.3, 0.0))
+        rewards[move] = -0.1 + guide_reward + np.minimum(penalty, poison_penalty)
+
+        # 这一步死亡的蛇和之前找不到空位的蛇一起尝试重生
+        spawned = np.zeros(0, dtype=np.int64)
+        if self.respawn:
+            waiting = np.flatnonzero(~self.alive)
+            self._spawn(waiting)
+            spawned = waiting[self.alive[waiting]]
+        # 吃到东西、重生的蛇的距离基准改为当前最近的食物
+        reset_dist = np.concatenate([eat_food, eat_poison, spawned])
+        self.prev_food_dist[move] = food_dist
+        self.prev_food_dist[reset_dist] = self._nearest(reset_dist, self.item_cells[:self.num_food])[2]
+
+        return self.observe(), rewards, dones
+
+    def snake(self, i):
+        """返回第 i 条蛇的蛇身坐标列表（蛇头在前），格式与 SnakeGame.snake 相同；死亡的蛇为空列表"""
+        if not self.alive[i]:
+            return []
+        g = self.grid_size
+        pos = (self.head_idx[i] + np.arange(self.length[i])) % self.body.shape[1]
+        return [(int(c % g), int(c // g)) for c in self.body[i, pos]]
+
+    def items(self, poison=False):
+        """当前食物（poison=True 时为毒药）的坐标列表"""
+        cells = self.item_cells[self.num_food:] if poison else self.item_cells[:self.num_food]
+        return [(int(c % self.grid_size), int(c // self.grid_size)) for c in cells if c >= 0]
+
+
+if __name__ == "__main__":
+    from ql_agent import load_policy, find_qtable
+
+    parser = argparse.ArgumentParser(description="多蛇竞技场：所有蛇使用同一个贪心策略（或随机动作）自我对弈")
+    parser.add_argument('policy', nargs='?', default=None,
+                        help="策略文件（.qpol）或 Q 表文件，默认 qtable_final；找不到时使用随机动作")
+    parser.add_argument('--snakes', type=int, default=100, help="蛇的数量")
+    parser.add_argument('--grid-size', type=int, default=100, help="棋盘大小")
+    parser.add_argument('--food', type=int, default=50, help="食物数量")
+    parser.add_argument('--poison', type=int, default=10, help="毒药数量")
+    parser.add_argument('--ticks', type=int, default=5000, help="模拟的步数")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子")
+    args = parser.parse_args()
+
+    path = args.policy or find_qtable('qtable_final')
+    policy = None if path is None else load_policy(path)
+    print(f"策略: {path or '随机动作'}")
+    arena = SnakeArena(num_snakes=args.snakes, grid_size=args.grid_size, num_food=args.food,
+                       num_poison=args.poison, seed=args.seed, discrete_state=True)
+    rng = np.random.default_rng(args.seed)
+    states = arena.reset()
+    deaths = np.zeros(4, dtype=np.int64)
+    final_scores = []
+    start_time = time.perf_counter()
+    for _ in range(args.ticks):
+        actions = rng.integers(0, 4, size=args.snakes) if policy is None else policy[states]
+        states, rewards, dones = arena.step(actions)
+        deaths += np.bincount(arena.final_cause[dones], minlength=4)
+        final_scores.extend(arena.final_score[dones].tolist())
+    elapsed = time.perf_counter() - start_time
+
+    print(f"{args.ticks} 步，{args.ticks / elapsed:.0f} 步/秒（{args.ticks * args.snakes / elapsed:.0f} 蛇步/秒）")
+    print(f"死亡 {len(final_scores)} 次：撞墙 {deaths[0]}，撞自身 {deaths[1]}，撞其他蛇 {deaths[2]}，蛇头相撞 {deaths[3]}")
+    if final_scores:
+        print(f"死亡时平均得分 {np.mean(final_scores):.2f}，存活的蛇当前平均长度 {arena.length[arena.alive].mean():.1f}")
@@ -0,0 +1,250 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from game_env import SnakeGame
+from ql_agent import QLAgent
+from replay_buffer import ReplayBuffer
+from vec_env import VecSnakeGame
+from arena import SnakeArena
+
+# 动作 0-3 对应的移动方向（与 SnakeGame.step 一致）
+ACTION_MAP = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+
+
+def _time_per_call(func, number, repeat=5):
+    """返回 func 每次调用的最短平均耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _snapshot(game):
+    return {k: copy.copy(v) for k, v in game.__dict__.items()}
+
+
+def _restore(game, snapshot):
+    game.__dict__.update({k: copy.copy(v) for k, v in snapshot.items()})
+
+
+def _serpentine_path(grid_size):
+    """按蛇形（逐行往返）遍历整个棋盘的格子序列"""
+    path = []
+    for y in range(grid_size):
+        xs = range(grid_size) if y % 2 == 0 else range(grid_size - 1, -1, -1)
+        path.extend((x, y) for x in xs)
+    return path
+
+
+def make_game(grid_size, length, poison=True):
+    """
+    构造蛇身长度为 length 的局面：蛇身沿蛇形路径排列，蛇头在路径末端
+    返回 (game, action)，action 为沿路径继续前进（不会碰撞）的动作
+    """
+    game = SnakeGame(grid_size=grid_size, poison_enabled=poison, poison_immediate=poison, clock_mode='sim')
+    path = _serpentine_path(grid_size)
+    body = path[:length][::-1]
+    game._set_snake(body)
+    head, neck = body[0], body[1]
+    game.direction = (head[0] - neck[0], head[1] - neck[1])
+    game.food = game._place_food()
+    if poison:
+        game.poison = game._place_poison()
+        game.prev_poison_dist = abs(head[0] - game.poison[0]) + abs(head[1] - game.poison[1])
+    game.prev_food_dist = abs(head[0] - game.food[0]) + abs(head[1] - game.food[1])
+    nxt = path[length]
+    action = ACTION_MAP.index((nxt[0] - head[0], nxt[1] - head[1]))
+    return game, action
+
+
+def _record(results, name, seconds, unit_per_call=1):
+    results[name] = {
+        'us_per_call': seconds * 1e6,
+        'calls_per_sec': unit_per_call / seconds,
+    }
+    print(f"{name:<48} {seconds * 1e6:>10.2f} us/call  {unit_per_call / seconds:>12.0f} /s")
+
+
+def bench_env(results, grid_sizes, number):
+    for grid_size in grid_sizes:
+        cells = grid_size * grid_size
+        lengths = sorted({3, cells // 4, cells // 2, cells * 9 // 10})
+        for length in lengths:
+            tag = f"[grid={grid_size},len={length}]"
+            game, action = make_game(grid_size, length)
+
+            snapshot = _snapshot(game)
+            best = float('inf')
+            for _ in range(5):
+                total = 0.0
+                for _ in range(number):
+                    _restore(game, snapshot)
+                    start = time.perf_counter()
+                    game.step(action)
+                    total += time.perf_counter() - start
+                best = min(best, total / number)
+            _restore(game, snapshot)
+            _record(results, f"SnakeGame.step{tag}", best)
+
+            _record(results, f"SnakeGame._get_state{tag}", _time_per_call(game._get_state, number))
+            _record(results, f"SnakeGame._get_state_key{tag}", _time_per_call(game._get_state_key, number))
+            _record(results, f"SnakeGame._place_food{tag}", _time_per_call(game._place_food, number))
+
+
+def bench_agent(results, number):
+    # 从不同长度、不同棋盘的局面中采样状态
+    states = []
+    for grid_size, length in [(20, 3), (20, 100), (20, 300), (40, 800)]:
+        game, _ = make_game(grid_size, length)
+        for _ in range(16):
+            game.food = game._place_food()
+            game.poison = game._place_poison()
+            states.append(game._get_state())
+
+    agent = QLAgent(epsilon=0.0)
+    counter = [0]
+
+    def discretize():
+        counter[0] = (counter[0] + 1) % len(states)
+        agent._discretize_state(states[counter[0]])
+    _record(results, "QLAgent._discretize_state", _time_per_call(discretize, number))
+
+    # 按训练时的顺序调用：本次的 state 是上次的 next_state
+    transitions = [(states[i], i % 4, -0.1, states[i + 1], False) for i in range(len(states) - 1)]
+
+    def update():
+        counter[0] = (counter[0] + 1) % len(transitions)
+        agent.update(*transitions[counter[0]])
+    _record(results, "QLAgent.update", _time_per_call(update, number))
+
+    # 批量更新：按每条转移的耗时记录，便于与 QLAgent.update 直接比较
+    replay = ReplayBuffer(len(states), seed=0)
+    keys = [agent._discretize_state(state) for state in states]
+    for i in range(len(keys) - 1):
+        replay.add(keys[i], i % 4, -0.1, keys[i + 1], False)
+    for batch_size in (32, 256):
+        batch = replay.sample(batch_size)
+        seconds = _time_per_call(lambda: agent.update_batch(*batch), max(10, number // batch_size))
+        _record(results, f"QLAgent.update_batch[batch={batch_size}]", seconds / batch_size)
+
+
+def bench_train(results, episodes):
+    from train import train_phase
+    for discrete_state, tag in ((False, "[grid=20]"), (True, "[grid=20,discrete]")):
+        config = {'grid_size': 20, 'poison_enabled': True, 'poison_immediate': True, 'clock_mode': 'sim',
+                  'discrete_state': discrete_state}
+        best = float('inf')
+        for _ in range(3):
+            agent = QLAgent(epsilon=0.2)
+            start = time.perf_counter()
+            train_phase(config, agent, episodes, "bench", render_every=0, seed=0)
+            best = min(best, (time.perf_counter() - start) / episodes)
+        _record(results, f"train_phase.episode{tag}", best)
+
+
+def bench_vec(results, number):
+    for num_envs, discrete_state in ((256, False), (4096, False), (4096, True)):
+        env = VecSnakeGame(num_envs=num_envs, grid_size=20, poison_enabled=True, poison_immediate=True, seed=0,
+                           discrete_state=discrete_state)
+        rng = np.random.default_rng(0)
+        actions = rng.integers(0, 4, size=(64, num_envs))
+        counter = [0]
+
+        def step():
+            counter[0] = (counter[0] + 1) % len(actions)
+            env.step(actions[counter[0]])
+        seconds = _time_per_call(step, max(20, number // 10))
+        tag = f"[grid=20,N={num_envs}{',discrete' if discrete_state else ''}]"
+        _record(results, f"VecSnakeGame.step{tag}", seconds, unit_per_call=num_envs)
+
+
+def bench_arena(results, number):
+    for num_snakes, grid_size in ((32, 64), (256, 256)):
+        arena = SnakeArena(num_snakes=num_snakes, grid_size=grid_size, num_food=num_snakes // 2,
+                           num_poison=num_snakes // 8, seed=0, discrete_state=True)
+        rng = np.random.default_rng(0)
+        actions = rng.integers(0, 4, size=(64, num_snakes))
+        counter = [0]
+
+        def step():
+            counter[0] = (counter[0] + 1) % len(actions)
+            arena.step(actions[counter[0]])
+        seconds = _time_per_call(step, max(20, number // 10))
+        _record(results, f"SnakeArena.step[grid={grid_size},snakes={num_snakes}]", seconds,
+                unit_per_call=num_snakes)
+
+
+def run_benchmarks(quick=False):
+    number = 200 if quick else 2000
+    results = {}
+    bench_env(results, [10, 20] if quick else [10, 20, 40, 200], number)
+    bench_agent(results, number * 5)
+    bench_train(results, 50 if quick else 300)
+    bench_vec(results, number)
+    bench_arena(results, number)
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'quick': quick,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """与基准对比，返回变慢超过 threshold（比例）的条目列表"""
+    regressions = []
+    print(f"\n与基准对比（{baseline['meta'].get('timestamp', '?')}，阈值 +{threshold:.0%}）:")
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['us_per_call'] / base['us_per_call']
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  <-- 变慢"
+            regressions.append(name)
+        print(f"{name:<48} {base['us_per_call']:>10.2f} -> {result['us_per_call']:>10.2f} us  ({ratio - 1:+.0%}){flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模拟与学习热点路径的性能基准")
+    parser.add_argument('--output', default='benchmark_results.json', help="结果 JSON 文件")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="基准 JSON 文件")
+    parser.add_argument('--save-baseline', action='store_true', help="将本次结果保存为基准")
+    parser.add_argument('--threshold', type=float, default=0.2, help="判定变慢的比例阈值")
+    parser.add_argument('--quick', action='store_true', help="减少迭代次数，快速运行")
+    args = parser.parse_args()
+
+    report = run_benchmarks(quick=args.quick)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n结果已保存到 {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"基准已保存到 {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 项性能回退")
+            sys.exit(1)
+        print("\n未发现性能回退")
@@ -1,4 +1,5 @@
 import pygame
+from renderer import render_text
 
 class Button:
     """简单按钮类，支持悬停和点击"""
@@ -21,7 +22,6 @@ class Button:
         color = self.hover_color if self.is_hovered else self.color
         pygame.draw.rect(screen, color, self.rect)
         pygame.draw.rect(screen, (255, 255, 255), self.rect, 2)
-        font = pygame.font.Font(None, 30)
-        text_surf = font.render(self.text, True, (255, 255, 255))
+        text_surf = render_text(self.text, 30, (255, 255, 255))
         text_rect = text_surf.get_rect(center=self.rect.center)
         screen.blit(text_surf, text_rect)
@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from ql_agent import load_qtable, find_qtable
+from seeding import make_seed, derive_seed
+from train import PHASES
+from vec_env import VecSnakeGame
+
+CAUSE_NAMES = ('wall', 'self', 'timeout', 'full')
+SCORE_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+# 工作进程中已打开的 Q 表（按路径缓存，只读映射，多个进程共享同一份页缓存）
+_worker_tables = {}
+
+
+def _greedy_actions(q_table, keys):
+    """对一批状态键取贪心动作（与 np.argmax 相同，并列时取编号最小的动作）"""
+    return np.argmax(q_table[keys], axis=1)
+
+
+def _run_boards(task):
+    """
+    工作进程：用 num_envs 个棋盘批量运行贪心策略，第 i 个棋盘恰好完成 quotas[i] 局
+    （每个棋盘取最先结束的若干局，不会偏向短局），返回 (得分, 步数, 食物数, 结束原因) 四个数组
+    """
+    qtable_path, env_config, quotas, max_steps, seed = task
+    q_table = _worker_tables.get(qtable_path)
+    if q_table is None:
+        q_table = _worker_tables[qtable_path] = load_qtable(qtable_path, mmap=True)
+
+    quotas = np.asarray(quotas, dtype=np.int64)
+    env = VecSnakeGame(num_envs=len(quotas), grid_size=env_config['grid_size'],
+                       poison_enabled=env_config['poison_enabled'],
+                       poison_immediate=env_config['poison_immediate'],
+                       tick_ms=env_config.get('tick_ms', 100), seed=seed,
+                       discrete_state=True, max_steps=max_steps)
+    total = int(quotas.sum())
+    scores = np.empty(total, dtype=np.int64)
+    steps = np.empty(total, dtype=np.int64)
+    foods = np.empty(total, dtype=np.int64)
+    causes = np.empty(total, dtype=np.int8)
+    finished = np.zeros(len(quotas), dtype=np.int64)
+    count = 0
+
+    keys = env.reset()
+    while count < total:
+        keys, _, dones = env.step(_greedy_actions(q_table, keys))
+        done_idx = np.nonzero(dones & (finished < quotas))[0]
+        if len(done_idx) == 0:
+            continue
+        end = count + len(done_idx)
+        scores[count:end] = env.final_score[done_idx]
+        steps[count:end] = env.final_steps[done_idx]
+        foods[count:end] = env.final_foods[done_idx]
+        causes[count:end] = env.final_cause[done_idx]
+        finished[done_idx] += 1
+        count = end
+    return scores, steps, foods, causes
+
+
+def phase_config(qtable_path):
+    """按文件名找到 Q 表对应的训练阶段的环境参数（如 qtable_phase1.* 对应阶段1），找不到时用最后一个阶段"""
+    stem = os.path.splitext(os.path.basename(qtable_path))[0]
+    for phase in PHASES:
+        if os.path.splitext(phase['save_path'])[0] == stem:
+            return phase['config']
+    return PHASES[-1]['config']
+
+
+def evaluate(qtable_path, env_config, episodes=100000, num_workers=None, num_envs=1024,
+             max_steps=2000, seed=None):
+    """
+    用贪心策略（不探索）评估 Q 表，返回统计结果字典（见 summarize）
+    qtable_path: Q 表文件（.qtb 或旧版 .pkl）
+    env_config: 环境参数字典（同 train.PHASES 中的 config），使用虚拟时钟
+    episodes: 总局数，平均分给各个进程；每个进程在一个 VecSnakeGame 中同时模拟 num_envs 个棋盘
+    num_workers: 进程数，默认使用全部 CPU 核心；1 表示在当前进程中运行
+    max_steps: 每局的步数上限，达到时按超时结束
+    seed: 种子，各进程的棋盘种子由 (seed, 进程编号) 派生；相同种子与参数得到相同结果
+    """
+    if seed is None:
+        seed = make_seed()
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    # 每个进程一个任务，各棋盘的局数相差不超过 1。每个棋盘连续跑多局，
+    # 局数越多，最后只剩少数棋盘未完成时空跑的步数占比越小
+    tasks = []
+    for i in range(min(num_workers, episodes)):
+        n = episodes // num_workers + (i < episodes % num_workers)
+        boards = min(num_envs, n)
+        quotas = [n // boards + (b < n % boards) for b in range(boards)]
+        tasks.append((qtable_path, env_config, quotas, max_steps, derive_seed(seed, i)))
+
+    start_time = time.perf_counter()
+    if len(tasks) > 1:
+        from multiprocessing import Pool
+        with Pool(len(tasks)) as pool:
+            results = pool.map(_run_boards, tasks)
+    else:
+        results = [_run_boards(task) for task in tasks]
+    elapsed = time.perf_counter() - start_time
+
+    scores, steps, foods, causes = (np.concatenate(arrays) for arrays in zip(*results))
+    report = summarize(scores, steps, foods, causes)
+    report.update({
+        'qtable': qtable_path,
+        'seed': seed,
+        'max_steps': max_steps,
+        'seconds': elapsed,
+    })
+    return report
+
+
+def summarize(scores, steps, foods, causes):
+    """汇总每局的得分、步数、食物数和结束原因：均值、中位数、分位数、结束原因比例、每个食物的步数、得分分布"""
+    values, counts = np.unique(scores, return_counts=True)
+    total_foods = int(foods.sum())
+    return {
+        'episodes': len(scores),
+        'score_mean': float(scores.mean()),
+        'score_std': float(scores.std()),
+        'score_median': float(np.median(scores)),
+        'score_min': int(scores.min()),
+        'score_max': int(scores.max()),
+        'score_percentiles': {str(p): float(v) for p, v in
+                              zip(SCORE_PERCENTILES, np.percentile(scores, SCORE_PERCENTILES))},
+        'steps_mean': float(steps.mean()),
+        'foods_mean': float(foods.mean()),
+        # 所有局的总步数 / 总食物数
+        'steps_per_food': float(steps.sum() / total_foods) if total_foods > 0 else None,
+        'death_causes': {name: float(np.mean(causes == i)) for i, name in enumerate(CAUSE_NAMES)},
+        'score_histogram': {str(v): int(c) for v, c in zip(values, counts)},
+    }
+
+
+def print_report(report):
+    steps_per_food = report['steps_per_food']
+    percentiles = "  ".join(f"p{p}={v:g}" for p, v in report['score_percentiles'].items())
+    causes = "  ".join(f"{name} {ratio:.1%}" for name, ratio in report['death_causes'].items())
+    print(f"===== {report['qtable']} =====")
+    print(f"局数: {report['episodes']}  用时: {report['seconds']:.2f} 秒  "
+          f"({report['episodes'] / max(report['seconds'], 1e-9):.0f} 局/秒)")
+    print(f"得分: 平均 {report['score_mean']:.2f} ± {report['score_std']:.2f}  中位数 {report['score_median']:g}  "
+          f"最低 {report['score_min']}  最高 {report['score_max']}")
+    print(f"分位数: {percentiles}")
+    print(f"结束原因: {causes}（步数上限 {report['max_steps']}）")
+    print(f"平均步数: {report['steps_mean']:.1f}  平均食物: {report['foods_mean']:.2f}  "
+          f"每个食物的步数: {'-' if steps_per_food is None else f'{steps_per_food:.1f}'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量评估 Q 表的贪心策略")
+    parser.add_argument('qtables', nargs='*',
+                        help="Q 表文件，默认评估 qtable_phase1、qtable_phase2、qtable_final（.qtb 或 .pkl）")
+    parser.add_argument('--episodes', type=int, default=100000, help="每个 Q 表的评估局数")
+    parser.add_argument('--workers', type=int, default=None, help="进程数，默认使用全部 CPU 核心")
+    parser.add_argument('--num-envs', type=int, default=1024, help="每个进程同时模拟的棋盘数")
+    parser.add_argument('--max-steps', type=int, default=2000, help="每局步数上限，达到时按超时结束")
+    parser.add_argument('--phase', type=int, choices=range(1, len(PHASES) + 1), default=None,
+                        help="使用第几阶段的环境参数，默认按文件名对应的训练阶段（其他文件用最后阶段）")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子，相同种子得到相同的评估结果")
+    parser.add_argument('--json', default=None, help="把全部结果（含得分分布）保存到该 JSON 文件")
+    args = parser.parse_args()
+
+    paths = args.qtables
+    if not paths:
+        paths = [p for p in (find_qtable(os.path.splitext(phase['save_path'])[0]) for phase in PHASES) if p]
+        if not paths:
+            parser.error("找不到 Q 表文件，请先运行 train.py 或指定文件路径")
+    seed = make_seed() if args.seed is None else args.seed
+    print(f"随机种子: {seed}（使用 --seed {seed} 可复现）")
+
+    reports = []
+    for path in paths:
+        config = PHASES[args.phase - 1]['config'] if args.phase else phase_config(path)
+        report = evaluate(path, config, args.episodes, args.workers, args.num_envs, args.max_steps, seed)
+        print_report(report)
+        reports.append(report)
+
+    if args.json is not None:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n结果已保存到 {args.json}")
@@ -0,0 +1,18 @@
+import argparse
+
+from ql_agent import compile_policy, save_policy, load_qtable, find_qtable
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="将 Q 表编译为按状态编号直接查动作的贪心策略文件（.qpol）")
+    parser.add_argument('qtable', nargs='?', default=None, help="Q 表文件，默认 qtable_final.qtb（或旧版 .pkl）")
+    parser.add_argument('--output', '-o', default='policy_final.qpol', help="输出的策略文件")
+    args = parser.parse_args()
+
+    qtable_path = args.qtable or find_qtable('qtable_final')
+    if qtable_path is None:
+        parser.error("找不到 qtable_final.qtb（或旧版 qtable_final.pkl），请先运行 train.py 或指定 Q 表文件")
+    q_table = load_qtable(qtable_path, mmap=True)
+    policy = compile_policy(q_table)
+    save_policy(args.output, policy)
+    visited = int(q_table.any(axis=1).sum())
+    print(f"{qtable_path} -> {args.output}：{len(policy)} 个状态，其中 {len(policy) - visited} 个未访问状态使用默认动作")
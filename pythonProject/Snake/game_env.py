@@ -1,9 +1,19 @@
-import pygame
 import random
+import time
+from array import array
+from collections import deque
 import numpy as np
+from state_encoding import direction_octant, encode_state
 
 class SnakeGame:
-    def __init__(self, grid_size=20, cell_size=25, poison_enabled=False, poison_immediate=False):
+    # 一局中会变化的字段（蛇身和占用表另行处理），见 save_snapshot / load_snapshot
+    SNAPSHOT_FIELDS = ('direction', 'food', 'poison', 'score', 'done', 'steps', 'last_action', 'last_reward',
+                       'prev_food_dist', 'prev_poison_dist', 'sim_time', 'game_start_time',
+                       'food_generate_time', 'food_state', 'food_blink_start',
+                       'poison_generate_time', 'poison_state', 'poison_blink_start')
+
+    def __init__(self, grid_size=20, cell_size=25, poison_enabled=False, poison_immediate=False,
+                 clock_mode='wall', tick_ms=100, seed=None, discrete_state=False):
         self.grid_size = grid_size
         self.cell_size = cell_size
         self.margin = 50
@@ -13,8 +23,35 @@ class SnakeGame:
         self.height = self.game_height + 2 * self.margin
         self.poison_enabled = poison_enabled
         self.poison_immediate = poison_immediate
+        # 时钟模式：'wall' 使用真实毫秒数；'sim' 使用虚拟时钟，每局从 0 开始、每步前进 tick_ms 毫秒
+        # 'sim' 模式下物品生命周期只取决于步数，训练可全速运行且结果可复现
+        if clock_mode not in ('wall', 'sim'):
+            raise ValueError(f"未知的时钟模式: {clock_mode}")
+        self.clock_mode = clock_mode
+        self.tick_ms = tick_ms
+        self.sim_time = 0
+        # 本局面独立的随机数生成器（放置食物/毒药），seed 为 None 时取自系统熵源
+        self.rng = random.Random(seed)
+        # 放置记录：placement_log 为列表时，每次放置食物/毒药的结果（坐标或 None）依次追加到其中，不影响模拟；
+        # placement_script 不为 None 时改为从 placement_script[placement_index] 起依次取出结果，不使用随机数。
+        # 供录像的关键帧使用（见 recorder.py）
+        self.placement_log = None
+        self.placement_script = None
+        self.placement_index = 0
+        # True 时 reset/step 直接返回 QLAgent 的离散状态键（Q 表行号，int），不创建 14 维浮点数组；
+        # 14 维状态仍可通过 _get_state() 获取
+        self.discrete_state = discrete_state
 
         self.snake = None
+        # 占用表：与蛇身同步，occupied[x, y] 为 True 表示该格有蛇身
+        self.occupied = np.zeros((grid_size, grid_size), dtype=bool)
+        # 空格表：free_cells[:num_free] 为所有空格的编号（x * grid_size + y），free_index[格子] 为它在 free_cells 中的位置；
+        # 占用/释放一格时与末尾交换，放置食物/毒药时直接按下标随机取一个空格，耗时与棋盘大小和蛇长无关
+        num_cells = grid_size * grid_size
+        self._initial_cells = array('i', range(num_cells))
+        self.free_cells = array('i', self._initial_cells)
+        self.free_index = array('i', self._initial_cells)
+        self.num_free = num_cells
         self.direction = None
         self.food = None
         self.poison = None
@@ -44,9 +81,12 @@ class SnakeGame:
 
         self.reset()
 
-    def reset(self):
+    def reset(self, seed=None):
+        """重置对局，返回初始状态；给定 seed 时先用它重新初始化随机数生成器"""
+        if seed is not None:
+            self.rng.seed(seed)
         mid = self.grid_size // 2
-        self.snake = [(mid, mid), (mid-1, mid), (mid-2, mid)]
+        self._set_snake([(mid, mid), (mid-1, mid), (mid-2, mid)])
         self.direction = (1, 0)
         self.score = 0
         self.done = False
@@ -54,7 +94,8 @@ class SnakeGame:
         self.last_action = None
         self.last_reward = None
 
-        self.game_start_time = pygame.time.get_ticks()
+        self.sim_time = 0
+        self.game_start_time = self._get_ticks()
         self.food = self._place_food()
         self.food_generate_time = self.game_start_time
         self.food_state = 0
@@ -77,40 +118,133 @@ class SnakeGame:
         if self.poison is not None:
             self.prev_poison_dist = abs(head[0] - self.poison[0]) + abs(head[1] - self.poison[1])
 
-        return self._get_state()
+        return self._get_state_key() if self.discrete_state else self._get_state()
+
+    def _get_ticks(self):
+        """返回当前游戏时钟（毫秒）"""
+        if self.clock_mode == 'sim':
+            return self.sim_time
+        return int(time.perf_counter() * 1000)
+
+    def _set_snake(self, body):
+        """
+        设置蛇身并重建占用表和空格表。空格表总是从同一初始顺序重建，
+        因此相同的蛇身 + 相同的随机数状态总是得到相同的食物/毒药位置
+        """
+        self.snake = deque(body)
+        self.occupied[:] = False
+        self.free_cells[:] = self._initial_cells
+        self.free_index[:] = self._initial_cells
+        self.num_free = len(self._initial_cells)
+        for segment in self.snake:
+            self.occupied[segment] = True
+            self._occupy(segment)
+
+    def _occupy(self, pos):
+        """把空格 pos 移出空格表（与最后一个空格交换）"""
+        cell = pos[0] * self.grid_size + pos[1]
+        free_cells, free_index = self.free_cells, self.free_index
+        i = free_index[cell]
+        last = self.num_free - 1
+        moved = free_cells[last]
+        free_cells[i] = moved
+        free_index[moved] = i
+        free_cells[last] = cell
+        free_index[cell] = last
+        self.num_free = last
+
+    def _release(self, pos):
+        """把格子 pos 放回空格表（与第一个非空格交换）"""
+        cell = pos[0] * self.grid_size + pos[1]
+        free_cells, free_index = self.free_cells, self.free_index
+        i = free_index[cell]
+        first = self.num_free
+        moved = free_cells[first]
+        free_cells[i] = moved
+        free_index[moved] = i
+        free_cells[first] = cell
+        free_index[cell] = first
+        self.num_free = first + 1
 
     def _place_food(self):
-        while True:
-            pos = (random.randint(0, self.grid_size-1),
-                   random.randint(0, self.grid_size-1))
-            if pos not in self.snake:
-                return pos
+        """随机返回一个空格，棋盘已满时返回 None"""
+        if self.placement_script is not None:
+            return self._next_placement()
+        pos = None
+        if self.num_free > 0:
+            pos = divmod(self.free_cells[self.rng.randrange(self.num_free)], self.grid_size)
+        if self.placement_log is not None:
+            self.placement_log.append(pos)
+        return pos
 
     def _place_poison(self):
-        while True:
-            pos = (random.randint(0, self.grid_size-1),
-                   random.randint(0, self.grid_size-1))
-            if pos not in self.snake and pos != self.food:
-                return pos
+        """随机返回一个不是食物的空格，没有这样的空格时返回 None"""
+        if self.placement_script is not None:
+            return self._next_placement()
+        n = self.num_free
+        if self.food is not None and not self.occupied[self.food]:
+            # 把食物所在格换到空格表末尾，只在前 n-1 个空格中取
+            self._occupy(self.food)
+            self._release(self.food)
+            n -= 1
+        pos = None
+        if n > 0:
+            pos = divmod(self.free_cells[self.rng.randrange(n)], self.grid_size)
+        if self.placement_log is not None:
+            self.placement_log.append(pos)
+        return pos
+
+    def _next_placement(self):
+        pos = self.placement_script[self.placement_index]
+        self.placement_index += 1
+        return pos
+
+    def save_snapshot(self):
+        """返回当前局面的快照（字典，可 pickle），包括随机数状态，load_snapshot 后可从这一步继续模拟"""
+        snapshot = {name: getattr(self, name) for name in self.SNAPSHOT_FIELDS}
+        snapshot['snake'] = list(self.snake)
+        snapshot['rng_state'] = self.rng.getstate()
+        # 空格表的顺序决定下一次放置的位置，需要一并保存
+        snapshot['free_cells'] = self.free_cells.tobytes()
+        snapshot['placement_index'] = self.placement_index
+        return snapshot
+
+    def load_snapshot(self, snapshot):
+        """恢复 save_snapshot 保存的局面"""
+        for name in self.SNAPSHOT_FIELDS:
+            setattr(self, name, snapshot[name])
+        self._set_snake(snapshot['snake'])
+        free_cells = np.frombuffer(snapshot['free_cells'], dtype=np.int32)
+        free_index = np.empty_like(free_cells)
+        free_index[free_cells] = np.arange(len(free_cells), dtype=np.int32)
+        self.free_cells = array('i')
+        self.free_cells.frombytes(free_cells.tobytes())
+        self.free_index = array('i')
+        self.free_index.frombytes(free_index.tobytes())
+        self.rng.setstate(snapshot['rng_state'])
+        self.placement_index = snapshot['placement_index']
 
     def _get_state(self):
         head = self.snake[0]
+        # 棋盘被占满时没有食物，按食物在蛇头处计算
+        food = head if self.food is None else self.food
         head_norm = (head[0] / self.grid_size, head[1] / self.grid_size)
-        food_norm = (self.food[0] / self.grid_size, self.food[1] / self.grid_size)
+        food_norm = (food[0] / self.grid_size, food[1] / self.grid_size)
 
-        dx_food = (self.food[0] - head[0]) / self.grid_size
-        dy_food = (self.food[1] - head[1]) / self.grid_size
+        dx_food = (food[0] - head[0]) / self.grid_size
+        dy_food = (food[1] - head[1]) / self.grid_size
 
         dirs = [(1,0), (-1,0), (0,1), (0,-1)]
         distances = []
         for d in dirs:
+            # 射线不会经过蛇头，占用表等价于检查 snake[1:]；距离上限为 3，看到 3 格即可停止
             dist = 0
             nx, ny = head[0] + d[0], head[1] + d[1]
-            while 0 <= nx < self.grid_size and 0 <= ny < self.grid_size and (nx, ny) not in self.snake[1:]:
+            while dist < 3 and 0 <= nx < self.grid_size and 0 <= ny < self.grid_size and not self.occupied[nx, ny]:
                 dist += 1
                 nx += d[0]
                 ny += d[1]
-            distances.append(min(dist, 3))
+            distances.append(dist)
 
         if self.poison_enabled and self.poison is not None:
             poison_exists = 1
@@ -133,6 +267,40 @@ class SnakeGame:
         ], dtype=np.float32)
         return state
 
+    def _get_state_key(self):
+        """
+        直接计算离散状态键：与 QLAgent._discretize_state(self._get_state()) 相同，
+        但全部使用整数运算（食物/毒药方向、射线距离、毒药距离等级），不创建浮点数组
+        """
+        hx, hy = self.snake[0]
+        grid_size = self.grid_size
+        occupied = self.occupied
+        fx, fy = (hx, hy) if self.food is None else self.food
+        food_dir = direction_octant(fx - hx, fy - hy)
+
+        # 四个方向（右、左、下、上）的距离等级依次占 2 位
+        danger_code = 0
+        shift = 0
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            dist = 0
+            nx, ny = hx + dx, hy + dy
+            while dist < 3 and 0 <= nx < grid_size and 0 <= ny < grid_size and not occupied[nx, ny]:
+                dist += 1
+                nx += dx
+                ny += dy
+            danger_code |= dist << shift
+            shift += 2
+
+        if self.poison_enabled and self.poison is not None:
+            px, py = self.poison
+            poison_dir = direction_octant(px - hx, py - hy)
+            # 等价于 int(曼哈顿距离 / (2 * grid_size) * 5)
+            poison_dist_level = 5 * (abs(px - hx) + abs(py - hy)) // (2 * grid_size)
+        else:
+            poison_dir = 8
+            poison_dist_level = 5
+        return encode_state(food_dir, danger_code, poison_dir, poison_dist_level)
+
     def _handle_item_lifetime(self, current_time):
         if self.food_state == 0:
             if current_time - self.food_generate_time > self.FOOD_LIFETIME:
@@ -177,7 +345,9 @@ class SnakeGame:
 
         reward = 0
         self.steps += 1
-        current_time = pygame.time.get_ticks()
+        if self.clock_mode == 'sim':
+            self.sim_time += self.tick_ms
+        current_time = self._get_ticks()
 
         self._handle_item_lifetime(current_time)
 
@@ -190,30 +360,40 @@ class SnakeGame:
         if (new_head[0] < 0 or new_head[0] >= self.grid_size or
                 new_head[1] < 0 or new_head[1] >= self.grid_size):
             collided = True
-        elif new_head in self.snake[1:]:
+        elif self.occupied[new_head]:
+            # 新蛇头不可能与当前蛇头重合，占用表等价于检查 snake[1:]
             collided = True
 
         if collided:
             self.done = True
             reward = -200
         else:
-            self.snake.insert(0, new_head)
+            self.snake.appendleft(new_head)
+            self.occupied[new_head] = True
+            self._occupy(new_head)
             if ate_food:
                 self.score += 10
                 reward = 50
                 self.food = self._place_food()
                 self.food_generate_time = current_time
                 self.food_state = 0
-                self.prev_food_dist = abs(new_head[0] - self.food[0]) + abs(new_head[1] - self.food[1])
+                if self.food is None:
+                    # 蛇身已占满棋盘，对局结束
+                    self.done = True
+                else:
+                    self.prev_food_dist = abs(new_head[0] - self.food[0]) + abs(new_head[1] - self.food[1])
             elif ate_poison:
                 self.score -= 5
                 reward = -50
                 self.poison = self._place_poison()
                 self.poison_generate_time = current_time
                 self.poison_state = 0
-                self.prev_poison_dist = abs(new_head[0] - self.poison[0]) + abs(new_head[1] - self.poison[1])
+                self.prev_poison_dist = None if self.poison is None else \
+                    abs(new_head[0] - self.poison[0]) + abs(new_head[1] - self.poison[1])
             else:
-                self.snake.pop()
+                tail = self.snake.pop()
+                self.occupied[tail] = False
+                self._release(tail)
                 reward = -0.1
 
                 new_food_dist = abs(new_head[0] - self.food[0]) + abs(new_head[1] - self.food[1])
@@ -254,123 +434,5 @@ class SnakeGame:
 
         self.last_action = action
         self.last_reward = reward
-        return self._get_state(), reward, self.done
-
-    def render(self, screen):
-        """绘制游戏画面（白色背景，彩色元素）"""
-        # 填充白色背景
-        screen.fill((255, 255, 255))
-        offset = self.margin
-
-        # 绘制游戏区域背景（浅灰色，可选）
-        game_rect = pygame.Rect(offset, offset, self.game_width, self.game_height)
-        pygame.draw.rect(screen, (240, 240, 240), game_rect)  # 极浅灰背景
-
-        # 绘制网格线（浅灰色）
-        grid_color = (200, 200, 200)
-        for x in range(0, self.game_width + 1, self.cell_size):
-            pygame.draw.line(screen, grid_color, (offset + x, offset),
-                             (offset + x, offset + self.game_height))
-        for y in range(0, self.game_height + 1, self.cell_size):
-            pygame.draw.line(screen, grid_color, (offset, offset + y),
-                             (offset + self.game_width, offset + y))
-
-        # 绘制蛇身（深绿色，与白色背景对比）
-        for i, segment in enumerate(self.snake):
-            if i == 0:
-                continue
-            color = (0, 150, 0)  # 深绿
-            rect = pygame.Rect(offset + segment[0] * self.cell_size,
-                               offset + segment[1] * self.cell_size,
-                               self.cell_size, self.cell_size)
-            pygame.draw.rect(screen, color, rect)
-            pygame.draw.rect(screen, (0, 80, 0), rect, 2)  # 深绿色边框
-
-        # 绘制蛇头（圆形，亮绿色）
-        head = self.snake[0]
-        head_center = (offset + head[0] * self.cell_size + self.cell_size // 2,
-                       offset + head[1] * self.cell_size + self.cell_size // 2)
-        head_radius = self.cell_size // 2 - 2
-        pygame.draw.circle(screen, (0, 200, 0), head_center, head_radius)
-        pygame.draw.circle(screen, (0, 100, 0), head_center, head_radius, 2)
-
-        # 眼睛位置（根据方向计算）
-        eye_offset = head_radius // 2
-        eye_radius = 2
-        if self.direction == (1, 0):  # 右
-            eye1 = (head_center[0] + eye_offset, head_center[1] - eye_offset)
-            eye2 = (head_center[0] + eye_offset, head_center[1] + eye_offset)
-        elif self.direction == (-1, 0):  # 左
-            eye1 = (head_center[0] - eye_offset, head_center[1] - eye_offset)
-            eye2 = (head_center[0] - eye_offset, head_center[1] + eye_offset)
-        elif self.direction == (0, -1):  # 上
-            eye1 = (head_center[0] - eye_offset, head_center[1] - eye_offset)
-            eye2 = (head_center[0] + eye_offset, head_center[1] - eye_offset)
-        else:  # 下
-            eye1 = (head_center[0] - eye_offset, head_center[1] + eye_offset)
-            eye2 = (head_center[0] + eye_offset, head_center[1] + eye_offset)
-
-        # 绘制眼睛：根据是否死亡选择画圆或画X
-        if self.done:
-            # 死亡时画X（黑色）
-            x_size = eye_radius * 2
-            for eye in (eye1, eye2):
-                pygame.draw.line(screen, (0, 0, 0),
-                                 (eye[0] - x_size, eye[1] - x_size),
-                                 (eye[0] + x_size, eye[1] + x_size), 2)
-                pygame.draw.line(screen, (0, 0, 0),
-                                 (eye[0] + x_size, eye[1] - x_size),
-                                 (eye[0] - x_size, eye[1] + x_size), 2)
-        else:
-            # 正常时画圆
-            pygame.draw.circle(screen, (0, 0, 0), eye1, eye_radius)
-            pygame.draw.circle(screen, (0, 0, 0), eye2, eye_radius)
-
-        # 绘制食物（金色菱形，消失时闪烁）
-        if self.food is not None:
-            food_x = offset + self.food[0] * self.cell_size + self.cell_size // 2
-            food_y = offset + self.food[1] * self.cell_size + self.cell_size // 2
-            points = [
-                (food_x, food_y - self.cell_size // 2 + 2),
-                (food_x + self.cell_size // 2 - 2, food_y),
-                (food_x, food_y + self.cell_size // 2 - 2),
-                (food_x - self.cell_size // 2 + 2, food_y),
-            ]
-            current_time = pygame.time.get_ticks()
-            if self.food_state == 1:  # 闪烁状态
-                if (current_time // 200) % 2 == 0:
-                    color = (255, 215, 0)  # 金色
-                else:
-                    color = (255, 165, 0)  # 橙色
-            else:
-                color = (255, 215, 0)  # 金色
-            pygame.draw.polygon(screen, color, points)
-            # 高光（小白点）
-            pygame.draw.circle(screen, (255, 255, 255), (food_x - 2, food_y - 2), 2)
-
-        # 绘制毒药（圆形，中间有红色高光）
-        if self.poison_enabled and self.poison is not None:
-            poison_x = offset + self.poison[0] * self.cell_size + self.cell_size // 2
-            poison_y = offset + self.poison[1] * self.cell_size + self.cell_size // 2
-            radius = self.cell_size // 2 - 2
-            current_time = pygame.time.get_ticks()
-
-            # 确定颜色（闪烁效果）
-            if self.poison_state == 1:  # 闪烁状态
-                if (current_time // 200) % 2 == 0:
-                    base_color = (128, 0, 128)  # 紫色
-                else:
-                    base_color = (255, 255, 255)  # 白色
-            else:
-                base_color = (128, 0, 128)  # 紫色
-
-            # 绘制圆形
-            pygame.draw.circle(screen, base_color, (poison_x, poison_y), radius)
-
-            # 绘制红色高光（中心小圆）
-            highlight_radius = max(2, radius // 3)
-            highlight_color = (255, 100, 100)  # 亮红色
-            pygame.draw.circle(screen, highlight_color, (poison_x, poison_y), highlight_radius)
-
-            # 白色边框
-            pygame.draw.circle(screen, (255, 255, 255), (poison_x, poison_y), radius, 1)
+        state = self._get_state_key() if self.discrete_state else self._get_state()
+        return state, reward, self.done
@@ -3,10 +3,10 @@ import sys
 import os
 import time
 from game_env import SnakeGame
+from renderer import SnakeRenderer, render_text
 from button import Button
 import menu
-from ql_agent import QLAgent
-import numpy as np
+from ql_agent import load_policy, find_qtable
 
 # 游戏状态常量
 COUNTDOWN = 0
@@ -37,9 +37,15 @@ def manual_play():
     """手动模式，返回 True 表示返回主菜单，False 表示退出程序"""
     pygame.init()
     game = SnakeGame(grid_size=20, cell_size=25, poison_enabled=True)
+    renderer = SnakeRenderer(game)
     screen = pygame.display.set_mode((game.width, game.height))
     pygame.display.set_caption("Snake - Game Mode")
     clock = pygame.time.Clock()
+    # 半透明遮罩和上下两条文字区域（页边距）只创建一次
+    overlay = pygame.Surface((game.width, game.height), pygame.SRCALPHA)
+    overlay.fill((0, 0, 0, 128))
+    hud_top = pygame.Rect(0, 0, game.width, game.margin)
+    hud_bottom = pygame.Rect(0, game.margin + game.game_height, game.width, game.margin)
 
     # 状态变量
     state = COUNTDOWN
@@ -182,26 +188,28 @@ def manual_play():
             play_time = (current_time - play_start_time) / 1000.0
 
         # ---------- 绘制界面 ----------
-        # 1. 绘制游戏区域
-        game.render(screen)
+        # 1. 绘制游戏区域（只重绘变化的格子）
+        dirty = renderer.render(screen)
 
         # 2. 绘制覆盖层
         if state != PLAYING:
-            overlay = pygame.Surface((game.width, game.height), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 128))
             screen.blit(overlay, (0, 0))
+            renderer.invalidate()  # 遮罩盖住了游戏区域，下一帧整屏重绘
+        else:
+            # 擦除上一帧的文字
+            dirty.append(renderer.clear(screen, hud_top))
+            dirty.append(renderer.clear(screen, hud_bottom))
 
         # 3. 绘制UI文字（黑色，确保在覆盖层之上可见）
-        font = pygame.font.Font(None, 30)
         # 左上角得分和时间
-        score_text = font.render(f"Score: {game.score}", True, (0, 0, 0))
+        score_text = render_text(f"Score: {game.score}", 30, (0, 0, 0))
         screen.blit(score_text, (10, 5))
-        time_text = font.render(f"Time: {int(play_time//60):02d}:{int(play_time%60):02d}", True, (0, 0, 0))
+        time_text = render_text(f"Time: {int(play_time//60):02d}:{int(play_time%60):02d}", 30, (0, 0, 0))
         screen.blit(time_text, (10, 25))
 
         # 右上角速度
         speed = get_speed_from_score(game.score)
-        speed_text = font.render(f"Speed: {speed}", True, (0, 0, 0))
+        speed_text = render_text(f"Speed: {speed}", 30, (0, 0, 0))
         speed_rect = speed_text.get_rect()
         speed_rect.topright = (game.width - 150, 10)
         screen.blit(speed_text, speed_rect)
@@ -209,9 +217,8 @@ def manual_play():
         # 左下角动作和奖励
         if game.last_action is not None:
             action_names = ["Up", "Down", "Left", "Right"]
-            small_font = pygame.font.Font(None, 24)
-            action_text = small_font.render(f"Action: {action_names[game.last_action]}", True, (100, 100, 100))
-            reward_text = small_font.render(f"Reward: {game.last_reward:.1f}", True, (100, 100, 100))
+            action_text = render_text(f"Action: {action_names[game.last_action]}", 24, (100, 100, 100))
+            reward_text = render_text(f"Reward: {game.last_reward:.1f}", 24, (100, 100, 100))
             # 底部边距内 y = margin + game_height + 5 和 +25
             bottom_y1 = game.margin + game.game_height + 5
             bottom_y2 = game.margin + game.game_height + 25
@@ -230,20 +237,21 @@ def manual_play():
 
         # 绘制中央文字
         if state == COUNTDOWN:
-            big_font = pygame.font.Font(None, 100)
             if countdown_number > 0:
-                text = big_font.render(str(countdown_number), True, (255, 255, 255))
+                text = render_text(str(countdown_number), 100, (255, 255, 255))
             else:
-                text = big_font.render("GO!", True, (255, 255, 255))
+                text = render_text("GO!", 100, (255, 255, 255))
             text_rect = text.get_rect(center=(game.width//2, game.height//2))
             screen.blit(text, text_rect)
         elif state == GAMEOVER:
-            big_font = pygame.font.Font(None, 48)
-            text = big_font.render(f"Game Over! Score: {game.score}", True, (255, 255, 255))
+            text = render_text(f"Game Over! Score: {game.score}", 48, (255, 255, 255))
             text_rect = text.get_rect(center=(game.width//2, game.height//2 - 50))
             screen.blit(text, text_rect)
 
-        pygame.display.flip()
+        if state == PLAYING:
+            pygame.display.update(dirty)
+        else:
+            pygame.display.flip()
 
         # 帧率控制
         if state == PLAYING:
@@ -256,19 +264,24 @@ def manual_play():
 
 def ai_demo():
     """AI演示模式（带返回主菜单按钮）"""
-    if not os.path.exists('qtable_final.pkl'):
-        print("错误：找不到训练好的模型文件 'qtable_final.pkl'，请先运行 train.py 进行训练！")
+    # 优先使用导出的贪心策略（export_policy.py），否则加载 Q 表当场编译
+    model_path = 'policy_final.qpol' if os.path.exists('policy_final.qpol') else find_qtable('qtable_final')
+    if model_path is None:
+        print("错误：找不到训练好的模型文件 'qtable_final.qtb'（或旧版 'qtable_final.pkl'），请先运行 train.py 进行训练！")
         pygame.quit()
         sys.exit()
 
-    game = SnakeGame(grid_size=20, cell_size=25, poison_enabled=True)
-    agent = QLAgent()
-    agent.load('qtable_final.pkl')
+    # 环境直接返回离散状态编号，每步只需在策略数组中查一次动作
+    game = SnakeGame(grid_size=20, cell_size=25, poison_enabled=True, discrete_state=True)
+    renderer = SnakeRenderer(game)
+    policy = load_policy(model_path, mmap=True)
 
     pygame.init()
     screen = pygame.display.set_mode((game.width, game.height))
     pygame.display.set_caption("Snake - AI Demonstration ")
     clock = pygame.time.Clock()
+    hud_top = pygame.Rect(0, 0, game.width, game.margin)
+    hud_bottom = pygame.Rect(0, game.margin + game.game_height, game.width, game.margin)
 
     # 右上角退出按钮
     exit_btn = Button(
@@ -298,45 +311,43 @@ def ai_demo():
             exit_btn.handle_event(event)
 
         if not done:
-            state_key = agent._discretize_state(state)
-            q_values = agent.q_table[state_key]
-            action = int(np.argmax(q_values))
-            next_state, reward, done = game.step(action)
+            next_state, reward, done = game.step(int(policy[state]))
             state = next_state
 
             play_time = (current_time - play_start_time) / 1000.0
             speed = get_speed_from_score(game.score)
         else:
             # 游戏结束，显示黑色文字
-            font = pygame.font.Font(None, 36)
-            text = font.render(f"Game Over! Score: {game.score}", True, (0, 0, 0))
+            text = render_text(f"Game Over! Score: {game.score}", 36, (0, 0, 0))
             screen.blit(text, (game.width // 2 - 100, game.height // 2))
             pygame.display.flip()
             pygame.time.wait(3000)
+            renderer.invalidate()
             state = game.reset()
             done = False
             play_start_time = pygame.time.get_ticks()
             continue
 
-        game.render(screen)
+        # 只重绘变化的格子，文字区域先擦除再重画
+        dirty = renderer.render(screen)
+        dirty.append(renderer.clear(screen, hud_top))
+        dirty.append(renderer.clear(screen, hud_bottom))
 
         # 绘制UI文字（黑色）
-        font = pygame.font.Font(None, 30)
-        score_text = font.render(f"Score: {game.score}", True, (0, 0, 0))
+        score_text = render_text(f"Score: {game.score}", 30, (0, 0, 0))
         screen.blit(score_text, (10, 5))
-        time_text = font.render(f"Time: {int(play_time // 60):02d}:{int(play_time % 60):02d}", True, (0, 0, 0))
+        time_text = render_text(f"Time: {int(play_time // 60):02d}:{int(play_time % 60):02d}", 30, (0, 0, 0))
         screen.blit(time_text, (10, 25))
 
-        speed_text = font.render(f"Speed: {speed}", True, (0, 0, 0))
+        speed_text = render_text(f"Speed: {speed}", 30, (0, 0, 0))
         speed_rect = speed_text.get_rect()
         speed_rect.topright = (game.width - 150, 10)
         screen.blit(speed_text, speed_rect)
 
         if game.last_action is not None:
             action_names = ["Up", "Down", "Left", "Right"]
-            small_font = pygame.font.Font(None, 24)
-            action_text = small_font.render(f"Action: {action_names[game.last_action]}", True, (100, 100, 100))
-            reward_text = small_font.render(f"Reward: {game.last_reward:.1f}", True, (100, 100, 100))
+            action_text = render_text(f"Action: {action_names[game.last_action]}", 24, (100, 100, 100))
+            reward_text = render_text(f"Reward: {game.last_reward:.1f}", 24, (100, 100, 100))
             bottom_y1 = game.margin + game.game_height + 5
             bottom_y2 = game.margin + game.game_height + 25
             screen.blit(action_text, (10, bottom_y1))
@@ -345,7 +356,7 @@ def ai_demo():
         # 绘制退出按钮
         exit_btn.draw(screen)
 
-        pygame.display.flip()
+        pygame.display.update(dirty)
         clock.tick(speed)
 
     # 退出循环后返回，主菜单重新显示
@@ -1,6 +1,7 @@
 import pygame
 import sys
 from button import Button
+from renderer import render_text
 
 def show_menu():
     pygame.init()
@@ -60,8 +61,7 @@ def show_menu():
         screen.fill(black)
 
         # 绘制标题
-        font = pygame.font.Font(None, 64)
-        title = font.render("Gluttonous Snake", True, white)
+        title = render_text("Gluttonous Snake", 64, white)
         title_rect = title.get_rect(center=(250, 60))
         screen.blit(title, title_rect)
 
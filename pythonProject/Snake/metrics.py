@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+# 指标文件中每一行的字段（JSONL 的键、CSV 的列）
+METRIC_FIELDS = ('phase', 'episode', 'global_episode', 'score_mean', 'score_max', 'length_mean',
+                 'epsilon', 'q_states', 'time')
+
+
+class RingBuffer:
+    """定长环形缓冲区：只保留最近 size 个数值，内存不随训练轮数增长"""
+    def __init__(self, size):
+        self.data = np.zeros(size, dtype=np.float64)
+        self.size = size
+        self.count = 0
+
+    def append(self, value):
+        self.data[self.count % self.size] = value
+        self.count += 1
+
+    def values(self):
+        return self.data[:min(self.count, self.size)]
+
+    def mean(self):
+        return float(self.values().mean()) if self.count else 0.0
+
+    def max(self):
+        return float(self.values().max()) if self.count else 0.0
+
+
+class PhaseMetrics:
+    """
+    一个训练阶段的流式统计：最近 window 轮的得分和步数（环形缓冲区），
+    以及每 window 轮记录一次的平均得分曲线（avg_scores / record_points，每个点只占一个数）
+    对象可直接 pickle，检查点中保存它即可精确续训
+    """
+    def __init__(self, phase, window=1000):
+        self.phase = phase
+        self.window = window
+        self.episodes = 0
+        self.scores = RingBuffer(window)
+        self.lengths = RingBuffer(window)
+        self.avg_scores = []
+        self.record_points = []
+
+    def add(self, score, length):
+        """记录一局的得分和步数，返回本局后的轮数"""
+        self.scores.append(score)
+        self.lengths.append(length)
+        self.episodes += 1
+        if self.episodes % self.window == 0:
+            self.avg_scores.append(self.scores.mean())
+            self.record_points.append(self.episodes)
+        return self.episodes
+
+    def row(self, epsilon, q_table=None, episode_offset=0):
+        """当前统计的一行指标（METRIC_FIELDS）；q_states 为 Q 表中已访问过的状态数，未给出 q_table 时为 None"""
+        return {
+            'phase': self.phase,
+            'episode': self.episodes,
+            'global_episode': episode_offset + self.episodes,
+            'score_mean': self.scores.mean(),
+            'score_max': self.scores.max(),
+            'length_mean': self.lengths.mean(),
+            'epsilon': float(epsilon),
+            'q_states': None if q_table is None else int(np.count_nonzero(q_table.any(axis=1))),
+            'time': time.time(),
+        }
+
+    @classmethod
+    def from_history(cls, phase, history, window=1000):
+        """由旧版检查点中的 (scores, avg_scores, record_points) 重建（旧版没有记录步数）"""
+        scores, avg_scores, record_points = history
+        metrics = cls(phase, window)
+        for score in scores:
+            metrics.scores.append(score)
+        metrics.episodes = len(scores)
+        metrics.avg_scores = [float(s) for s in avg_scores]
+        metrics.record_points = list(record_points)
+        return metrics
+
+
+class MetricsSink:
+    """
+    把指标逐行追加写入 JSONL（默认）或 CSV（扩展名为 .csv）文件，每行写完立即 flush，训练中途即可查看或绘图
+    resume_from: 续训时传入检查点对应的全局轮数，文件中更晚的行（检查点之后、中断之前写入的）会被删除；
+                 None 表示新建文件
+    """
+    def __init__(self, path, resume_from=None):
+        self.path = path
+        self.csv = path.lower().endswith('.csv')
+        rows = []
+        if resume_from is not None and os.path.exists(path):
+            rows = [row for row in read_metrics(path) if row['global_episode'] <= resume_from]
+        self.file = open(path, 'w', newline='' if self.csv else None, encoding='utf-8')
+        if self.csv:
+            self._writer = csv.DictWriter(self.file, fieldnames=METRIC_FIELDS)
+            self._writer.writeheader()
+        for row in rows:
+            self._write(row)
+        self.file.flush()
+
+    def _write(self, row):
+        if self.csv:
+            self._writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + '\n')
+
+    def write(self, row):
+        self._write(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_metrics(path):
+    """读取 MetricsSink 写出的指标文件，返回字典列表（CSV 中的数值转换为 int/float，空值为 None）"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if not path.lower().endswith('.csv'):
+            return [json.loads(line) for line in f if line.strip()]
+        rows = []
+        for row in csv.DictReader(f):
+            for name in METRIC_FIELDS[1:]:
+                value = row[name]
+                if value == '':
+                    row[name] = None
+                elif name in ('episode', 'global_episode', 'q_states'):
+                    row[name] = int(value)
+                else:
+                    row[name] = float(value)
+            rows.append(row)
+        return rows
@@ -0,0 +1,255 @@
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from seeding import make_seed
+
+
+class MLP:
+    """
+    只用 NumPy 实现的全连接网络（ReLU 隐藏层 + 线性输出层），带反向传播和 Adam 优化器
+    权重为 float32，He 初始化
+    """
+    def __init__(self, sizes, rng, learning_rate=1e-3):
+        self.sizes = tuple(sizes)
+        self.learning_rate = learning_rate
+        self.params = []
+        for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+            self.params.append((rng.standard_normal((fan_in, fan_out)) * np.sqrt(2.0 / fan_in)).astype(np.float32))
+            self.params.append(np.zeros(fan_out, dtype=np.float32))
+        self._m = [np.zeros_like(p) for p in self.params]
+        self._v = [np.zeros_like(p) for p in self.params]
+        self._t = 0
+
+    def forward(self, x, cache=False):
+        """前向计算；cache=True 时同时返回各层输入，供 backward 使用"""
+        inputs = []
+        h = x
+        num_layers = len(self.params) // 2
+        for i in range(num_layers):
+            inputs.append(h)
+            h = h @ self.params[2 * i] + self.params[2 * i + 1]
+            if i < num_layers - 1:
+                h = np.maximum(h, 0)
+        return (h, inputs) if cache else h
+
+    def backward(self, inputs, grad_out):
+        """由输出梯度计算各参数梯度（与 params 顺序相同）"""
+        grads = [None] * len(self.params)
+        g = grad_out
+        for i in range(len(self.params) // 2 - 1, -1, -1):
+            grads[2 * i] = inputs[i].T @ g
+            grads[2 * i + 1] = g.sum(axis=0)
+            if i > 0:
+                # inputs[i] 是上一层 ReLU 的输出，大于 0 处梯度为 1
+                g = (g @ self.params[2 * i].T) * (inputs[i] > 0)
+        return grads
+
+    def adam_step(self, grads, beta1=0.9, beta2=0.999, eps=1e-8):
+        self._t += 1
+        lr = self.learning_rate * np.sqrt(1 - beta2 ** self._t) / (1 - beta1 ** self._t)
+        for p, g, m, v in zip(self.params, grads, self._m, self._v):
+            m *= beta1
+            m += (1 - beta1) * g
+            v *= beta2
+            v += (1 - beta2) * g * g
+            p -= (lr * m / (np.sqrt(v) + eps)).astype(np.float32)
+
+    def copy_params(self):
+        return [p.copy() for p in self.params]
+
+
+class MLPAgent:
+    """
+    神经网络 Q 函数智能体：与 QLAgent 接口相同（get_action / update / save / load，rng、epsilon 衰减规则一致），
+    但直接以连续状态（SnakeGame 的 14 维状态或任意维度的扩展状态）为输入，不需要离散化，
+    因此状态特征和棋盘大小都不受 Q 表内存限制。只依赖 NumPy，在 CPU 上运行
+    学习方式：转移存入经验回放缓冲区，每隔 train_every 个转移采样 batch_size 条做一次小批量训练
+    （Huber 损失 + Adam），目标值由每隔 target_update 次训练同步一次的目标网络计算
+    get_actions / update_batch 供批量环境（VecSnakeGame）一次处理所有棋盘
+    """
+    def __init__(self, state_size=14, action_size=4, hidden_sizes=(64, 64), learning_rate=1e-3, gamma=0.95,
+                 epsilon=1.0, epsilon_min=0.01, epsilon_decay=0.999, batch_size=64, buffer_size=100000,
+                 train_every=4, target_update=500, huber_delta=10.0, seed=None):
+        self.state_size = state_size
+        self.action_size = action_size
+        self.hidden_sizes = tuple(hidden_sizes)
+        self.learning_rate = learning_rate
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.epsilon_min = epsilon_min
+        self.epsilon_decay = epsilon_decay
+        self.batch_size = batch_size
+        self.train_every = train_every
+        self.target_update = target_update
+        self.huber_delta = huber_delta
+        # 探索用的 random.Random（与 QLAgent 相同，train_phase 每局重新设置种子），
+        # 网络初始化、批量探索和回放采样用 NumPy 生成器
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        self.net = MLP((state_size,) + self.hidden_sizes + (action_size,), self.np_rng, learning_rate)
+        self.target_params = self.net.copy_params()
+
+        # 经验回放缓冲区：并列数组，写满后覆盖最旧的转移
+        self.buffer_size = buffer_size
+        self.buf_states = np.zeros((buffer_size, state_size), dtype=np.float32)
+        self.buf_actions = np.zeros(buffer_size, dtype=np.int64)
+        self.buf_rewards = np.zeros(buffer_size, dtype=np.float32)
+        self.buf_next_states = np.zeros((buffer_size, state_size), dtype=np.float32)
+        self.buf_dones = np.zeros(buffer_size, dtype=bool)
+        self.buf_count = 0
+        self.train_steps = 0
+        self._pending = 0
+
+    def q_values(self, states):
+        """批量计算 Q 值：states 为 [N, state_size]，返回 [N, action_size]"""
+        return self.net.forward(np.asarray(states, dtype=np.float32))
+
+    def get_action(self, state):
+        if self.rng.random() < self.epsilon:
+            return self.rng.randint(0, self.action_size - 1)
+        return int(np.argmax(self.q_values(state[None, :])[0]))
+
+    def get_actions(self, states):
+        """批量 epsilon-greedy：一次前向计算所有状态"""
+        actions = np.argmax(self.q_values(states), axis=1)
+        explore = self.np_rng.random(len(actions)) < self.epsilon
+        actions[explore] = self.np_rng.integers(0, self.action_size, size=int(explore.sum()))
+        return actions
+
+    def update(self, state, action, reward, next_state, done):
+        self._store(state[None, :], action, reward, next_state[None, :], done)
+        if done:
+            self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
+
+    def update_batch(self, states, actions, rewards, next_states, dones):
+        """存入一批转移（如 VecSnakeGame.step 的结果）并按累计的转移数训练；每个结束的对局衰减一次 epsilon"""
+        self._store(states, actions, rewards, next_states, dones)
+        num_done = int(np.count_nonzero(dones))
+        if num_done:
+            self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay ** num_done)
+
+    def _store(self, states, actions, rewards, next_states, dones):
+        n = len(states)
+        idx = (self.buf_count + np.arange(n)) % self.buffer_size
+        self.buf_states[idx] = states
+        self.buf_actions[idx] = actions
+        self.buf_rewards[idx] = rewards
+        self.buf_next_states[idx] = next_states
+        self.buf_dones[idx] = dones
+        self.buf_count += n
+        self._pending += n
+        if self.buf_count >= self.batch_size:
+            while self._pending >= self.train_every:
+                self._pending -= self.train_every
+                self.train_step()
+
+    def train_step(self):
+        """从回放缓冲区采样一个小批量，做一次梯度更新，返回损失"""
+        idx = self.np_rng.integers(0, min(self.buf_count, self.buffer_size), size=self.batch_size)
+        states = self.buf_states[idx]
+        actions = self.buf_actions[idx]
+        rows = np.arange(self.batch_size)
+
+        target_net = self.net.params
+        self.net.params = self.target_params
+        next_q = self.net.forward(self.buf_next_states[idx])
+        self.net.params = target_net
+        targets = self.buf_rewards[idx] + self.gamma * np.where(self.buf_dones[idx], 0.0, next_q.max(axis=1))
+
+        q, inputs = self.net.forward(states, cache=True)
+        td = q[rows, actions] - targets
+        # Huber 损失的梯度：误差在 ±huber_delta 内为线性，之外截断
+        grad_out = np.zeros_like(q)
+        grad_out[rows, actions] = np.clip(td, -self.huber_delta, self.huber_delta) / self.batch_size
+        self.net.adam_step(self.net.backward(inputs, grad_out))
+
+        self.train_steps += 1
+        if self.train_steps % self.target_update == 0:
+            self.target_params = self.net.copy_params()
+        abs_td = np.abs(td)
+        return float(np.mean(np.where(abs_td <= self.huber_delta, 0.5 * td * td,
+                                      self.huber_delta * (abs_td - 0.5 * self.huber_delta))))
+
+    def save(self, filepath):
+        """保存网络结构、超参数和权重（.npz 格式，文件名按原样使用）"""
+        config = {
+            'state_size': self.state_size,
+            'action_size': self.action_size,
+            'hidden_sizes': list(self.hidden_sizes),
+            'gamma': self.gamma,
+            'epsilon': self.epsilon,
+        }
+        arrays = {f"param{i}": p for i, p in enumerate(self.net.params)}
+        with open(filepath, 'wb') as f:
+            np.savez(f, config=np.array(json.dumps(config)), **arrays)
+
+    def load(self, filepath):
+        """加载 save 保存的网络（结构以文件为准，超参数保持不变）"""
+        with np.load(filepath) as data:
+            config = json.loads(str(data['config']))
+            self.state_size = config['state_size']
+            self.action_size = config['action_size']
+            self.hidden_sizes = tuple(config['hidden_sizes'])
+            self.net = MLP((self.state_size,) + self.hidden_sizes + (self.action_size,), self.np_rng,
+                           self.learning_rate)
+            self.net.params = [data[f"param{i}"] for i in range(len(self.net.params))]
+        self.target_params = self.net.copy_params()
+
+
+def train_vectorized(agent, env, total_steps, report_every=1000):
+    """
+    在 VecSnakeGame 上训练 MLPAgent：每一步对所有棋盘做一次批量前向（get_actions），
+    转移整批存入回放缓冲区（update_batch）。每结束 report_every 局输出一次最近这些局的平均得分
+    返回每局得分列表
+    """
+    states = env.reset()
+    scores = []
+    next_report = report_every
+    start_time = time.perf_counter()
+    for step in range(1, total_steps // env.num_envs + 1):
+        actions = agent.get_actions(states)
+        next_states, rewards, dones = env.step(actions)
+        # 结束的棋盘已自动重置，next_states 中对应的是新一局的初始状态，但 done 时目标值不使用它
+        agent.update_batch(states, actions, rewards, next_states, dones)
+        states = next_states
+        if dones.any():
+            scores.extend(env.final_score[dones].tolist())
+        if len(scores) >= next_report:
+            elapsed = time.perf_counter() - start_time
+            print(f"Step {step * env.num_envs} | 局数 {len(scores)} | 平均得分(最近{report_every}局): "
+                  f"{np.mean(scores[-report_every:]):.2f} | Epsilon: {agent.epsilon:.3f} | "
+                  f"{step * env.num_envs / elapsed:.0f} 步/秒")
+            next_report += report_every
+    return scores
+
+
+if __name__ == "__main__":
+    from vec_env import VecSnakeGame
+
+    parser = argparse.ArgumentParser(description="在批量环境上训练 NumPy 神经网络 Q 函数")
+    parser.add_argument('--steps', type=int, default=2000000, help="总步数（所有棋盘合计）")
+    parser.add_argument('--num-envs', type=int, default=64, help="同时模拟的棋盘数")
+    parser.add_argument('--grid-size', type=int, default=20, help="棋盘大小")
+    parser.add_argument('--no-poison', action='store_true', help="不放置毒药")
+    parser.add_argument('--hidden', type=int, nargs='+', default=[64, 64], help="各隐藏层宽度")
+    parser.add_argument('--lr', type=float, default=1e-3, help="Adam 学习率")
+    parser.add_argument('--batch-size', type=int, default=64, help="小批量大小")
+    parser.add_argument('--epsilon-decay', type=float, default=0.999, help="每结束一局 epsilon 的衰减率")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子")
+    parser.add_argument('--save', default='mlp_agent.npz', help="保存网络的文件")
+    args = parser.parse_args()
+
+    seed = make_seed() if args.seed is None else args.seed
+    print(f"随机种子: {seed}（使用 --seed {seed} 可复现）")
+    poison = not args.no_poison
+    env = VecSnakeGame(num_envs=args.num_envs, grid_size=args.grid_size, poison_enabled=poison,
+                       poison_immediate=poison, seed=seed)
+    agent = MLPAgent(hidden_sizes=args.hidden, learning_rate=args.lr, batch_size=args.batch_size,
+                     epsilon_decay=args.epsilon_decay, seed=seed)
+    train_vectorized(agent, env, args.steps)
+    agent.save(args.save)
+    print(f"网络已保存为 {args.save}")
@@ -0,0 +1,56 @@
+import argparse
+
+from metrics import read_metrics
+from train import PHASES
+
+# 各指标的纵轴标签（滚动统计窗口为 PhaseMetrics 的默认 1000 轮）
+Y_LABELS = {
+    'score_mean': 'Average Score (last 1000 episodes)',
+    'score_max': 'Max Score (last 1000 episodes)',
+    'length_mean': 'Average Episode Length (last 1000 episodes)',
+    'epsilon': 'Epsilon',
+    'q_states': 'Visited Q-table States',
+}
+
+def plot_metrics(metrics_path, output_path='multi_stage_curve.png', show=False, field='score_mean'):
+    """
+    读取训练指标文件（train.py 写出的 .jsonl / .csv），按阶段绘制 field 随全局轮次的变化曲线并保存
+    训练过程中也可以运行，绘制到目前为止的数据
+    """
+    import matplotlib.pyplot as plt
+
+    rows = read_metrics(metrics_path)
+    styles = {phase['name']: (phase['label'], phase['marker']) for phase in PHASES}
+    # 按阶段分组，保持文件中的出现顺序
+    phases = {}
+    for row in rows:
+        if row[field] is not None:
+            phases.setdefault(row['phase'], []).append(row)
+
+    plt.figure(figsize=(12, 6))
+    for name, phase_rows in phases.items():
+        label, marker = styles.get(name, (name, None))
+        points = [row['global_episode'] for row in phase_rows]
+        values = [row[field] for row in phase_rows]
+        plt.plot(points, values, label=label, marker=marker, markevery=max(1, len(points) // 20))
+    plt.xlabel('Global Episode')
+    plt.ylabel(Y_LABELS.get(field, field))
+    plt.title('Multi-Stage Training Progress')
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(output_path)
+    print(f"学习曲线已保存为 {output_path}")
+    if show:
+        plt.show()
+    plt.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="根据训练指标文件绘制学习曲线")
+    parser.add_argument('metrics', nargs='?', default='train_metrics.jsonl', help="训练指标文件（.jsonl 或 .csv）")
+    parser.add_argument('--output', default='multi_stage_curve.png', help="输出图片")
+    parser.add_argument('--field', default='score_mean',
+                        help="绘制的指标：score_mean、score_max、length_mean、epsilon、q_states")
+    parser.add_argument('--show', action='store_true', help="保存后显示窗口")
+    args = parser.parse_args()
+    plot_metrics(args.metrics, args.output, args.show, args.field)
@@ -1,24 +1,175 @@
 import numpy as np
 import random
-from collections import defaultdict
+import struct
+import os
+
+from state_encoding import (DANGER_CODES, FOOD_DIRS, NUM_STATES, POISON_DIRS, POISON_DIST_LEVELS, direction_octant,
+                            encode_state)
+
+
+def convert_legacy_table(table, action_size=4):
+    """将旧版 {状态元组: Q值数组} 字典转换为稠密 Q 表"""
+    q_table = np.zeros((NUM_STATES, action_size), dtype=np.float32)
+    for key, q_values in table.items():
+        q_table[encode_state(*key)] = q_values
+    return q_table
+
+
+# Q 表二进制文件（.qtb）：64 字节头部（小端）依次为 魔数、版本号、动作数、状态数、
+# 离散化方案（四个状态分量的取值个数），之后是 float32[状态数, 动作数] 连续数组，可直接 np.memmap
+QTABLE_MAGIC = b'SNKQ'
+QTABLE_VERSION = 1
+QTABLE_HEADER = struct.Struct('<4sIIIIIII')
+QTABLE_HEADER_SIZE = 64
+QTABLE_SCHEMA = (FOOD_DIRS, DANGER_CODES, POISON_DIRS, POISON_DIST_LEVELS)
+
+
+def save_qtable(filepath, q_table):
+    """以 .qtb 格式保存 Q 表（先写临时文件再替换，写到一半中断也不会损坏原文件）"""
+    num_states, action_size = q_table.shape
+    header = QTABLE_HEADER.pack(QTABLE_MAGIC, QTABLE_VERSION, action_size, num_states, *QTABLE_SCHEMA)
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header.ljust(QTABLE_HEADER_SIZE, b'\0'))
+        f.write(np.ascontiguousarray(q_table, dtype='<f4').tobytes())
+    os.replace(tmp_path, filepath)
+
+
+def load_qtable(filepath, action_size=4, mmap=False):
+    """
+    读取 Q 表文件，返回 float32[状态数, 动作数] 数组
+    mmap: True 时以只读 np.memmap 打开，几乎不耗时，且多个进程共享同一份页缓存
+    旧版 pickle 文件（qtable_*.pkl）会自动转换
+    """
+    with open(filepath, 'rb') as f:
+        head = f.read(QTABLE_HEADER_SIZE)
+    if not head.startswith(QTABLE_MAGIC):
+        return _load_pickle_table(filepath, action_size)
+
+    _, version, file_action_size, num_states, *schema = QTABLE_HEADER.unpack_from(head)
+    if version != QTABLE_VERSION:
+        raise ValueError(f"不支持的 Q 表文件版本: {version}")
+    if tuple(schema) != QTABLE_SCHEMA or num_states != NUM_STATES or file_action_size != action_size:
+        raise ValueError(f"Q 表文件的离散化方案或动作数与当前智能体不一致: {filepath}")
+    shape = (num_states, file_action_size)
+    if mmap:
+        return np.memmap(filepath, dtype='<f4', mode='r', offset=QTABLE_HEADER_SIZE, shape=shape)
+    return np.fromfile(filepath, dtype='<f4', offset=QTABLE_HEADER_SIZE).reshape(shape)
+
+
+def _load_pickle_table(filepath, action_size):
+    """读取旧版 pickle Q 表：{状态元组: Q值数组} 字典或稠密数组"""
+    import pickle
+    with open(filepath, 'rb') as f:
+        table = pickle.load(f)
+    if isinstance(table, dict):
+        table = convert_legacy_table(table, action_size)
+    return np.asarray(table, dtype=np.float32)
+
+
+def convert_legacy_file(src_path, dst_path, action_size=4):
+    """将旧版 pickle 格式的 Q 表文件（如 qtable_final.pkl）转换为 .qtb 格式"""
+    save_qtable(dst_path, load_qtable(src_path, action_size))
+
+
+def find_qtable(stem):
+    """按 .qtb、旧版 .pkl 的顺序查找 Q 表文件，如 find_qtable('qtable_final')，找不到返回 None"""
+    for ext in ('.qtb', '.pkl'):
+        if os.path.exists(stem + ext):
+            return stem + ext
+    return None
+
+
+# 贪心策略文件（.qpol）：头部与 .qtb 相同（魔数不同），之后是 uint8[状态数] 的动作数组
+POLICY_MAGIC = b'SNKP'
+POLICY_VERSION = 1
+
+# 动作 0-3（上、下、左、右）的移动方向（与 SnakeGame.step 的 action_map 一致），
+# 以及该方向的距离等级在危险编码中的位移
+_ACTION_VECTORS = np.array([(0, -1), (0, 1), (-1, 0), (1, 0)], dtype=np.float64)
+_ACTION_DANGER_SHIFTS = np.array([6, 4, 2, 0])
+
+
+def _fallback_actions():
+    """
+    未访问状态的默认动作（只取决于食物方向和危险编码）：在下一格不会撞上的动作中选最朝向食物的一个，
+    四个方向都被挡住时按同样的规则在全部动作中选
+    """
+    # 各 8 方向编号的中心角：编号 = int((arctan2(dy, dx) + pi) / (pi / 4))
+    theta = (np.arange(FOOD_DIRS) + 0.5) * (np.pi / 4) - np.pi
+    toward_food = np.cos(theta)[:, None] * _ACTION_VECTORS[:, 0] + np.sin(theta)[:, None] * _ACTION_VECTORS[:, 1]
+    free = (np.arange(DANGER_CODES)[:, None] >> _ACTION_DANGER_SHIFTS) & 3 > 0
+    # 可走的动作加 2 分（朝向食物的分值在 [-1, 1] 之间），所以优先于所有被挡住的动作
+    scores = toward_food[:, None, :] + 2.0 * free[None, :, :]
+    actions = scores.argmax(axis=2).astype(np.uint8)
+    return np.repeat(actions.reshape(-1), POISON_DIRS * POISON_DIST_LEVELS)
+
+
+def compile_policy(q_table):
+    """
+    将 Q 表编译为贪心策略：uint8[状态数]，按状态编号直接查到动作，推理时不做 argmax、不分配内存
+    已访问的状态（Q 值不全为 0）取 argmax；未访问的状态取 _fallback_actions 的默认动作
+    """
+    q_table = np.asarray(q_table)
+    visited = q_table.any(axis=1)
+    return np.where(visited, q_table.argmax(axis=1), _fallback_actions()).astype(np.uint8)
+
+
+def save_policy(filepath, policy, action_size=4):
+    """以 .qpol 格式保存 compile_policy 的结果"""
+    header = QTABLE_HEADER.pack(POLICY_MAGIC, POLICY_VERSION, action_size, len(policy), *QTABLE_SCHEMA)
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header.ljust(QTABLE_HEADER_SIZE, b'\0'))
+        f.write(np.ascontiguousarray(policy, dtype=np.uint8).tobytes())
+    os.replace(tmp_path, filepath)
+
+
+def load_policy(filepath, action_size=4, mmap=False):
+    """
+    读取贪心策略，返回 uint8[状态数] 数组；若给出的是 Q 表文件（.qtb / 旧版 .pkl），加载后当场编译
+    mmap: True 时以只读 np.memmap 打开 .qpol 文件
+    """
+    with open(filepath, 'rb') as f:
+        head = f.read(QTABLE_HEADER_SIZE)
+    if not head.startswith(POLICY_MAGIC):
+        return compile_policy(load_qtable(filepath, action_size, mmap))
+
+    _, version, file_action_size, num_states, *schema = QTABLE_HEADER.unpack_from(head)
+    if version != POLICY_VERSION:
+        raise ValueError(f"不支持的策略文件版本: {version}")
+    if tuple(schema) != QTABLE_SCHEMA or num_states != NUM_STATES or file_action_size != action_size:
+        raise ValueError(f"策略文件的离散化方案或动作数与当前智能体不一致: {filepath}")
+    if mmap:
+        return np.memmap(filepath, dtype=np.uint8, mode='r', offset=QTABLE_HEADER_SIZE, shape=(num_states,))
+    return np.fromfile(filepath, dtype=np.uint8, offset=QTABLE_HEADER_SIZE)
+
 
 class QLAgent:
     def __init__(self, action_size=4, alpha=0.05, gamma=0.95,
-                 epsilon=1.0, epsilon_min=0.01, epsilon_decay=0.999):
+                 epsilon=1.0, epsilon_min=0.01, epsilon_decay=0.999, seed=None):
         self.action_size = action_size
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
         self.epsilon_min = epsilon_min
         self.epsilon_decay = epsilon_decay
-        self.q_table = defaultdict(lambda: np.zeros(action_size))
+        # 探索用的独立随机数生成器，seed 为 None 时取自系统熵源
+        self.rng = random.Random(seed)
+        # 稠密 Q 表：行号为 encode_state 打包的离散状态，未访问过的状态 Q 值为 0
+        self.q_table = np.zeros((NUM_STATES, action_size), dtype=np.float32)
+        # 最近一次离散化的状态对象及其行号：update 的 next_state 即下一步 get_action 的 state，
+        # 缓存后每次转移只需离散化一次（环境每步返回新的状态数组，按对象身份判断即可）
+        self._cached_state = None
+        self._cached_key = None
 
     def _discretize_state(self, state):
-        """将14维连续状态转换为离散键"""
+        """将14维连续状态转换为离散键（Q 表行号）"""
+        # 转为 Python 浮点数列表，避免逐个访问 NumPy 标量的开销
+        state = state.tolist()
+
         # 食物方向（8方向）
-        dx_food, dy_food = state[4], state[5]
-        angle_food = np.arctan2(dy_food, dx_food)
-        food_dir = int((angle_food + np.pi) / (2 * np.pi / 8)) % 8
+        food_dir = direction_octant(state[4], state[5])
 
         # 四个方向的距离等级（0-3），编码为一个8位整数
         dist_right = int(state[6])
@@ -30,28 +181,36 @@ class QLAgent:
         # 毒药信息
         poison_exists = int(state[10])
         if poison_exists == 1:
-            dx_poison, dy_poison = state[11], state[12]
-            poison_dist_norm = state[13]
-            angle_poison = np.arctan2(dy_poison, dx_poison)
-            poison_dir = int((angle_poison + np.pi) / (2 * np.pi / 8)) % 8
-            poison_dist_level = int(poison_dist_norm * 5)  # 0-4
+            poison_dir = direction_octant(state[11], state[12])
+            poison_dist_level = int(state[13] * 5)  # 0-4
         else:
             poison_dir = 8
             poison_dist_level = 5  # 特殊值表示无毒药
 
-        return (food_dir, danger_code, poison_dir, poison_dist_level)
+        return encode_state(food_dir, danger_code, poison_dir, poison_dist_level)
+
+    def state_key(self, state):
+        """返回状态的 Q 表行号，同一个状态对象只离散化一次；环境以 discrete_state=True 运行时状态本身就是行号"""
+        if type(state) is int:
+            return state
+        if state is self._cached_state:
+            return self._cached_key
+        key = self._discretize_state(state)
+        self._cached_state = state
+        self._cached_key = key
+        return key
 
     def get_action(self, state):
-        if random.random() < self.epsilon:
-            return random.randint(0, self.action_size - 1)
+        if self.rng.random() < self.epsilon:
+            return self.rng.randint(0, self.action_size - 1)
         else:
-            state_key = self._discretize_state(state)
+            state_key = self.state_key(state)
             q_values = self.q_table[state_key]
             return int(np.argmax(q_values))
 
     def update(self, state, action, reward, next_state, done):
-        state_key = self._discretize_state(state)
-        next_state_key = self._discretize_state(next_state)
+        state_key = self.state_key(state)
+        next_state_key = self.state_key(next_state)
         current_q = self.q_table[state_key][action]
         if done:
             target = reward
@@ -62,12 +221,21 @@ class QLAgent:
         if done:
             self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
 
+    def update_batch(self, state_keys, actions, rewards, next_state_keys, dones):
+        """
+        一次向量化地应用一批转移（参数均为数组，状态为 Q 表行号，如 ReplayBuffer.sample 的结果）
+        所有目标值都基于更新前的 Q 表计算；同一 (状态, 动作) 在批内出现多次时增量累加（np.add.at）
+        不衰减 epsilon（epsilon 只随真实对局的结束衰减）
+        """
+        q_table = self.q_table
+        actions = actions.astype(np.int64)
+        targets = rewards + self.gamma * np.where(dones, 0.0, q_table[next_state_keys].max(axis=1))
+        td_errors = targets - q_table[state_keys, actions]
+        np.add.at(q_table, (state_keys, actions), (self.alpha * td_errors).astype(np.float32))
+
     def save(self, filepath):
-        import pickle
-        with open(filepath, 'wb') as f:
-            pickle.dump(dict(self.q_table), f)
-
-    def load(self, filepath):
-        import pickle
-        with open(filepath, 'rb') as f:
-            self.q_table = defaultdict(lambda: np.zeros(self.action_size), pickle.load(f))
+        save_qtable(filepath, self.q_table)
+
+    def load(self, filepath, mmap=False):
+        """加载 Q 表（.qtb 或旧版 .pkl）；mmap=True 时只读映射，适合只做推理的演示/评估进程"""
+        self.q_table = load_qtable(filepath, self.action_size, mmap)
@@ -0,0 +1,306 @@
+import bisect
+import os
+import struct
+
+import numpy as np
+
+from game_env import SnakeGame
+
+# 对局录像文件（.snkr）：8 字节文件头（魔数、版本号），之后逐局追加记录。每局依次为：
+#   头部（小端）：种子 u64、步数 u32、棋盘大小 u16、tick_ms u16、标志 u8、得分 i32、关键帧间隔 u32、关键帧数据长度 u32
+#   动作流：每个动作 2 位，每字节 4 个动作
+#   关键帧数据（仅关键帧间隔 > 0 时）：关键帧个数 u32，之后逐个排列关键帧，每个为 KEYFRAME 结构（步数、放置序号、蛇长、
+#   方向、物品、计数和计时）+ 蛇身坐标（u16 x, y，蛇头在前）；最后是重置之后每次放置食物/毒药的结果（u16 x * 棋盘大小 + y，
+#   None 为 NO_CELL）
+# 对局以 SnakeGame.reset(种子) 开始，且必须是虚拟时钟（clock_mode='sim'），因此 种子 + 动作流 即可完整重现整局。
+# 关键帧不保存随机数状态和空格表：从关键帧继续模拟时按放置记录（SnakeGame.placement_script）放置物品，
+# 记录时也不改动 game 的随机数，录制与否不影响同一种子生成的对局
+RECORD_MAGIC = b'SNKR'
+RECORD_VERSION = 2
+FILE_HEADER = struct.Struct('<4sI')
+EPISODE_HEADER = struct.Struct('<QIHHBiII')
+KEYFRAME_COUNT = struct.Struct('<I')
+NO_CELL = 0xFFFF
+FLAG_POISON = 1
+FLAG_POISON_IMMEDIATE = 2
+# 步数、已放置次数（放置记录中的下标）、蛇长、方向 (dx, dy)、食物 (x, y)、毒药 (x, y)、得分、步数计数、上一动作、上一奖励、与食物/毒药的上一距离、
+# 虚拟时钟、本局开始时间、食物生成/闪烁开始时间、毒药生成/闪烁开始时间、食物/毒药状态；
+# 没有食物/毒药时坐标为 -1，上一动作为 None 时为 -1，距离为 None 时为 -1，上一奖励为 None 时为 NaN
+KEYFRAME = struct.Struct('<IIIbbhhhhiIbdii6q2b')
+
+
+def pack_actions(actions):
+    """将动作序列（0-3）按每字节 4 个打包"""
+    actions = np.asarray(actions, dtype=np.uint8)
+    padded = np.zeros(-(-len(actions) // 4) * 4, dtype=np.uint8)
+    padded[:len(actions)] = actions
+    padded = padded.reshape(-1, 4)
+    return (padded[:, 0] | (padded[:, 1] << 2) | (padded[:, 2] << 4) | (padded[:, 3] << 6)).tobytes()
+
+
+def unpack_actions(data, num_steps):
+    """pack_actions 的逆操作，返回 uint8 数组"""
+    packed = np.frombuffer(data, dtype=np.uint8)
+    actions = np.stack([(packed >> shift) & 3 for shift in (0, 2, 4, 6)], axis=1).reshape(-1)
+    return actions[:num_steps]
+
+
+def _none_to(value, default):
+    return default if value is None else value
+
+
+def pack_keyframe(step, placement_index, game):
+    """把 game 的当前局面打包为一个关键帧（bytes），placement_index 为此前的放置次数"""
+    food = _none_to(game.food, (-1, -1))
+    poison = _none_to(game.poison, (-1, -1))
+    header = KEYFRAME.pack(step, placement_index, len(game.snake), game.direction[0], game.direction[1], food[0], food[1],
+                           poison[0], poison[1], game.score, game.steps, _none_to(game.last_action, -1),
+                           _none_to(game.last_reward, float('nan')), _none_to(game.prev_food_dist, -1),
+                           _none_to(game.prev_poison_dist, -1), game.sim_time, game.game_start_time,
+                           game.food_generate_time, game.food_blink_start, game.poison_generate_time,
+                           game.poison_blink_start, game.food_state, game.poison_state)
+    return header + np.array(game.snake, dtype='<u2').tobytes()
+
+
+def pack_placements(placements, grid_size):
+    """把放置记录（坐标或 None 的列表）打包为 u16 格子编号"""
+    cells = [NO_CELL if pos is None else pos[0] * grid_size + pos[1] for pos in placements]
+    return np.array(cells, dtype='<u2').tobytes()
+
+
+def unpack_keyframes(data, grid_size):
+    """
+    解析一局的关键帧数据，返回 (关键帧, 放置记录)：关键帧为 [(步数, 字段字典), ...]，字段字典供 load_keyframe 使用；
+    放置记录为坐标或 None 的列表。没有关键帧数据时返回 ([], None)
+    """
+    if not data:
+        return [], None
+    keyframes = []
+    (count,) = KEYFRAME_COUNT.unpack_from(data)
+    offset = KEYFRAME_COUNT.size
+    for _ in range(count):
+        (step, placement_index, length, dx, dy, food_x, food_y, poison_x, poison_y, score, steps, last_action, last_reward,
+         prev_food_dist, prev_poison_dist, sim_time, game_start_time, food_generate_time, food_blink_start,
+         poison_generate_time, poison_blink_start, food_state, poison_state) = KEYFRAME.unpack_from(data, offset)
+        offset += KEYFRAME.size
+        body = np.frombuffer(data, dtype='<u2', count=2 * length, offset=offset).reshape(-1, 2)
+        offset += body.nbytes
+        keyframes.append((step, {
+            'snake': [(int(x), int(y)) for x, y in body],
+            'direction': (dx, dy),
+            'food': None if food_x < 0 else (food_x, food_y),
+            'poison': None if poison_x < 0 else (poison_x, poison_y),
+            'score': score,
+            'done': False,
+            'steps': steps,
+            'last_action': None if last_action < 0 else last_action,
+            'last_reward': None if last_reward != last_reward else last_reward,
+            'prev_food_dist': None if prev_food_dist < 0 else prev_food_dist,
+            'prev_poison_dist': None if prev_poison_dist < 0 else prev_poison_dist,
+            'sim_time': sim_time,
+            'game_start_time': game_start_time,
+            'food_generate_time': food_generate_time,
+            'food_state': food_state,
+            'food_blink_start': food_blink_start,
+            'poison_generate_time': poison_generate_time,
+            'poison_state': poison_state,
+            'poison_blink_start': poison_blink_start,
+            'placement_index': placement_index,
+        }))
+    cells = np.frombuffer(data, dtype='<u2', offset=offset)
+    placements = [None if cell == NO_CELL else divmod(int(cell), grid_size) for cell in cells]
+    return keyframes, placements
+
+
+def load_keyframe(game, fields):
+    """把 unpack_keyframes 得到的局面恢复到 game（game.placement_script 需已设为该局的放置记录）"""
+    for name in SnakeGame.SNAPSHOT_FIELDS:
+        setattr(game, name, fields[name])
+    game._set_snake(fields['snake'])
+    game.placement_index = fields['placement_index']
+
+
+class EpisodeRecorder:
+    """
+    对局录像：每局记录为 种子 + 打包的动作流，可选每隔 keyframe_every 步保存一个关键帧（便于快速定位），
+    逐局追加写入 .snkr 文件。每步只追加一个字节，写盘在一局结束时进行
+    keyframe_every > 0 时还通过 game.placement_log 记录每次放置的结果；记录不改变 game 的随机数，对局与不记录时相同
+    """
+    def __init__(self, path, keyframe_every=0):
+        self.path = path
+        self.keyframe_every = keyframe_every
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            _read_file_header(path)
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION))
+        self.episodes = 0
+        self.game = None
+        self.seed = None
+        self._actions = bytearray()
+        self._keyframes = bytearray()
+        self._num_keyframes = 0
+        self._placements = []
+
+    def reset(self, game, seed=None):
+        """以 seed（默认从 game.rng 取一个）重置 game，开始记录新的一局，返回初始状态"""
+        if game.clock_mode != 'sim':
+            raise ValueError("只能记录虚拟时钟（clock_mode='sim'）的对局")
+        if seed is None:
+            seed = game.rng.getrandbits(64)
+        self.game = game
+        self.seed = seed
+        self._actions = bytearray()
+        self._keyframes = bytearray()
+        self._num_keyframes = 0
+        state = game.reset(seed)
+        if self.keyframe_every > 0:
+            # 重置时的放置由种子决定，回放时同样由种子重现，只记录之后的放置
+            self._placements = []
+            game.placement_log = self._placements
+        return state
+
+    def record(self, action):
+        """在 game.step(action) 之后调用；对局结束时自动写入文件"""
+        self._actions.append(action)
+        game = self.game
+        step = len(self._actions)
+        if self.keyframe_every > 0 and step % self.keyframe_every == 0 and not game.done:
+            self._keyframes += pack_keyframe(step, len(self._placements), game)
+            self._num_keyframes += 1
+        if game.done:
+            self._write()
+
+    def _write(self):
+        game = self.game
+        keyframe_data = b''
+        if self.keyframe_every > 0:
+            game.placement_log = None
+            keyframe_data = (KEYFRAME_COUNT.pack(self._num_keyframes) + bytes(self._keyframes)
+                             + pack_placements(self._placements, game.grid_size))
+        flags = (FLAG_POISON if game.poison_enabled else 0) | (FLAG_POISON_IMMEDIATE if game.poison_immediate else 0)
+        self.file.write(EPISODE_HEADER.pack(self.seed, len(self._actions), game.grid_size, game.tick_ms, flags,
+                                            game.score, self.keyframe_every, len(keyframe_data)))
+        self.file.write(pack_actions(self._actions))
+        self.file.write(keyframe_data)
+        self.episodes += 1
+        self.game = None
+
+    def close(self):
+        self.file.close()
+
+
+def _read_file_header(path):
+    with open(path, 'rb') as f:
+        magic, version = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != RECORD_MAGIC:
+        raise ValueError(f"不是对局录像文件: {path}")
+    if version != RECORD_VERSION:
+        raise ValueError(f"不支持的录像文件版本: {version}")
+
+
+class RecordedEpisode:
+    """一局录像：种子、环境参数、动作流、关键帧和放置记录（unpack_keyframes 的结果）"""
+    def __init__(self, seed, num_steps, grid_size, tick_ms, flags, score, keyframe_every, actions, keyframes,
+                 placements):
+        self.seed = seed
+        self.num_steps = num_steps
+        self.grid_size = grid_size
+        self.tick_ms = tick_ms
+        self.poison_enabled = bool(flags & FLAG_POISON)
+        self.poison_immediate = bool(flags & FLAG_POISON_IMMEDIATE)
+        self.score = score
+        self.keyframe_every = keyframe_every
+        self.actions = actions
+        self.keyframes = keyframes
+        self.placements = placements
+
+    def new_game(self, cell_size=25):
+        """返回处于第 0 步（刚重置）的 SnakeGame"""
+        return SnakeGame(grid_size=self.grid_size, cell_size=cell_size, poison_enabled=self.poison_enabled,
+                         poison_immediate=self.poison_immediate, clock_mode='sim', tick_ms=self.tick_ms,
+                         seed=self.seed)
+
+
+class EpisodeLog:
+    """读取 .snkr 文件：打开时只扫描各局头部建立索引，按需读取单局"""
+    def __init__(self, path):
+        _read_file_header(path)
+        self.path = path
+        self.offsets = []
+        self.headers = []
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            offset = FILE_HEADER.size
+            while offset + EPISODE_HEADER.size <= size:
+                f.seek(offset)
+                header = EPISODE_HEADER.unpack(f.read(EPISODE_HEADER.size))
+                end = offset + EPISODE_HEADER.size + -(-header[1] // 4) + header[7]
+                if end > size:
+                    break  # 写到一半的最后一局（如训练被中断）
+                self.offsets.append(offset)
+                self.headers.append(header)
+                offset = end
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        seed, num_steps, grid_size, tick_ms, flags, score, keyframe_every, keyframe_size = self.headers[index]
+        with open(self.path, 'rb') as f:
+            f.seek(self.offsets[index] + EPISODE_HEADER.size)
+            actions = unpack_actions(f.read(-(-num_steps // 4)), num_steps)
+            keyframes, placements = unpack_keyframes(f.read(keyframe_size), grid_size)
+        return RecordedEpisode(seed, num_steps, grid_size, tick_ms, flags, score, keyframe_every, actions, keyframes,
+                               placements)
+
+    def scores(self):
+        return np.array([header[5] for header in self.headers])
+
+    def lengths(self):
+        return np.array([header[1] for header in self.headers])
+
+
+class Replay:
+    """
+    在一局录像中任意定位：从不晚于目标步的最近关键帧恢复，再按动作流模拟到目标步。
+    向前播放时每隔 CACHE_EVERY 步在内存中补一个快照（SnakeGame.save_snapshot），往回拖动也只需重新模拟少量步数
+    """
+    CACHE_EVERY = 100
+
+    def __init__(self, episode, cell_size=25):
+        self.episode = episode
+        self.game = episode.new_game(cell_size)
+        # 有放置记录时，重置之后的放置都按记录进行，与从哪个关键帧开始模拟无关
+        self.game.placement_script = episode.placements
+        self.step_index = 0
+        self._keyframes = {0: self.game.save_snapshot()}
+        # 录像中的关键帧：首次定位到时由 load_keyframe 恢复，之后替换为内存快照
+        self._recorded = dict(episode.keyframes)
+        self._keyframes.update(self._recorded)
+        self._keyframe_steps = sorted(self._keyframes)
+
+    def seek(self, step_index):
+        """定位到第 step_index 步之后的局面（0 为初始局面），返回 SnakeGame"""
+        step_index = max(0, min(step_index, self.episode.num_steps))
+        nearest = self._keyframe_steps[bisect.bisect_right(self._keyframe_steps, step_index) - 1]
+        if step_index < self.step_index or nearest > self.step_index:
+            self._restore(nearest)
+        actions = self.episode.actions
+        while self.step_index < step_index:
+            self.game.step(int(actions[self.step_index]))
+            self.step_index += 1
+            if self.step_index % self.CACHE_EVERY == 0 and self.step_index not in self._keyframes:
+                self._keyframes[self.step_index] = self.game.save_snapshot()
+                bisect.insort(self._keyframe_steps, self.step_index)
+        return self.game
+
+    def _restore(self, step_index):
+        keyframe = self._keyframes[step_index]
+        if step_index in self._recorded and keyframe is self._recorded[step_index]:
+            load_keyframe(self.game, keyframe)
+            self._keyframes[step_index] = self.game.save_snapshot()
+        else:
+            self.game.load_snapshot(keyframe)
+        self.step_index = step_index
@@ -0,0 +1,265 @@
+from itertools import islice
+
+import pygame
+
+# 文字缓存上限：计时器每秒产生一条新文字，超过上限时整体清空
+TEXT_CACHE_SIZE = 512
+
+_fonts = {}
+_texts = {}
+
+
+def _clear_text_cache():
+    _fonts.clear()
+    _texts.clear()
+
+
+def get_font(size):
+    """返回缓存的默认字体对象（pygame.quit 后自动失效）"""
+    font = _fonts.get(size)
+    if font is None:
+        if not _fonts:
+            pygame.register_quit(_clear_text_cache)
+        font = _fonts[size] = pygame.font.Font(None, size)
+    return font
+
+
+def render_text(text, size, color):
+    """返回缓存的文字图像，相同的文字、字号和颜色只渲染一次"""
+    key = (text, size, color)
+    surface = _texts.get(key)
+    if surface is None:
+        if len(_texts) >= TEXT_CACHE_SIZE:
+            _texts.clear()
+        surface = _texts[key] = get_font(size).render(text, True, color)
+    return surface
+
+
+class SnakeRenderer:
+    """
+    SnakeGame 的 pygame 渲染层，游戏核心本身不依赖 pygame
+    背景和网格只预渲染一次；之后每帧只重绘变化的格子（新蛇头、旧蛇头、移走的蛇尾、食物和毒药），
+    render 返回需要刷新的矩形列表，可直接传给 pygame.display.update
+    """
+    def __init__(self, game):
+        self.game = game
+        self.background = None
+        self._screen = None
+        # 上一帧画到屏幕上的内容：(蛇身 deque, 蛇头, 蛇尾, 长度, 食物, 毒药)，None 表示需要整屏重绘
+        self._drawn = None
+
+    def invalidate(self):
+        """屏幕被其他内容（如半透明遮罩）覆盖后调用，下一帧整屏重绘"""
+        self._drawn = None
+
+    def _build_background(self, screen):
+        """预渲染白色背景、游戏区域和网格线"""
+        game = self.game
+        background = pygame.Surface(screen.get_size(), 0, screen)
+        # 填充白色背景
+        background.fill((255, 255, 255))
+        offset = game.margin
+
+        # 绘制游戏区域背景（浅灰色，可选）
+        game_rect = pygame.Rect(offset, offset, game.game_width, game.game_height)
+        pygame.draw.rect(background, (240, 240, 240), game_rect)  # 极浅灰背景
+
+        # 绘制网格线（浅灰色）
+        grid_color = (200, 200, 200)
+        for x in range(0, game.game_width + 1, game.cell_size):
+            pygame.draw.line(background, grid_color, (offset + x, offset),
+                             (offset + x, offset + game.game_height))
+        for y in range(0, game.game_height + 1, game.cell_size):
+            pygame.draw.line(background, grid_color, (offset, offset + y),
+                             (offset + game.game_width, offset + y))
+        self.background = background
+        self._screen = screen
+        self._drawn = None
+
+    def clear(self, screen, rect):
+        """用背景覆盖 rect 区域（如擦除上一帧的文字），区域内的格子按当前局面重绘，返回需要刷新的矩形"""
+        game = self.game
+        rect = pygame.Rect(rect)
+        screen.blit(self.background, rect, rect)
+        board = rect.clip(pygame.Rect(game.margin, game.margin, game.game_width, game.game_height))
+        if board.width == 0 or board.height == 0:
+            return rect
+        cells = []
+        for x in range((board.left - game.margin) // game.cell_size,
+                       (board.right - 1 - game.margin) // game.cell_size + 1):
+            for y in range((board.top - game.margin) // game.cell_size,
+                           (board.bottom - 1 - game.margin) // game.cell_size + 1):
+                cells.append(self._redraw_cell(screen, (x, y)))
+        return rect.unionall(cells)
+
+    def cell_rect(self, cell):
+        game = self.game
+        return pygame.Rect(game.margin + cell[0] * game.cell_size,
+                           game.margin + cell[1] * game.cell_size,
+                           game.cell_size, game.cell_size)
+
+    def render(self, screen):
+        """绘制游戏画面（白色背景，彩色元素），返回需要刷新的矩形列表"""
+        game = self.game
+        if screen is not self._screen or self.background.get_size() != screen.get_size():
+            self._build_background(screen)
+
+        cells = self._changed_cells()
+        if cells is None:
+            screen.blit(self.background, (0, 0))
+            for segment in islice(game.snake, 1, None):
+                self._draw_body(screen, segment)
+            self._draw_head(screen)
+            self._draw_food(screen)
+            self._draw_poison(screen)
+            dirty = [screen.get_rect()]
+        else:
+            dirty = [self._redraw_cell(screen, cell) for cell in cells]
+
+        snake = game.snake
+        self._drawn = (snake, snake[0], snake[-1], len(snake), game.food, game.poison)
+        return dirty
+
+    def _redraw_cell(self, screen, cell):
+        """按整屏绘制时的顺序（蛇身、蛇头、食物、毒药）重绘一个格子，返回其矩形"""
+        game = self.game
+        rect = self.cell_rect(cell)
+        screen.blit(self.background, rect, rect)
+        if cell == game.snake[0]:
+            self._draw_head(screen)
+        elif game.occupied[cell]:
+            self._draw_body(screen, cell)
+        if cell == game.food:
+            self._draw_food(screen)
+        if cell == game.poison:
+            self._draw_poison(screen)
+        return rect
+
+    def _changed_cells(self):
+        """返回与上一帧相比需要重绘的格子集合；无法增量更新（首帧、重置、跳帧）时返回 None"""
+        if self._drawn is None:
+            return None
+        snake, head, tail, length, food, poison = self._drawn
+        game = self.game
+        if game.snake is not snake:
+            return None
+        grown = len(snake) - length
+        if grown == 0 and snake[0] == head and snake[-1] == tail:
+            cells = {head}  # 蛇未移动，只重绘蛇头（方向、死亡状态可能变化）
+        elif len(snake) > 1 and snake[1] == head and grown in (0, 1):
+            cells = {head, snake[0]}
+            if grown == 0:
+                cells.add(tail)
+        else:
+            return None
+        # 食物、毒药可能移动、消失或闪烁，新旧位置都重绘
+        for cell in (food, poison, game.food, game.poison):
+            if cell is not None:
+                cells.add(cell)
+        return cells
+
+    def _draw_body(self, screen, segment):
+        # 绘制蛇身（深绿色，与白色背景对比）
+        rect = self.cell_rect(segment)
+        pygame.draw.rect(screen, (0, 150, 0), rect)  # 深绿
+        pygame.draw.rect(screen, (0, 80, 0), rect, 2)  # 深绿色边框
+
+    def _draw_head(self, screen):
+        # 绘制蛇头（圆形，亮绿色）
+        game = self.game
+        offset = game.margin
+        head = game.snake[0]
+        head_center = (offset + head[0] * game.cell_size + game.cell_size // 2,
+                       offset + head[1] * game.cell_size + game.cell_size // 2)
+        head_radius = game.cell_size // 2 - 2
+        pygame.draw.circle(screen, (0, 200, 0), head_center, head_radius)
+        pygame.draw.circle(screen, (0, 100, 0), head_center, head_radius, 2)
+
+        # 眼睛位置（根据方向计算）
+        eye_offset = head_radius // 2
+        eye_radius = 2
+        if game.direction == (1, 0):  # 右
+            eye1 = (head_center[0] + eye_offset, head_center[1] - eye_offset)
+            eye2 = (head_center[0] + eye_offset, head_center[1] + eye_offset)
+        elif game.direction == (-1, 0):  # 左
+            eye1 = (head_center[0] - eye_offset, head_center[1] - eye_offset)
+            eye2 = (head_center[0] - eye_offset, head_center[1] + eye_offset)
+        elif game.direction == (0, -1):  # 上
+            eye1 = (head_center[0] - eye_offset, head_center[1] - eye_offset)
+            eye2 = (head_center[0] + eye_offset, head_center[1] - eye_offset)
+        else:  # 下
+            eye1 = (head_center[0] - eye_offset, head_center[1] + eye_offset)
+            eye2 = (head_center[0] + eye_offset, head_center[1] + eye_offset)
+
+        # 绘制眼睛：根据是否死亡选择画圆或画X
+        if game.done:
+            # 死亡时画X（黑色）
+            x_size = eye_radius * 2
+            for eye in (eye1, eye2):
+                pygame.draw.line(screen, (0, 0, 0),
+                                 (eye[0] - x_size, eye[1] - x_size),
+                                 (eye[0] + x_size, eye[1] + x_size), 2)
+                pygame.draw.line(screen, (0, 0, 0),
+                                 (eye[0] + x_size, eye[1] - x_size),
+                                 (eye[0] - x_size, eye[1] + x_size), 2)
+        else:
+            # 正常时画圆
+            pygame.draw.circle(screen, (0, 0, 0), eye1, eye_radius)
+            pygame.draw.circle(screen, (0, 0, 0), eye2, eye_radius)
+
+    def _draw_food(self, screen):
+        # 绘制食物（金色菱形，消失时闪烁）
+        game = self.game
+        if game.food is None:
+            return
+        offset = game.margin
+        food_x = offset + game.food[0] * game.cell_size + game.cell_size // 2
+        food_y = offset + game.food[1] * game.cell_size + game.cell_size // 2
+        points = [
+            (food_x, food_y - game.cell_size // 2 + 2),
+            (food_x + game.cell_size // 2 - 2, food_y),
+            (food_x, food_y + game.cell_size // 2 - 2),
+            (food_x - game.cell_size // 2 + 2, food_y),
+        ]
+        current_time = pygame.time.get_ticks()
+        if game.food_state == 1:  # 闪烁状态
+            if (current_time // 200) % 2 == 0:
+                color = (255, 215, 0)  # 金色
+            else:
+                color = (255, 165, 0)  # 橙色
+        else:
+            color = (255, 215, 0)  # 金色
+        pygame.draw.polygon(screen, color, points)
+        # 高光（小白点）
+        pygame.draw.circle(screen, (255, 255, 255), (food_x - 2, food_y - 2), 2)
+
+    def _draw_poison(self, screen):
+        # 绘制毒药（圆形，中间有红色高光）
+        game = self.game
+        if not game.poison_enabled or game.poison is None:
+            return
+        offset = game.margin
+        poison_x = offset + game.poison[0] * game.cell_size + game.cell_size // 2
+        poison_y = offset + game.poison[1] * game.cell_size + game.cell_size // 2
+        radius = game.cell_size // 2 - 2
+        current_time = pygame.time.get_ticks()
+
+        # 确定颜色（闪烁效果）
+        if game.poison_state == 1:  # 闪烁状态
+            if (current_time // 200) % 2 == 0:
+                base_color = (128, 0, 128)  # 紫色
+            else:
+                base_color = (255, 255, 255)  # 白色
+        else:
+            base_color = (128, 0, 128)  # 紫色
+
+        # 绘制圆形
+        pygame.draw.circle(screen, base_color, (poison_x, poison_y), radius)
+
+        # 绘制红色高光（中心小圆）
+        highlight_radius = max(2, radius // 3)
+        highlight_color = (255, 100, 100)  # 亮红色
+        pygame.draw.circle(screen, highlight_color, (poison_x, poison_y), highlight_radius)
+
+        # 白色边框
+        pygame.draw.circle(screen, (255, 255, 255), (poison_x, poison_y), radius, 1)
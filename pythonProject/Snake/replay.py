@@ -0,0 +1,131 @@
+import argparse
+import sys
+
+from recorder import EpisodeLog, Replay
+
+HELP_TEXT = "Space: play/pause  Left/Right: step  PgUp/PgDn: 100 steps  Up/Down: speed  N/P: episode"
+
+
+def list_episodes(log):
+    """打印录像文件中各局的概要"""
+    print(f"{'#':>6} {'steps':>7} {'score':>6} {'grid':>5} {'poison':>8}  seed")
+    for i, (seed, num_steps, grid_size, _, flags, score, _, _) in enumerate(log.headers):
+        poison = ('immed.' if flags & 2 else 'delayed') if flags & 1 else '-'
+        print(f"{i:>6} {num_steps:>7} {score:>6} {grid_size:>5} {poison:>8}  {seed}")
+    if len(log) > 0:
+        scores = log.scores()
+        print(f"共 {len(log)} 局，平均得分 {scores.mean():.2f}，最高 {scores.max()}（第 {scores.argmax()} 局）")
+
+
+def view(log, index, start_step=0, speed=10.0, fps=60):
+    """
+    播放第 index 局，可暂停、逐步前进/后退、调整速度、点击进度条跳转
+    speed: 每秒播放的步数（可以超过帧率）
+    """
+    import pygame
+    from renderer import SnakeRenderer, render_text
+
+    pygame.init()
+    clock = pygame.time.Clock()
+    screen = None
+    replay = None
+    renderer = None
+    playing = True
+    progress = 0.0
+
+    def load(i):
+        nonlocal replay, renderer, screen, index
+        index = i % len(log)
+        replay = Replay(log[index])
+        renderer = SnakeRenderer(replay.game)
+        game = replay.game
+        if screen is None or screen.get_size() != (game.width, game.height):
+            screen = pygame.display.set_mode((game.width, game.height))
+        pygame.display.set_caption(f"Replay - {log.path} #{index}")
+
+    load(index)
+    replay.seek(start_step)
+
+    while True:
+        game = replay.game
+        bar = pygame.Rect(10, game.margin + game.game_height + 10, game.width - 20, 10)
+        total = replay.episode.num_steps
+        target = replay.step_index
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    if replay.step_index >= total:
+                        target = 0
+                    playing = not playing
+                elif event.key in (pygame.K_RIGHT, pygame.K_LEFT):
+                    playing = False
+                    target += 1 if event.key == pygame.K_RIGHT else -1
+                elif event.key in (pygame.K_PAGEDOWN, pygame.K_PAGEUP):
+                    target += 100 if event.key == pygame.K_PAGEDOWN else -100
+                elif event.key == pygame.K_HOME:
+                    target = 0
+                elif event.key == pygame.K_END:
+                    target = total
+                elif event.key == pygame.K_UP:
+                    speed = min(speed * 2, 10000)
+                elif event.key == pygame.K_DOWN:
+                    speed = max(speed / 2, 0.5)
+                elif event.key in (pygame.K_n, pygame.K_p):
+                    load(index + (1 if event.key == pygame.K_n else -1))
+                    target = 0
+                    progress = 0.0
+                    break
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and bar.collidepoint(event.pos):
+                target = round((event.pos[0] - bar.left) / bar.width * total)
+
+        if playing and replay.step_index < total:
+            progress += speed / fps
+            advance = int(progress)
+            progress -= advance
+            target += advance
+
+        game = replay.seek(target)
+        total = replay.episode.num_steps
+
+        dirty = renderer.render(screen)
+        hud_top = renderer.clear(screen, (0, 0, game.width, game.margin))
+        hud_bottom = renderer.clear(screen, (0, game.margin + game.game_height, game.width, game.margin))
+        dirty += [hud_top, hud_bottom]
+
+        screen.blit(render_text(f"Episode {index}/{len(log) - 1}  Step {replay.step_index}/{total}", 26, (0, 0, 0)), (10, 5))
+        screen.blit(render_text(f"Score: {game.score}  Speed: {speed:g} steps/s", 26, (0, 0, 0)), (10, 27))
+        if game.done:
+            text = render_text("Dead", 26, (200, 0, 0))
+            screen.blit(text, text.get_rect(topright=(game.width - 10, 5)))
+        pygame.draw.rect(screen, (220, 220, 220), bar)
+        if total > 0:
+            filled = bar.copy()
+            filled.width = round(bar.width * replay.step_index / total)
+            pygame.draw.rect(screen, (0, 150, 0), filled)
+        screen.blit(render_text(HELP_TEXT, 18, (100, 100, 100)), (10, bar.bottom + 8))
+
+        pygame.display.update(dirty)
+        clock.tick(fps)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对局录像（.snkr）查看器")
+    parser.add_argument('path', help="录像文件，由 train.py --record 生成")
+    parser.add_argument('--list', action='store_true', help="列出所有对局后退出")
+    parser.add_argument('--episode', type=int, default=-1, help="要播放的对局编号，默认最后一局")
+    parser.add_argument('--step', type=int, default=0, help="从第几步开始播放")
+    parser.add_argument('--speed', type=float, default=10.0, help="每秒播放的步数")
+    args = parser.parse_args()
+
+    log = EpisodeLog(args.path)
+    if args.list:
+        list_episodes(log)
+        sys.exit()
+    if len(log) == 0:
+        print(f"{args.path} 中没有完整的对局")
+        sys.exit(1)
+    view(log, args.episode % len(log), start_step=args.step, speed=args.speed)
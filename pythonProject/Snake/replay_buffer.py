@@ -0,0 +1,49 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    定长经验回放缓冲区：转移 (状态键, 动作, 奖励, 下一状态键, 是否结束) 分别存放在并列的 NumPy 数组中，
+    写满后从头覆盖最旧的转移。状态键即 QLAgent 的 Q 表行号，每条转移只占 22 字节
+    对象可直接 pickle（检查点中保存它即可精确续训）
+    """
+    def __init__(self, capacity=100000, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def add(self, state_key, action, reward, next_state_key, done):
+        i = self.count % self.capacity
+        self.states[i] = state_key
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state_key
+        self.dones[i] = done
+        self.count += 1
+
+    def sample(self, batch_size):
+        """有放回地均匀采样 batch_size 条转移，返回 (states, actions, rewards, next_states, dones) 数组"""
+        idx = self.rng.integers(0, len(self), size=batch_size)
+        return self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx]
+
+    def snapshot(self):
+        """返回一份独立的副本（各数组用 ndarray.copy 复制），供后台线程写检查点时训练继续修改原缓冲区"""
+        clone = ReplayBuffer.__new__(ReplayBuffer)
+        clone.capacity = self.capacity
+        clone.states = self.states.copy()
+        clone.actions = self.actions.copy()
+        clone.rewards = self.rewards.copy()
+        clone.next_states = self.next_states.copy()
+        clone.dones = self.dones.copy()
+        clone.count = self.count
+        clone.rng = np.random.default_rng()
+        clone.rng.bit_generator.state = self.rng.bit_generator.state
+        return clone
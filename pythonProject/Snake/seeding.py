@@ -0,0 +1,21 @@
+import numpy as np
+
+
+def make_seed():
+    """从操作系统熵源生成一个 64 位种子（打印出来即可复现本次运行）"""
+    return int(np.random.SeedSequence().generate_state(1, dtype=np.uint64)[0])
+
+
+def derive_seed(seed, *path):
+    """
+    按路径从 seed 派生相互独立的 64 位子种子，如 derive_seed(seed, 阶段, 轮次, 0)
+    基于 np.random.SeedSequence 的 spawn_key：同一路径总得到同一子种子，与进程数、执行顺序无关
+    注意：同一子种子只在同一种环境中得到相同的对局。train.py 的串行和多进程训练都用 SnakeGame，结果一致；
+    VecSnakeGame（evaluate.py、neural_agent.py）有自己的随机数抽取方式，与 SnakeGame 的对局不对应
+    """
+    return int(np.random.SeedSequence(seed, spawn_key=path).generate_state(1, dtype=np.uint64)[0])
+
+
+def spawn_seeds(seed, n):
+    """派生 n 个相互独立的子种子（供工作进程、批量环境等使用）"""
+    return [derive_seed(seed, i) for i in range(n)]
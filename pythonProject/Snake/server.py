@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import random
+import struct
+import time
+from collections import deque
+
+from game_env import SnakeGame
+from seeding import make_seed, derive_seed
+
+# 协议（小端，所有会话复用同一个 TCP 连接，按会话号区分）
+# 客户端 -> 服务器：每条消息固定 6 字节：类型(1) 会话号(u32) 参数(u8)
+#   N 新建会话（会话号、参数忽略）；A 设置下一步的动作（参数为动作 0-3）；R 重新开始一局；C 关闭会话
+# 服务器 -> 客户端：
+#   F 完整局面：类型 会话号 步数 棋盘大小 得分 食物 毒药 蛇长 标志（只用 FLAG_DONE），之后是 蛇长 个 u16 格子（蛇头在前）
+#   D 一步的增量：类型 会话号 步数 新蛇头 食物 毒药 得分 标志（共 20 字节）
+# 格子编号为 x * grid_size + y，NO_CELL 表示没有（无毒药、棋盘已满时无食物）
+CLIENT_MSG = struct.Struct('<cIB')
+FULL_HEADER = struct.Struct('<cIIBiHHHB')
+DELTA = struct.Struct('<cIIHHHiB')
+NO_CELL = 0xFFFF
+MSG_NEW, MSG_ACTION, MSG_RESET, MSG_CLOSE = b'N', b'A', b'R', b'C'
+# 增量标志：蛇头前进了一格（撞到时为 0）、本步变长（不移除蛇尾）、对局结束
+FLAG_MOVED, FLAG_GREW, FLAG_DONE = 1, 2, 4
+# 没有收到新动作时沿当前方向前进（SnakeGame.step 的 action_map 的反查）
+DIRECTION_ACTIONS = {(0, -1): 0, (0, 1): 1, (-1, 0): 2, (1, 0): 3}
+
+
+class Session:
+    """一局无界面的 SnakeGame 及其所属连接；每个会话只有这几个字段，没有单独的协程"""
+    __slots__ = ('sid', 'game', 'conn', 'action', 'games')
+
+    def __init__(self, sid, game, conn):
+        self.sid = sid
+        self.game = game
+        self.conn = conn
+        self.action = None
+        self.games = 0
+
+    def full_frame(self):
+        game = self.game
+        g = game.grid_size
+        cells = [x * g + y for x, y in game.snake]
+        header = FULL_HEADER.pack(b'F', self.sid, game.steps, g, game.score, _cell(game.food, g),
+                                  _cell(game.poison, g), len(cells), FLAG_DONE if game.done else 0)
+        return header + struct.pack(f'<{len(cells)}H', *cells)
+
+
+def _cell(pos, grid_size):
+    return NO_CELL if pos is None else pos[0] * grid_size + pos[1]
+
+
+class _Connection(asyncio.Protocol):
+    """
+    一个客户端连接：解析定长消息；写缓冲区满时暂停发送增量，恢复后为该连接的所有会话补发完整局面。
+    对新建/重开请求的回复（包括会话数已满）不受暂停影响，客户端按顺序等待这些回复
+    """
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.sessions = {}
+        self.buffer = b''
+        self.paused = False
+        self.resync = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+
+    def connection_lost(self, exc):
+        self.server.connections -= 1
+        for sid in list(self.sessions):
+            self.server.close_session(sid)
+
+    def pause_writing(self):
+        self.paused = True
+        self.resync = True
+
+    def resume_writing(self):
+        self.paused = False
+        if self.resync and not self.transport.is_closing():
+            self.resync = False
+            self.transport.write(b''.join(session.full_frame() for session in self.sessions.values()))
+
+    def send(self, data):
+        if not self.paused and not self.transport.is_closing():
+            self.transport.write(data)
+
+    def reply(self, data):
+        """发送对客户端请求的回复：暂停时也写入（只有增量会被丢弃）"""
+        if not self.transport.is_closing():
+            self.transport.write(data)
+
+    def data_received(self, data):
+        buffer = self.buffer + data
+        size = CLIENT_MSG.size
+        end = len(buffer) - len(buffer) % size
+        for kind, sid, arg in CLIENT_MSG.iter_unpack(buffer[:end]):
+            self.server.handle(self, kind, sid, arg)
+        self.buffer = buffer[end:]
+
+
+class GameServer:
+    """
+    在一个进程中托管大量无界面的 SnakeGame 会话，由一个共享的定时循环每 tick_ms 毫秒推进所有进行中的会话，
+    并把每一步的增量推送给对应的客户端
+    会话使用虚拟时钟（clock_mode='sim'，每步前进 tick_ms），物品生命周期只取决于步数
+    seed: 给定时第 sid 个会话的第 k 局使用 derive_seed(seed, sid, k)，同样的动作序列得到同样的对局
+    """
+    def __init__(self, tick_ms=100, max_sessions=10000, env_config=None, seed=None):
+        self.tick_ms = tick_ms
+        self.max_sessions = max_sessions
+        self.env_config = dict(env_config or {'grid_size': 20, 'poison_enabled': True, 'poison_immediate': True})
+        self.env_config.update(clock_mode='sim', tick_ms=tick_ms, discrete_state=False)
+        if self.env_config['grid_size'] > 255:
+            raise ValueError("协议中的格子编号为 u16，棋盘大小不能超过 255")
+        self.seed = seed
+        self.sessions = {}
+        self.next_sid = 1
+        self.connections = 0
+        self.ticks = 0
+        self.tick_seconds = 0.0
+
+    def _game_seed(self, session):
+        return None if self.seed is None else derive_seed(self.seed, session.sid, session.games)
+
+    def handle(self, conn, kind, sid, arg):
+        if kind == MSG_ACTION:
+            session = conn.sessions.get(sid)
+            if session is not None and arg < 4:
+                session.action = arg
+        elif kind == MSG_NEW:
+            if len(self.sessions) >= self.max_sessions:
+                conn.reply(FULL_HEADER.pack(b'F', 0, 0, 0, 0, NO_CELL, NO_CELL, 0, 0))
+                return
+            session = Session(self.next_sid, None, conn)
+            self.next_sid += 1
+            session.game = SnakeGame(seed=self._game_seed(session), **self.env_config)
+            self.sessions[session.sid] = session
+            conn.sessions[session.sid] = session
+            conn.reply(session.full_frame())
+        elif kind == MSG_RESET:
+            session = conn.sessions.get(sid)
+            if session is not None:
+                session.games += 1
+                session.action = None
+                session.game.reset(seed=self._game_seed(session))
+                conn.reply(session.full_frame())
+        elif kind == MSG_CLOSE:
+            if sid in conn.sessions:
+                self.close_session(sid)
+
+    def close_session(self, sid):
+        session = self.sessions.pop(sid, None)
+        if session is not None:
+            session.conn.sessions.pop(sid, None)
+
+    def tick(self):
+        """所有进行中的会话前进一步；每个连接的增量拼成一次 write"""
+        outgoing = {}
+        for session in self.sessions.values():
+            game = session.game
+            if game.done:
+                continue
+            action = session.action
+            if action is None:
+                action = DIRECTION_ACTIONS[game.direction]
+            session.action = None
+            old_head = game.snake[0]
+            old_length = len(game.snake)
+            game.step(action)
+            head = game.snake[0]
+            flags = (FLAG_MOVED if head != old_head else 0) | (FLAG_GREW if len(game.snake) > old_length else 0) | \
+                (FLAG_DONE if game.done else 0)
+            g = game.grid_size
+            frame = DELTA.pack(b'D', session.sid, game.steps, head[0] * g + head[1], _cell(game.food, g),
+                               _cell(game.poison, g), game.score, flags)
+            frames = outgoing.get(session.conn)
+            if frames is None:
+                outgoing[session.conn] = [frame]
+            else:
+                frames.append(frame)
+        for conn, frames in outgoing.items():
+            conn.send(b''.join(frames))
+
+    async def run_ticks(self):
+        """共享定时循环：按 loop.time() 对齐节拍，某一步超时则从当前时间重新计时（不追赶）"""
+        loop = asyncio.get_running_loop()
+        interval = self.tick_ms / 1000
+        next_time = loop.time()
+        while True:
+            start = time.perf_counter()
+            self.tick()
+            self.tick_seconds += time.perf_counter() - start
+            self.ticks += 1
+            next_time += interval
+            now = loop.time()
+            if next_time < now:
+                next_time = now
+            await asyncio.sleep(next_time - now)
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: _Connection(self), host, port)
+        ticker = asyncio.create_task(self.run_ticks())
+        return server, ticker
+
+
+class RemoteGame:
+    """客户端根据完整局面和增量重建的对局（蛇身、食物、毒药、得分）"""
+    def __init__(self, sid):
+        self.sid = sid
+        self.grid_size = 0
+        self.snake = deque()
+        self.food = None
+        self.poison = None
+        self.score = 0
+        self.steps = 0
+        self.done = False
+
+    def _pos(self, cell):
+        return None if cell == NO_CELL else divmod(cell, self.grid_size)
+
+    def apply_full(self, steps, grid_size, score, food, poison, flags, cells):
+        self.grid_size = grid_size
+        self.steps = steps
+        self.score = score
+        self.snake = deque(divmod(c, grid_size) for c in cells)
+        self.food = self._pos(food)
+        self.poison = self._pos(poison)
+        self.done = bool(flags & FLAG_DONE)
+
+    def apply_delta(self, steps, head, food, poison, score, flags):
+        if flags & FLAG_MOVED:
+            self.snake.appendleft(divmod(head, self.grid_size))
+            if not flags & FLAG_GREW:
+                self.snake.pop()
+        self.steps = steps
+        self.food = self._pos(food)
+        self.poison = self._pos(poison)
+        self.score = score
+        self.done = bool(flags & FLAG_DONE)
+
+
+class SnakeClient:
+    """
+    asyncio 客户端：一个连接上可以开多个会话
+    on_update(game) 在收到某个会话的完整局面或增量后调用（可在其中调用 act / restart）
+    """
+    def __init__(self, on_update=None):
+        self.on_update = on_update
+        self.games = {}
+        self.reader = None
+        self.writer = None
+        self.frames = 0
+        self.bytes = 0
+        self._new_sessions = deque()
+
+    async def connect(self, host='127.0.0.1', port=8765):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        return asyncio.create_task(self._read_loop())
+
+    def new_session(self):
+        """请求新建一个会话，返回在收到完整局面后完成的 Future（结果为 RemoteGame）"""
+        future = asyncio.get_running_loop().create_future()
+        self._new_sessions.append(future)
+        self.writer.write(CLIENT_MSG.pack(MSG_NEW, 0, 0))
+        return future
+
+    def act(self, sid, action):
+        self.writer.write(CLIENT_MSG.pack(MSG_ACTION, sid, action))
+
+    def restart(self, sid):
+        self.writer.write(CLIENT_MSG.pack(MSG_RESET, sid, 0))
+
+    def close_session(self, sid):
+        self.games.pop(sid, None)
+        self.writer.write(CLIENT_MSG.pack(MSG_CLOSE, sid, 0))
+
+    async def _read_loop(self):
+        reader = self.reader
+        while True:
+            kind = await reader.readexactly(1)
+            if kind == b'D':
+                body = await reader.readexactly(DELTA.size - 1)
+                _, sid, *fields = DELTA.unpack(kind + body)
+                game = self.games.get(sid)
+                if game is None:
+                    continue
+                game.apply_delta(*fields)
+                self.bytes += DELTA.size
+            else:
+                body = await reader.readexactly(FULL_HEADER.size - 1)
+                _, sid, steps, grid_size, score, food, poison, length, flags = FULL_HEADER.unpack(kind + body)
+                cells = struct.unpack(f'<{length}H', await reader.readexactly(2 * length))
+                self.bytes += FULL_HEADER.size + 2 * length
+                if sid == 0:
+                    # 服务器会话数已满
+                    self._new_sessions.popleft().set_exception(RuntimeError("服务器会话数已达上限"))
+                    continue
+                game = self.games.get(sid)
+                if game is None:
+                    game = self.games[sid] = RemoteGame(sid)
+                    game.apply_full(steps, grid_size, score, food, poison, flags, cells)
+                    self._new_sessions.popleft().set_result(game)
+                else:
+                    game.apply_full(steps, grid_size, score, food, poison, flags, cells)
+            self.frames += 1
+            if self.on_update is not None:
+                self.on_update(game)
+
+
+async def _bench(num_sessions, seconds, tick_ms, seed):
+    """在同一进程中启动服务器和一个客户端：开 num_sessions 个会话，客户端每步随机转向，结束后自动重开"""
+    server = GameServer(tick_ms=tick_ms, max_sessions=num_sessions, seed=seed)
+    tcp_server, ticker = await server.serve(port=0)
+    port = tcp_server.sockets[0].getsockname()[1]
+    rng = random.Random(seed)
+    finished = [0]
+
+    def on_update(game):
+        if game.done:
+            finished[0] += 1
+            client.restart(game.sid)
+        elif rng.random() < 0.2:
+            client.act(game.sid, rng.randrange(4))
+
+    client = SnakeClient(on_update)
+    reader_task = await client.connect(port=port)
+    await asyncio.gather(*(client.new_session() for _ in range(num_sessions)))
+    start_ticks, start_seconds, start_frames, start_bytes = server.ticks, server.tick_seconds, client.frames, client.bytes
+    start_time = time.perf_counter()
+    await asyncio.sleep(seconds)
+    elapsed = time.perf_counter() - start_time
+    ticks = server.ticks - start_ticks
+    print(f"{num_sessions} 个会话，{elapsed:.1f} 秒内 {ticks} 步（目标 {1000 / tick_ms:.0f} 步/秒）")
+    print(f"每步计算 {(server.tick_seconds - start_seconds) / max(ticks, 1) * 1000:.2f} 毫秒，"
+          f"客户端收到 {(client.frames - start_frames) / elapsed:.0f} 帧/秒、"
+          f"{(client.bytes - start_bytes) / elapsed / 1024:.0f} KiB/秒，结束 {finished[0]} 局")
+    ticker.cancel()
+    reader_task.cancel()
+    client.writer.close()
+    await client.writer.wait_closed()
+    tcp_server.close()
+    await tcp_server.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="asyncio 贪吃蛇服务器：在一个进程中托管大量无界面对局")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址（默认只接受本机连接）")
+    parser.add_argument('--port', type=int, default=8765, help="监听端口")
+    parser.add_argument('--tick-ms', type=int, default=100, help="每一步的间隔（毫秒）")
+    parser.add_argument('--max-sessions', type=int, default=10000, help="会话数上限")
+    parser.add_argument('--grid-size', type=int, default=20, help="棋盘大小（不超过 255）")
+    parser.add_argument('--no-poison', action='store_true', help="不放置毒药")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子（各会话的对局由它派生）")
+    parser.add_argument('--bench', type=int, default=0, metavar='N',
+                        help="自测：在本进程中启动服务器和客户端，运行 N 个会话后输出吞吐量")
+    parser.add_argument('--seconds', type=float, default=10, help="自测的时长（秒）")
+    args = parser.parse_args()
+
+    if args.bench > 0:
+        asyncio.run(_bench(args.bench, args.seconds, args.tick_ms, make_seed() if args.seed is None else args.seed))
+    else:
+        async def main():
+            poison = not args.no_poison
+            server = GameServer(tick_ms=args.tick_ms, max_sessions=args.max_sessions, seed=args.seed,
+                                env_config={'grid_size': args.grid_size, 'poison_enabled': poison,
+                                            'poison_immediate': poison})
+            tcp_server, ticker = await server.serve(args.host, args.port)
+            print(f"服务器已启动：{args.host}:{args.port}，每 {args.tick_ms} 毫秒一步")
+            while True:
+                await asyncio.sleep(10)
+                print(f"连接 {server.connections}，会话 {len(server.sessions)}，"
+                      f"平均每步 {server.tick_seconds / max(server.ticks, 1) * 1000:.2f} 毫秒")
+        asyncio.run(main())
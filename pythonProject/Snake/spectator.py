@@ -0,0 +1,121 @@
+import multiprocessing
+import queue
+from array import array
+from itertools import chain
+
+import numpy as np
+
+# 队列中的结束标记
+_STOP = None
+
+
+def snapshot(game, label):
+    """
+    将 SnakeGame 的当前局面打包为紧凑的元组：
+    (标题, 棋盘大小, 蛇身坐标, 方向, 死亡, 食物, 食物状态, 毒药, 毒药状态, 得分)，蛇身按 x, y 交替存为 uint16 字节串
+    """
+    cells = array('H', chain.from_iterable(game.snake)).tobytes()
+    return (label, game.grid_size, cells, game.direction, game.done,
+            game.food, game.food_state, game.poison, game.poison_state, game.score)
+
+
+class Spectator:
+    """
+    训练观察窗口：pygame 窗口运行在独立进程中，按自己的帧率绘制学习进程推送的局面快照。
+    学习进程只做非阻塞的 put_nowait，队列满（窗口跟不上）时丢帧，观看训练不会拖慢训练
+    """
+    def __init__(self, grid_size=20, cell_size=25, fps=30, max_frames=4096):
+        # spawn：观察进程不继承训练进程的线程、共享内存等状态
+        ctx = multiprocessing.get_context('spawn')
+        self.queue = ctx.Queue(max_frames)
+        self.process = ctx.Process(target=_viewer_main, args=(self.queue, grid_size, cell_size, fps), daemon=True)
+        self.process.start()
+        self.sent = 0
+        self.dropped = 0
+        self._sending = False
+
+    def begin_episode(self):
+        """
+        开始推送新的一局，返回是否推送：上一局尚未播放完（队列非空）或窗口已关闭时整局跳过，
+        保证窗口中播放的每一局都是连续的
+        """
+        self._sending = self.queue.empty() and self.process.is_alive()
+        return self._sending
+
+    def push(self, game, label):
+        """推送当前局面；队列已满时丢弃本局剩余的帧"""
+        if not self._sending:
+            return
+        try:
+            self.queue.put_nowait(snapshot(game, label))
+            self.sent += 1
+        except queue.Full:
+            self._sending = False
+            self.dropped += 1
+
+    def close(self, timeout=5.0):
+        """通知观察进程播放完剩余的帧后退出"""
+        if self.process.is_alive():
+            try:
+                self.queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                self.process.terminate()
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        # 窗口已关闭时缓冲区中可能还有未送出的快照，直接丢弃，避免退出时等待
+        self.queue.cancel_join_thread()
+        self.queue.close()
+
+
+def _viewer_main(frames, grid_size, cell_size, fps):
+    """观察进程：从队列取快照并绘制，关闭窗口只结束观察，不影响训练"""
+    import pygame
+    from game_env import SnakeGame
+    from renderer import SnakeRenderer, render_text
+
+    def make_view(size):
+        view = SnakeGame(grid_size=size, cell_size=cell_size, poison_enabled=True, clock_mode='sim')
+        return view, SnakeRenderer(view)
+
+    game, renderer = make_view(grid_size)
+    pygame.init()
+    screen = pygame.display.set_mode((game.width, game.height))
+    pygame.display.set_caption("训练观察")
+    clock = pygame.time.Clock()
+    label = None
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+        try:
+            frame = frames.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if frame is _STOP:
+            break
+
+        (frame_label, size, cells, game_direction, game_done,
+         food, food_state, poison, poison_state, score) = frame
+        if size != game.grid_size:
+            game, renderer = make_view(size)
+            screen = pygame.display.set_mode((game.width, game.height))
+        if frame_label != label:
+            label = frame_label
+            pygame.display.set_caption(f"训练观察 - {label}")
+
+        coords = np.frombuffer(cells, dtype=np.uint16).reshape(-1, 2)
+        game._set_snake(map(tuple, coords.tolist()))  # noqa
+        game.direction = game_direction
+        game.done = game_done
+        game.food, game.food_state = food, food_state
+        game.poison, game.poison_state = poison, poison_state
+
+        renderer.render(screen)
+        screen.blit(render_text(f"Score: {score}", 36, (0, 0, 0)), (10, 10))
+        pygame.display.flip()
+        clock.tick(fps)
+
+    pygame.quit()
@@ -0,0 +1,52 @@
+import numpy as np
+
+# 离散状态编码（Q 表行号）：SnakeGame、VecSnakeGame、SnakeArena 和 QLAgent 共用，环境不依赖智能体模块
+
+# 离散状态各分量的取值个数：食物方向、危险编码、毒药方向（8 + 无毒药）、毒药距离等级（0-4 + 无毒药）
+FOOD_DIRS = 8
+DANGER_CODES = 256
+POISON_DIRS = 9
+POISON_DIST_LEVELS = 6
+NUM_STATES = FOOD_DIRS * DANGER_CODES * POISON_DIRS * POISON_DIST_LEVELS
+
+
+def encode_state(food_dir, danger_code, poison_dir, poison_dist_level):
+    """将离散状态四元组打包为 Q 表的行号"""
+    return ((food_dir * DANGER_CODES + danger_code) * POISON_DIRS + poison_dir) * POISON_DIST_LEVELS + poison_dist_level
+
+
+def _build_octant_table():
+    """
+    预计算 8 方向编号：按 (dx 符号, dy 符号, |dy| 与 |dx| 的大小关系) 索引，
+    每格取一个代表偏移量代入原公式 int((arctan2(dy, dx) + pi) / (pi / 4)) % 8，
+    因此边界（坐标轴、对角线）上的取值与原公式完全一致
+    """
+    magnitudes = {-1: (2, 1), 0: (1, 1), 1: (1, 2)}
+    table = {}
+    for sx in (-1, 0, 1):
+        for sy in (-1, 0, 1):
+            for cmp in (-1, 0, 1):
+                mx, my = magnitudes[cmp]
+                angle = np.arctan2(np.float32(sy * my), np.float32(sx * mx))
+                table[(sx, sy, cmp)] = int((angle + np.pi) / (2 * np.pi / 8)) % 8
+    return table
+
+
+_OCTANT_TABLE = _build_octant_table()
+
+
+def direction_octant(dx, dy):
+    """用符号和大小比较计算 (dx, dy) 的 8 方向编号，代替 np.arctan2"""
+    ax, ay = abs(dx), abs(dy)
+    return _OCTANT_TABLE[((dx > 0) - (dx < 0), (dy > 0) - (dy < 0), (ay > ax) - (ay < ax))]
+
+
+# direction_octant 的数组版查表：下标为 (dx 符号 + 1) * 9 + (dy 符号 + 1) * 3 + (大小关系 + 1)
+_OCTANT_ARRAY = np.array([_OCTANT_TABLE[(sx, sy, cmp)]
+                          for sx in (-1, 0, 1) for sy in (-1, 0, 1) for cmp in (-1, 0, 1)], dtype=np.int64)
+
+
+def direction_octants(dx, dy):
+    """direction_octant 的批量版本：dx、dy 为整数数组，逐元素返回 8 方向编号"""
+    ax, ay = np.abs(dx), np.abs(dy)
+    return _OCTANT_ARRAY[(np.sign(dx) + 1) * 9 + (np.sign(dy) + 1) * 3 + np.sign(ay - ax) + 1]
@@ -0,0 +1,245 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import traceback
+
+from evaluate import evaluate
+from train import PHASES, AGENT_PARAMS, multi_stage_train
+
+# 可搜索的参数：智能体超参数（见 train.AGENT_PARAMS）、各阶段轮数比例 phase<i>_ratio（最后一个阶段取剩余）、
+# 各阶段开始时重置的 epsilon phase<i>_epsilon（阶段编号从 1 开始）
+PHASE_RATIO_PARAMS = [f"phase{i + 1}_ratio" for i in range(len(PHASES) - 1)]
+PHASE_EPSILON_PARAMS = [f"phase{i + 1}_epsilon" for i in range(len(PHASES))]
+SEARCH_PARAMS = tuple(AGENT_PARAMS) + tuple(PHASE_RATIO_PARAMS) + tuple(PHASE_EPSILON_PARAMS)
+
+# 默认搜索空间。列表表示候选值（网格搜索取笛卡尔积，随机搜索从中均匀选取）；
+# 字典表示连续分布（仅随机搜索）：{"uniform": [下限, 上限]} 或 {"log_uniform": [下限, 上限]}
+DEFAULT_SPACE = {
+    'alpha': [0.02, 0.05, 0.1],
+    'gamma': [0.9, 0.95, 0.99],
+    'epsilon_decay': [0.998, 0.999, 0.9995],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    trial_id   TEXT PRIMARY KEY,
+    config     TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    seconds    REAL,
+    score      REAL,
+    curves     TEXT,
+    evaluation TEXT,
+    error      TEXT,
+    finished   TEXT
+)
+"""
+
+
+def _check_params(names):
+    unknown = sorted(set(names) - set(SEARCH_PARAMS))
+    if unknown:
+        raise ValueError(f"未知的搜索参数: {', '.join(unknown)}（可用: {', '.join(SEARCH_PARAMS)}）")
+
+
+def grid_configs(space):
+    """网格搜索：所有候选值的笛卡尔积"""
+    _check_params(space)
+    for name, values in space.items():
+        if not isinstance(values, list):
+            raise ValueError(f"网格搜索的参数 {name} 必须是候选值列表")
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_configs(space, num_trials, seed):
+    """随机搜索：按 seed 生成 num_trials 组参数（同一 seed 总得到同一组，重复运行时可跳过已完成的试验）"""
+    _check_params(space)
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(num_trials):
+        config = {}
+        for name, spec in space.items():
+            if isinstance(spec, list):
+                config[name] = rng.choice(spec)
+            elif 'uniform' in spec:
+                config[name] = rng.uniform(*spec['uniform'])
+            elif 'log_uniform' in spec:
+                low, high = spec['log_uniform']
+                config[name] = math.exp(rng.uniform(math.log(low), math.log(high)))
+            else:
+                raise ValueError(f"无法识别的参数分布: {name}={spec}")
+        configs.append(config)
+    return configs
+
+
+def trial_id(config, settings):
+    """试验编号：参数与训练/评估设置的哈希，相同设置下同一组参数总得到同一编号"""
+    data = json.dumps({'config': config, 'settings': settings}, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+def train_kwargs(config):
+    """将一组搜索参数转换为 multi_stage_train 的 agent_params、phase_ratios、phase_epsilons"""
+    agent_params = {name: config[name] for name in AGENT_PARAMS if name in config}
+    phase_ratios = [config.get(name, phase['ratio']) for name, phase in zip(PHASE_RATIO_PARAMS, PHASES)]
+    phase_epsilons = [config.get(name, phase['epsilon']) for name, phase in zip(PHASE_EPSILON_PARAMS, PHASES)]
+    if sum(phase_ratios) >= 1:
+        raise ValueError(f"阶段比例之和必须小于 1（最后一个阶段取剩余轮数）: {phase_ratios}")
+    return {'agent_params': agent_params, 'phase_ratios': phase_ratios, 'phase_epsilons': phase_epsilons}
+
+
+def run_trial(task):
+    """
+    工作进程：按一组参数完成多阶段训练，再用贪心策略评估最终 Q 表
+    返回 (试验编号, 状态, 用时, 学习曲线, 评估结果, 错误信息)
+    """
+    tid, config, settings, model_dir = task
+    start_time = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = tmp_dir
+            if model_dir is not None:
+                output_dir = os.path.join(model_dir, tid)
+                os.makedirs(output_dir, exist_ok=True)
+            _, history = multi_stage_train(total_episodes=settings['episodes'], render_every=0,
+                                           checkpoint_every=0, seed=settings['seed'], output_dir=output_dir,
+                                           plot=False, log_every=0, **train_kwargs(config))
+            # 工作进程不能再创建进程池，评估在本进程中进行
+            evaluation = evaluate(os.path.join(output_dir, PHASES[-1]['save_path']), PHASES[-1]['config'],
+                                  episodes=settings['eval_episodes'], num_workers=1,
+                                  max_steps=settings['eval_max_steps'], seed=settings['seed'])
+    except Exception:
+        return tid, 'failed', time.perf_counter() - start_time, None, None, traceback.format_exc()
+    # 学习曲线：各阶段每 1000 轮的平均得分（PhaseMetrics.avg_scores）
+    curves = [{'phase': metrics.phase, 'record_points': metrics.record_points, 'avg_scores': metrics.avg_scores}
+              for metrics in history]
+    return tid, 'done', time.perf_counter() - start_time, curves, evaluation, None
+
+
+class ResultStore:
+    """本地 SQLite 结果库：每个试验一行，保存参数、学习曲线和评估结果（只在主进程中读写）"""
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def completed(self):
+        return {row[0] for row in self.conn.execute("SELECT trial_id FROM trials WHERE status = 'done'")}
+
+    def save(self, tid, config, status, seconds, curves, evaluation, error):
+        score = evaluation['score_mean'] if evaluation is not None else None
+        self.conn.execute(
+            "INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (tid, json.dumps(config, sort_keys=True), status, seconds, score,
+             None if curves is None else json.dumps(curves),
+             None if evaluation is None else json.dumps(evaluation),
+             error, time.strftime('%Y-%m-%d %H:%M:%S')))
+        self.conn.commit()
+
+    def best(self, limit=10):
+        """按评估平均得分从高到低返回 [(试验编号, 参数, 平均得分, 评估结果), ...]"""
+        rows = self.conn.execute(
+            "SELECT trial_id, config, score, evaluation FROM trials WHERE status = 'done' "
+            "ORDER BY score DESC LIMIT ?", (limit,))
+        return [(tid, json.loads(config), score, json.loads(evaluation)) for tid, config, score, evaluation in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+def run_sweep(configs, store, episodes=3000, eval_episodes=10000, eval_max_steps=2000, seed=0,
+              num_workers=None, model_dir=None):
+    """
+    在进程池中运行所有未完成的试验，每完成一个就写入结果库
+    configs: 参数字典列表（grid_configs / random_configs 的结果）
+    episodes: 每个试验的总训练轮数；eval_episodes / eval_max_steps: 最终 Q 表的评估局数和步数上限
+    seed: 所有试验共用的训练/评估种子（各试验面对相同的对局，便于比较）
+    model_dir: 保存每个试验 Q 表的目录（<model_dir>/<试验编号>/），None 表示不保存
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    settings = {'episodes': episodes, 'eval_episodes': eval_episodes, 'eval_max_steps': eval_max_steps,
+                'seed': seed}
+    done = store.completed()
+    tasks = {}
+    for config in configs:
+        train_kwargs(config)  # 提前检查参数，避免在工作进程中才出错
+        tid = trial_id(config, settings)
+        if tid not in done:
+            tasks[tid] = (tid, config, settings, model_dir)
+    print(f"共 {len(configs)} 个试验，已完成 {len(configs) - len(tasks)} 个，本次运行 {len(tasks)} 个"
+          f"（{min(num_workers, max(len(tasks), 1))} 个进程）")
+    if not tasks:
+        return
+
+    def finish(result, index):
+        tid, status, seconds, curves, evaluation, error = result
+        config = tasks[tid][1]
+        store.save(tid, config, status, seconds, curves, evaluation, error)
+        if status == 'done':
+            print(f"[{index}/{len(tasks)}] {tid} 平均得分 {evaluation['score_mean']:.2f} "
+                  f"（{seconds:.0f} 秒） {json.dumps(config, sort_keys=True)}")
+        else:
+            print(f"[{index}/{len(tasks)}] {tid} 失败 {json.dumps(config, sort_keys=True)}\n{error}")
+
+    if num_workers > 1 and len(tasks) > 1:
+        from multiprocessing import Pool
+        # maxtasksperchild=1：每个试验在新进程中运行，上一个试验的 Q 表内存会被释放
+        with Pool(min(num_workers, len(tasks)), maxtasksperchild=1) as pool:
+            for index, result in enumerate(pool.imap_unordered(run_trial, tasks.values()), 1):
+                finish(result, index)
+    else:
+        for index, task in enumerate(tasks.values(), 1):
+            finish(run_trial(task), index)
+
+
+def print_best(store, limit=10):
+    print(f"\n===== 最佳 {limit} 个试验（按评估平均得分） =====")
+    for rank, (tid, config, score, evaluation) in enumerate(store.best(limit), 1):
+        print(f"{rank:>2}. {tid}  平均 {score:7.2f}  中位数 {evaluation['score_median']:g}  "
+              f"p95 {evaluation['score_percentiles']['95']:g}  {json.dumps(config, sort_keys=True)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多阶段训练的超参数搜索（进程池并行，结果保存在 SQLite）")
+    parser.add_argument('--space', default=None,
+                        help="搜索空间 JSON 文件，如 {\"alpha\": [0.05, 0.1], \"gamma\": {\"uniform\": [0.9, 0.99]}}；"
+                             "默认使用 DEFAULT_SPACE")
+    parser.add_argument('--mode', choices=('grid', 'random'), default='grid', help="网格搜索或随机搜索")
+    parser.add_argument('--trials', type=int, default=20, help="随机搜索的试验数")
+    parser.add_argument('--episodes', type=int, default=3000, help="每个试验的总训练轮数")
+    parser.add_argument('--eval-episodes', type=int, default=10000, help="每个试验最终评估的局数")
+    parser.add_argument('--eval-max-steps', type=int, default=2000, help="评估时每局的步数上限")
+    parser.add_argument('--workers', type=int, default=None, help="进程数，默认使用全部 CPU 核心")
+    parser.add_argument('--db', default='sweep.sqlite', help="结果库文件（再次运行时跳过已完成的试验）")
+    parser.add_argument('--model-dir', default=None, help="保存每个试验 Q 表的目录，默认不保存")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="训练/评估种子（所有试验相同）；随机搜索的参数也由它生成")
+    parser.add_argument('--top', type=int, default=10, help="结束时列出最佳的试验数")
+    parser.add_argument('--list', action='store_true', help="只列出结果库中的最佳试验，不运行")
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    try:
+        if not args.list:
+            space = DEFAULT_SPACE
+            if args.space is not None:
+                with open(args.space, encoding='utf-8') as f:
+                    space = json.load(f)
+            if args.mode == 'grid':
+                configs = grid_configs(space)
+            else:
+                configs = random_configs(space, args.trials, args.seed)
+            run_sweep(configs, store, args.episodes, args.eval_episodes, args.eval_max_steps, args.seed,
+                      args.workers, args.model_dir)
+        print_best(store, args.top)
+    finally:
+        store.close()
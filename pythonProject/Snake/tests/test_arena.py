@@ -0,0 +1,85 @@
+import numpy as np
+
+from arena import SnakeArena
+from ql_agent import QLAgent
+
+
+class SmallBufferArena(SnakeArena):
+    INITIAL_CAPACITY = 4
+
+
+def _check_cell_owner(arena):
+    """cell_owner 必须与所有存活的蛇身和物品完全一致"""
+    g = arena.grid_size
+    expected = np.full(arena.num_cells, SnakeArena.EMPTY, dtype=np.int32)
+    for i in range(arena.num_snakes):
+        body = arena.snake(i)
+        assert len(body) == (arena.length[i] if arena.alive[i] else 0)
+        for x, y in body:
+            assert expected[y * g + x] == SnakeArena.EMPTY
+            expected[y * g + x] = i
+        if body:
+            assert body[0] == (arena.head_x[i], arena.head_y[i])
+    for slot, cell in enumerate(arena.item_cells):
+        if cell >= 0:
+            assert expected[cell] == SnakeArena.EMPTY
+            expected[cell] = SnakeArena.ITEM_BASE - slot
+    assert np.array_equal(arena.cell_owner, expected)
+
+
+def _play(arena, ticks, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(ticks):
+        arena.step(rng.integers(0, 4, arena.num_snakes))
+        _check_cell_owner(arena)
+
+
+def test_cell_owner_consistent():
+    arena = SnakeArena(num_snakes=16, grid_size=16, num_food=8, num_poison=4, seed=0)
+    _check_cell_owner(arena)
+    _play(arena, 300)
+
+
+def test_crowded_board_reset_and_respawn():
+    arena = SnakeArena(num_snakes=40, grid_size=10, seed=0)
+    _check_cell_owner(arena)
+    waiting = np.flatnonzero(~arena.alive)
+    assert len(waiting) > 0
+    alive_ids = np.flatnonzero(arena.alive)
+    assert (arena.prev_food_dist[alive_ids] >= 0).all()
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        arena.step(rng.integers(0, 4, arena.num_snakes))
+        _check_cell_owner(arena)
+        if arena.alive[waiting].any():
+            break
+    assert arena.alive[waiting].any()
+
+
+def test_missing_items_are_placed_again():
+    arena = SnakeArena(num_snakes=2, grid_size=8, num_food=3, num_poison=2, seed=0)
+    arena.cell_owner[arena.item_cells[[0, 4]]] = SnakeArena.EMPTY
+    arena.item_cells[[0, 4]] = -1
+    arena.step(np.zeros(arena.num_snakes, dtype=np.int64))
+    assert (arena.item_cells >= 0).all()
+    _check_cell_owner(arena)
+
+
+def test_body_buffer_grows_on_demand():
+    arena = SmallBufferArena(num_snakes=8, grid_size=12, num_food=40, seed=1)
+    assert arena.body.shape[1] == 4
+    _play(arena, 300, seed=1)
+    assert arena.length.max() > 4
+    assert arena.body.shape[1] >= arena.length.max()
+
+
+def test_state_keys_match_agent():
+    arena = SnakeArena(num_snakes=8, grid_size=16, num_food=4, num_poison=2, seed=2)
+    agent = QLAgent(seed=0)
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        ids = np.flatnonzero(arena.alive)
+        keys = arena._get_state_keys(ids)
+        states = arena._get_states(ids)
+        assert [agent.state_key(state) for state in states] == keys.tolist()
+        arena.step(rng.integers(0, 4, arena.num_snakes))
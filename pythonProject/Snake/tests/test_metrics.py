@@ -0,0 +1,67 @@
+import pytest
+
+from metrics import METRIC_FIELDS, MetricsSink, PhaseMetrics, RingBuffer, read_metrics
+
+
+def test_ring_buffer_keeps_last_values():
+    buffer = RingBuffer(4)
+    assert buffer.mean() == 0.0 and buffer.max() == 0.0
+    for value in range(1, 11):
+        buffer.append(value)
+    assert sorted(buffer.values().tolist()) == [7, 8, 9, 10]
+    assert buffer.mean() == 8.5
+    assert buffer.max() == 10
+
+
+def test_phase_metrics_window():
+    metrics = PhaseMetrics('p', window=5)
+    for episode in range(12):
+        metrics.add(episode, 2 * episode)
+    assert metrics.episodes == 12
+    assert metrics.record_points == [5, 10]
+    assert metrics.avg_scores == [2.0, 7.0]
+    row = metrics.row(0.5, episode_offset=100)
+    assert row['global_episode'] == 112
+    assert row['score_mean'] == 9.0 and row['score_max'] == 11
+    assert row['length_mean'] == 18.0
+    assert row['q_states'] is None
+
+
+def _rows(n, start=1):
+    rows = []
+    for episode in range(start, start + n):
+        metrics = PhaseMetrics('p', window=10)
+        metrics.add(episode, episode)
+        row = metrics.row(0.1 * episode, episode_offset=episode - 1)
+        row['q_states'] = episode if episode % 2 else None
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize('name', ['m.jsonl', 'm.csv'])
+def test_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    rows = _rows(5)
+    sink = MetricsSink(path)
+    for row in rows:
+        sink.write(row)
+    sink.close()
+    loaded = read_metrics(path)
+    assert [list(row) for row in loaded] == [list(METRIC_FIELDS)] * len(rows)
+    for row, expected in zip(loaded, rows):
+        assert row == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('name', ['m.jsonl', 'm.csv'])
+def test_resume_truncates_later_rows(tmp_path, name):
+    path = str(tmp_path / name)
+    sink = MetricsSink(path)
+    for row in _rows(6):
+        sink.write(row)
+    sink.close()
+    # 检查点在第 3 轮：之后写入的行被删除，续训从这里继续追加
+    sink = MetricsSink(path, resume_from=3)
+    for row in _rows(2, start=4):
+        sink.write(row)
+    sink.close()
+    assert [row['global_episode'] for row in read_metrics(path)] == [1, 2, 3, 4, 5]
@@ -0,0 +1,52 @@
+import numpy as np
+
+from neural_agent import MLPAgent
+from train import train_phase
+
+
+def test_save_load_round_trip(tmp_path):
+    agent = MLPAgent(hidden_sizes=(16, 8), seed=0)
+    states = np.random.default_rng(0).random((32, 14), dtype=np.float32)
+    path = str(tmp_path / 'mlp.npz')
+    agent.save(path)
+    loaded = MLPAgent(hidden_sizes=(4,), seed=1)
+    loaded.load(path)
+    assert loaded.hidden_sizes == (16, 8)
+    assert np.array_equal(loaded.q_values(states), agent.q_values(states))
+
+
+def test_batch_shapes():
+    agent = MLPAgent(batch_size=8, train_every=4, seed=0)
+    rng = np.random.default_rng(0)
+    states = rng.random((16, 14), dtype=np.float32)
+    actions = agent.get_actions(states)
+    assert actions.shape == (16,)
+    assert ((actions >= 0) & (actions < 4)).all()
+    assert agent.q_values(states).shape == (16, 4)
+    dones = np.zeros(16, dtype=bool)
+    dones[:3] = True
+    epsilon = agent.epsilon
+    agent.update_batch(states, actions, rng.random(16), rng.random((16, 14), dtype=np.float32), dones)
+    assert agent.buf_count == 16
+    assert agent.train_steps == 4
+    assert agent.epsilon == epsilon * agent.epsilon_decay ** 3
+
+
+def test_loss_decreases_on_fixed_batch():
+    agent = MLPAgent(batch_size=32, buffer_size=32, train_every=10 ** 9, learning_rate=1e-2, seed=0)
+    rng = np.random.default_rng(0)
+    # 全部为终止转移：目标值就是奖励，与目标网络无关
+    agent.update_batch(rng.random((32, 14), dtype=np.float32), rng.integers(0, 4, 32), rng.normal(0, 5, 32),
+                       np.zeros((32, 14), dtype=np.float32), np.ones(32, dtype=bool))
+    losses = [agent.train_step() for _ in range(300)]
+    assert np.mean(losses[-20:]) < 0.2 * np.mean(losses[:20])
+
+
+def test_train_phase_with_continuous_states():
+    agent = MLPAgent(batch_size=16, seed=0)
+    config = {'grid_size': 10, 'poison_enabled': True, 'poison_immediate': True, 'clock_mode': 'sim',
+              'discrete_state': False}
+    _, metrics = train_phase(config, agent, 5, 'mlp', render_every=0, seed=0)
+    assert metrics.episodes == 5
+    assert agent.buf_count > 0
+    assert agent.train_steps > 0
@@ -0,0 +1,118 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from ql_agent import (QLAgent, compile_policy, convert_legacy_file, find_qtable, load_policy, load_qtable, save_policy,
+                      save_qtable)
+from state_encoding import NUM_STATES, direction_octant, encode_state
+
+
+def _random_table(seed=0, rows=1000):
+    rng = np.random.default_rng(seed)
+    q_table = np.zeros((NUM_STATES, 4), dtype=np.float32)
+    q_table[rng.integers(0, NUM_STATES, rows)] = rng.standard_normal((rows, 4))
+    return q_table
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_qtb_round_trip(tmp_path, mmap):
+    q_table = _random_table()
+    path = str(tmp_path / 'q.qtb')
+    save_qtable(path, q_table)
+    loaded = load_qtable(path, mmap=mmap)
+    assert loaded.shape == q_table.shape
+    assert np.array_equal(loaded, q_table)
+
+
+def test_qtb_rejects_other_action_size(tmp_path):
+    path = str(tmp_path / 'q.qtb')
+    save_qtable(path, _random_table())
+    with pytest.raises(ValueError):
+        load_qtable(path, action_size=3)
+
+
+def test_legacy_pickle_dict_is_converted(tmp_path):
+    key = (3, 17, 8, 5)
+    pkl_path = str(tmp_path / 'qtable_old.pkl')
+    with open(pkl_path, 'wb') as f:
+        pickle.dump({key: np.array([1.0, 2.0, 3.0, 4.0])}, f)
+    qtb_path = str(tmp_path / 'qtable_old.qtb')
+    convert_legacy_file(pkl_path, qtb_path)
+    q_table = load_qtable(qtb_path)
+    assert q_table[encode_state(*key)].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert np.count_nonzero(q_table) == 4
+
+
+def test_find_qtable_prefers_qtb(tmp_path):
+    stem = str(tmp_path / 'qtable_final')
+    assert find_qtable(stem) is None
+    open(stem + '.pkl', 'wb').close()
+    assert find_qtable(stem) == stem + '.pkl'
+    save_qtable(stem + '.qtb', _random_table())
+    assert find_qtable(stem) == stem + '.qtb'
+
+
+def test_agent_save_load(tmp_path):
+    agent = QLAgent(seed=1)
+    agent.q_table = _random_table(seed=2)
+    path = str(tmp_path / 'agent.qtb')
+    agent.save(path)
+    other = QLAgent()
+    other.load(path, mmap=True)
+    assert np.array_equal(other.q_table, agent.q_table)
+
+
+def test_state_key_matches_discrete_env():
+    from game_env import SnakeGame
+
+    agent = QLAgent(seed=0)
+    game = SnakeGame(grid_size=10, poison_enabled=True, poison_immediate=True, clock_mode='sim', seed=3)
+    discrete = SnakeGame(grid_size=10, poison_enabled=True, poison_immediate=True, clock_mode='sim', seed=3,
+                         discrete_state=True)
+    state, key = game.reset(), discrete.reset()
+    for action in [3, 3, 1, 1, 2, 0, 0]:
+        assert agent.state_key(state) == key
+        assert agent.state_key(key) == key
+        state, _, done = game.step(action)
+        key, _, _ = discrete.step(action)
+        if done:
+            break
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_qpol_round_trip(tmp_path, mmap):
+    policy = compile_policy(_random_table())
+    path = str(tmp_path / 'p.qpol')
+    save_policy(path, policy)
+    loaded = load_policy(path, mmap=mmap)
+    assert loaded.dtype == np.uint8
+    assert np.array_equal(loaded, policy)
+
+
+def test_load_policy_compiles_qtable(tmp_path):
+    q_table = _random_table()
+    path = str(tmp_path / 'q.qtb')
+    save_qtable(path, q_table)
+    assert np.array_equal(load_policy(path), compile_policy(q_table))
+
+
+def test_policy_matches_greedy_agent():
+    q_table = _random_table()
+    policy = compile_policy(q_table)
+    visited = np.flatnonzero(q_table.any(axis=1))
+    assert np.array_equal(policy[visited], q_table[visited].argmax(axis=1))
+
+
+def test_fallback_avoids_blocked_moves():
+    q_table = np.zeros((NUM_STATES, 4), dtype=np.float32)
+    policy = compile_policy(q_table)
+    food_right = direction_octant(1, 0)
+    # 四个方向都空（每个方向距离等级 3）时直接朝食物（向右）
+    assert policy[encode_state(food_right, 0xFF, 8, 5)] == 3
+    # 右侧被挡住（右方向占最低 2 位）时选其他可走的方向
+    blocked_right = 0xFF & ~0b11
+    assert policy[encode_state(food_right, blocked_right, 8, 5)] in (0, 1)
+    # 只有向左可走
+    only_left = 0b11 << 2
+    assert policy[encode_state(food_right, only_left, 8, 5)] == 2
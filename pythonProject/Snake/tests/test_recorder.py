@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from game_env import SnakeGame
+from recorder import KEYFRAME, KEYFRAME_COUNT, EpisodeLog, EpisodeRecorder, Replay
+
+
+def _view(game):
+    return list(game.snake), game.food, game.poison, game.score, game.steps, game.done
+
+
+def _choose_action(game, rng):
+    """朝食物走，避开墙和蛇身；无路可走时随机"""
+    head = game.snake[0]
+    safe = []
+    for action, (dx, dy) in enumerate(((0, -1), (0, 1), (-1, 0), (1, 0))):
+        x, y = head[0] + dx, head[1] + dy
+        if 0 <= x < game.grid_size and 0 <= y < game.grid_size and not game.occupied[x, y]:
+            dist = abs(x - game.food[0]) + abs(y - game.food[1]) if game.food is not None else 0
+            safe.append((dist, rng.random(), action))
+    return min(safe)[2] if safe else rng.randrange(4)
+
+
+def _record(path, episodes, keyframe_every, seed=0):
+    """录制若干局，返回每局每一步之后的局面"""
+    game = SnakeGame(grid_size=8, poison_enabled=True, poison_immediate=True, clock_mode='sim', seed=seed)
+    recorder = EpisodeRecorder(str(path), keyframe_every)
+    actions = random.Random(seed)
+    trajectories = []
+    for episode in range(episodes):
+        recorder.reset(game, seed + episode)
+        views = [_view(game)]
+        while not game.done:
+            action = _choose_action(game, actions)
+            game.step(action)
+            recorder.record(action)
+            views.append(_view(game))
+        trajectories.append(views)
+    recorder.close()
+    return trajectories
+
+
+@pytest.mark.parametrize('keyframe_every', [0, 3])
+def test_seek_matches_recording(tmp_path, keyframe_every):
+    path = tmp_path / 'runs.snkr'
+    trajectories = _record(path, 5, keyframe_every)
+    log = EpisodeLog(str(path))
+    assert len(log) == 5
+    order = random.Random(1)
+    for episode, views in zip(log, trajectories):
+        assert episode.num_steps == len(views) - 1
+        replay = Replay(episode)
+        steps = list(range(len(views))) + [order.randrange(len(views)) for _ in range(30)]
+        for step in steps:
+            assert _view(replay.seek(step)) == views[step]
+
+
+def test_keyframes_are_packed(tmp_path):
+    path = tmp_path / 'runs.snkr'
+    _record(path, 3, 2)
+    log = EpisodeLog(str(path))
+    for header, episode in zip(log.headers, log):
+        assert [step for step, _ in episode.keyframes] == list(range(2, episode.num_steps, 2))
+        # 每个关键帧只有定长头部和蛇身坐标，不含随机数状态；之后每次放置 2 字节
+        assert header[7] == (KEYFRAME_COUNT.size + 2 * len(episode.placements)
+                             + sum(KEYFRAME.size + 4 * len(fields['snake']) for _, fields in episode.keyframes))
+
+
+def test_keyframes_do_not_change_episodes(tmp_path):
+    assert _record(tmp_path / 'a.snkr', 5, 3) == _record(tmp_path / 'b.snkr', 5, 0)
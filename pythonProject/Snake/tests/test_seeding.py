@@ -0,0 +1,56 @@
+import numpy as np
+
+from game_env import SnakeGame
+from ql_agent import QLAgent
+from seeding import derive_seed, spawn_seeds
+from train import train_phase, train_phase_parallel
+from vec_env import VecSnakeGame
+
+ENV_CONFIG = {'grid_size': 10, 'poison_enabled': True, 'poison_immediate': True, 'clock_mode': 'sim'}
+
+
+def _trajectory(seed, actions):
+    game = SnakeGame(**ENV_CONFIG)
+    game.reset(seed)
+    positions = [(game.food, game.poison)]
+    for action in actions:
+        game.step(action)
+        positions.append((list(game.snake), game.food, game.poison, game.score))
+        if game.done:
+            break
+    return positions
+
+
+def test_derive_seed_is_stable():
+    assert derive_seed(42, 3, 1) == derive_seed(42, 3, 1)
+    assert derive_seed(42, 3, 1) != derive_seed(42, 3, 0)
+    assert spawn_seeds(42, 3) == [derive_seed(42, i) for i in range(3)]
+
+
+def test_same_seed_same_snake_game():
+    actions = np.random.default_rng(0).integers(0, 4, 200).tolist()
+    assert _trajectory(7, actions) == _trajectory(7, actions)
+    assert _trajectory(7, actions) != _trajectory(8, actions)
+
+
+def test_serial_matches_one_worker():
+    serial = QLAgent(seed=0)
+    _, serial_metrics = train_phase(ENV_CONFIG, serial, 30, 'serial', render_every=0, seed=5)
+    parallel = QLAgent(seed=0)
+    _, parallel_metrics = train_phase_parallel(ENV_CONFIG, parallel, 30, 'parallel', num_workers=1,
+                                               chunk_size=10, seed=5)
+    assert np.array_equal(serial_metrics.scores.values(), parallel_metrics.scores.values())
+    assert np.array_equal(serial.q_table, parallel.q_table)
+
+
+def test_vec_env_is_reproducible():
+    def run(seed):
+        env = VecSnakeGame(num_envs=8, grid_size=10, poison_enabled=True, poison_immediate=True, seed=seed)
+        env.reset()
+        rng = np.random.default_rng(1)
+        for _ in range(100):
+            env.step(rng.integers(0, 4, env.num_envs))
+        return env.score.copy(), env.food_x.copy(), env.food_y.copy()
+
+    for a, b in zip(run(3), run(3)):
+        assert np.array_equal(a, b)
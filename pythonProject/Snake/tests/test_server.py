@@ -0,0 +1,125 @@
+import asyncio
+import random
+
+import pytest
+
+from server import CLIENT_MSG, DELTA, GameServer, SnakeClient
+
+
+async def _start(**kwargs):
+    """启动服务器（不启动定时循环，由测试调用 tick）和一个已连接的客户端"""
+    server = GameServer(**kwargs)
+    tcp_server, ticker = await server.serve(port=0)
+    ticker.cancel()
+    client = SnakeClient()
+    reader_task = await client.connect(port=tcp_server.sockets[0].getsockname()[1])
+    return server, tcp_server, client, reader_task
+
+
+async def _stop(tcp_server, client, reader_task):
+    reader_task.cancel()
+    client.writer.close()
+    await client.writer.wait_closed()
+    tcp_server.close()
+    await tcp_server.wait_closed()
+
+
+def _settle():
+    return asyncio.sleep(0.01)
+
+
+def _matches(game, expected):
+    return (list(game.snake), game.food, game.poison, game.score, game.steps, game.done) == \
+        (list(expected.snake), expected.food, expected.poison, expected.score, expected.steps, expected.done)
+
+
+async def _synced(server, games, timeout=2.0):
+    """等待客户端收到所有帧，直到每个 RemoteGame 都与服务器上的对局一致"""
+    for _ in range(int(timeout / 0.005)):
+        if all(_matches(game, server.sessions[game.sid].game) for game in games):
+            return True
+        await asyncio.sleep(0.005)
+    return False
+
+
+def test_message_sizes():
+    assert CLIENT_MSG.size == 6
+    assert DELTA.size == 20
+
+
+def test_client_reconstructs_server_games():
+    async def run():
+        server, tcp_server, client, reader_task = await _start(
+            tick_ms=10, seed=1, env_config={'grid_size': 10, 'poison_enabled': True, 'poison_immediate': True})
+        games = await asyncio.gather(*(client.new_session() for _ in range(4)))
+        rng = random.Random(0)
+        for _ in range(150):
+            for game in games:
+                if game.done:
+                    client.restart(game.sid)
+                else:
+                    client.act(game.sid, rng.randrange(4))
+            await _settle()
+            server.tick()
+            assert await _synced(server, games)
+        assert sum(session.games for session in server.sessions.values()) > 0
+        await _stop(tcp_server, client, reader_task)
+
+    asyncio.run(run())
+
+
+def test_session_limit_and_cleanup():
+    async def run():
+        server, tcp_server, client, reader_task = await _start(max_sessions=2)
+        first, second = await asyncio.gather(client.new_session(), client.new_session())
+        with pytest.raises(RuntimeError):
+            await client.new_session()
+        client.close_session(first.sid)
+        await _settle()
+        assert list(server.sessions) == [second.sid]
+        await client.new_session()
+        await _settle()
+        assert len(server.sessions) == 2
+        await _stop(tcp_server, client, reader_task)
+        await _settle()
+        assert server.sessions == {}
+        assert server.connections == 0
+
+    asyncio.run(run())
+
+
+def test_resync_after_pause():
+    async def run():
+        server, tcp_server, client, reader_task = await _start(env_config={'grid_size': 10})
+        game = await client.new_session()
+        conn = server.sessions[game.sid].conn
+        conn.pause_writing()
+        # 暂停期间增量被丢弃；无动作时蛇一直向右，直到撞墙结束
+        while not server.sessions[game.sid].game.done:
+            server.tick()
+        await _settle()
+        assert not game.done
+        conn.resume_writing()
+        assert await _synced(server, [game])
+        assert game.done
+        await _stop(tcp_server, client, reader_task)
+
+    asyncio.run(run())
+
+
+def test_replies_sent_while_paused():
+    async def run():
+        server, tcp_server, client, reader_task = await _start(max_sessions=1)
+        first = client.new_session()
+        await _settle()
+        conn = next(iter(server.sessions.values())).conn
+        conn.pause_writing()
+        second = client.new_session()
+        game = await asyncio.wait_for(first, 2.0)
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(second, 2.0)
+        conn.resume_writing()
+        assert await _synced(server, [game])
+        await _stop(tcp_server, client, reader_task)
+
+    asyncio.run(run())
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from ql_agent import QLAgent
+from train import TrainStats, train_phase, train_phase_parallel
+
+ENV_CONFIG = {'grid_size': 10, 'poison_enabled': False, 'clock_mode': 'sim'}
+
+
+def test_parallel_stats_merge_worker_times():
+    agent = QLAgent(seed=0)
+    stats = TrainStats()
+    train_phase_parallel(ENV_CONFIG, agent, 20, 'test', num_workers=2, chunk_size=5, stats=stats, seed=1)
+    assert stats.episodes == 20
+    assert stats.steps > 0
+    assert stats.updates == stats.steps
+    assert stats.busy_time > 0
+    for stage in ('get_action', 'step', 'update'):
+        assert stats.times[stage] > 0
+    assert sum(stats.times.values()) <= stats.busy_time
+
+
+def test_replay_with_and_without_stats():
+    from replay_buffer import ReplayBuffer
+
+    q_tables = []
+    for stats in (None, TrainStats()):
+        agent = QLAgent(seed=0)
+        replay = ReplayBuffer(1000, seed=0)
+        train_phase(ENV_CONFIG, agent, 10, 'replay', render_every=0, stats=stats, seed=2, replay=replay,
+                    replay_batch=8, replay_every=4)
+        assert replay.count > 0
+        q_tables.append(agent.q_table)
+    assert stats.times['replay'] > 0
+    assert np.array_equal(*q_tables)
+
+
+class _Interrupted(Exception):
+    pass
+
+
+@pytest.mark.parametrize('replay_capacity', [0, 500])
+def test_resume_matches_uninterrupted(tmp_path, monkeypatch, replay_capacity):
+    import pickle
+
+    import train
+    from metrics import read_metrics
+
+    def run(name, **kwargs):
+        output_dir = tmp_path / name
+        output_dir.mkdir(exist_ok=True)
+        return train.multi_stage_train(total_episodes=90, render_every=0, checkpoint_every=10, seed=3,
+                                       checkpoint_path=str(output_dir / 'checkpoint.pkl'), output_dir=str(output_dir),
+                                       plot=False, log_every=5, replay_capacity=replay_capacity, **kwargs)
+
+    expected, _ = run('full')
+
+    # 第二个检查点（第一阶段中途）写完后中断训练，再从检查点恢复
+    submit = train.CheckpointWriter.submit
+    calls = []
+
+    def interrupt_after_second(writer, snapshot):
+        submit(writer, snapshot)
+        calls.append(snapshot['episode'])
+        if len(calls) == 2:
+            writer._pending.result()
+            raise _Interrupted
+
+    monkeypatch.setattr(train.CheckpointWriter, 'submit', interrupt_after_second)
+    with pytest.raises(_Interrupted):
+        run('resumed')
+    monkeypatch.setattr(train.CheckpointWriter, 'submit', submit)
+    with open(tmp_path / 'resumed' / 'checkpoint.pkl', 'rb') as f:
+        assert pickle.load(f)['episode'] == calls[-1] > 0
+    resumed, _ = run('resumed', resume=True)
+
+    assert np.array_equal(resumed.q_table, expected.q_table)
+    assert resumed.epsilon == expected.epsilon
+
+    def rows(name):
+        return [{k: v for k, v in row.items() if k != 'time'}
+                for row in read_metrics(str(tmp_path / name / 'train_metrics.jsonl'))]
+
+    assert rows('resumed') == rows('full')
@@ -0,0 +1,152 @@
+import random
+
+import numpy as np
+import pytest
+
+from game_env import SnakeGame
+from vec_env import VecSnakeGame
+
+GRID = 4
+# 按行来回（蛇形）遍历 4x4 棋盘；蛇占据前 15 格，蛇头在 (1, 3)，只剩 (0, 3) 一个空格
+PATH = [(x, y) if y % 2 == 0 else (GRID - 1 - x, y) for y in range(GRID) for x in range(GRID)]
+BODY = PATH[-2::-1]
+LAST_CELL = PATH[-1]
+LEFT = 2
+
+
+def _fill_board(env, i, body, food):
+    g = env.grid_size
+    cells = [y * g + x for x, y in body]
+    env.occupied[i] = False
+    env.occupied[i, cells] = True
+    env.body[i, :len(cells)] = cells
+    env.head_idx[i] = 0
+    env.length[i] = len(cells)
+    env.head_x[i], env.head_y[i] = body[0]
+    env.dir_x[i], env.dir_y[i] = body[0][0] - body[1][0], body[0][1] - body[1][1]
+    env.food_x[i], env.food_y[i] = food
+
+
+@pytest.mark.parametrize('max_steps', [0, 1000])
+def test_full_board_ends_episode(max_steps):
+    game = SnakeGame(grid_size=GRID, clock_mode='sim', seed=0)
+    game._set_snake(BODY)
+    game.direction = (-1, 0)
+    game.food = LAST_CELL
+    _, game_reward, game_done = game.step(LEFT)
+
+    env = VecSnakeGame(num_envs=2, grid_size=GRID, seed=0, max_steps=max_steps)
+    env.reset()
+    _fill_board(env, 0, BODY, LAST_CELL)
+    score = env.score[0]
+    _, rewards, dones = env.step(np.array([LEFT, 3]))
+    assert game_done and dones[0]
+    assert rewards[0] == game_reward
+    assert env.final_cause[0] == VecSnakeGame.CAUSE_FULL
+    assert env.final_score[0] == score + 10
+    assert env.length[0] == 3  # 已自动重置
+
+
+def test_no_poison_without_free_cell():
+    env = VecSnakeGame(num_envs=1, grid_size=GRID, poison_enabled=True, poison_immediate=True, seed=0)
+    _fill_board(env, 0, BODY, LAST_CELL)
+    env._place_poison(np.array([0]))
+    assert not env.has_poison[0]
+
+
+def test_board_invariants():
+    env = VecSnakeGame(num_envs=16, grid_size=6, seed=0, max_steps=50)
+    env.reset()
+    rng = np.random.default_rng(0)
+    for _ in range(400):
+        env.step(rng.integers(0, 4, env.num_envs))
+        for i in range(env.num_envs):
+            snake = env.snake(i)
+            assert len(set(snake)) == len(snake) == env.length[i]
+            assert env.occupied[i].sum() == env.length[i]
+            assert (env.food_x[i], env.food_y[i]) not in snake
+
+
+def _pick(rng, free):
+    """从按 (x, y) 排序的空格中随机取一个；两个环境用同样种子的 rng 即得到相同的放置位置"""
+    return free[rng.randrange(len(free))] if free else None
+
+
+class ScriptedSnakeGame(SnakeGame):
+    def __init__(self, placement_seed, **kwargs):
+        self.placement_rng = random.Random(placement_seed)
+        super().__init__(**kwargs)
+
+    def _free(self, avoid=None):
+        g = self.grid_size
+        return [(x, y) for x in range(g) for y in range(g) if not self.occupied[x, y] and (x, y) != avoid]
+
+    def _place_food(self):
+        return _pick(self.placement_rng, self._free())
+
+    def _place_poison(self):
+        return _pick(self.placement_rng, self._free(self.food))
+
+
+class ScriptedVecSnakeGame(VecSnakeGame):
+    def __init__(self, placement_seed, **kwargs):
+        self.placement_rng = random.Random(placement_seed)
+        super().__init__(**kwargs)
+
+    def _sample_free_cells(self, idx, avoid_food=False):
+        g = self.grid_size
+        cells = []
+        for i in idx:
+            food = (self.food_x[i], self.food_y[i]) if avoid_food else None
+            free = sorted((c % g, c // g) for c in np.flatnonzero(~self.occupied[i]))
+            x, y = _pick(self.placement_rng, [pos for pos in free if pos != food])
+            cells.append(y * g + x)
+        return np.array(cells, dtype=np.int64)
+
+
+def _safe_random_action(game, rng):
+    """随机选一个下一步不会撞上的动作（都会撞上时随机），让对局足够长，覆盖延迟毒药和物品生命周期"""
+    head = game.snake[0]
+    safe = []
+    for action, (dx, dy) in enumerate(((0, -1), (0, 1), (-1, 0), (1, 0))):
+        x, y = head[0] + dx, head[1] + dy
+        if 0 <= x < game.grid_size and 0 <= y < game.grid_size and not game.occupied[x, y]:
+            safe.append(action)
+    return rng.choice(safe) if safe and rng.random() < 0.98 else rng.randrange(4)
+
+
+@pytest.mark.parametrize('discrete_state', [False, True])
+@pytest.mark.parametrize('poison_enabled, poison_immediate', [(False, False), (True, False), (True, True)])
+def test_lockstep_with_snake_game(discrete_state, poison_enabled, poison_immediate):
+    config = {'grid_size': 8, 'poison_enabled': poison_enabled, 'poison_immediate': poison_immediate,
+              'tick_ms': 100, 'discrete_state': discrete_state}
+    game = ScriptedSnakeGame(5, clock_mode='sim', **config)
+    env = ScriptedVecSnakeGame(5, num_envs=1, **config)
+    state = game.reset()
+    states = env.reset()
+    rng = random.Random(0)
+    episodes = 0
+    poison_seen = 0
+    for _ in range(2000):
+        if discrete_state:
+            assert states[0] == state
+        else:
+            assert np.allclose(states[0], state, rtol=0, atol=1e-6)
+        assert env.snake(0) == list(game.snake)
+        assert (env.food_x[0], env.food_y[0]) == game.food
+        assert ((env.poison_x[0], env.poison_y[0]) if env.has_poison[0] else None) == game.poison
+        assert env.score[0] == game.score
+        poison_seen += game.poison is not None
+
+        action = _safe_random_action(game, rng)
+        state, reward, done = game.step(action)
+        states, rewards, dones = env.step(np.array([action]))
+        assert rewards[0] == pytest.approx(reward)
+        assert dones[0] == done
+        if done:
+            assert env.final_score[0] == game.score
+            assert env.final_steps[0] == game.steps
+            state = game.reset()
+            episodes += 1
+    assert episodes > 3
+    assert (poison_seen > 0) == poison_enabled
@@ -1,165 +1,659 @@
 from game_env import SnakeGame
-from ql_agent import QLAgent
+from ql_agent import QLAgent, find_qtable, compile_policy, save_policy, load_policy
+from seeding import make_seed, derive_seed
+from metrics import PhaseMetrics, MetricsSink
 import numpy as np
-import matplotlib.pyplot as plt
-import pygame
+import argparse
+import copy
+import time
 import sys
 import os
 
-def train_phase(env_config, agent, episodes, phase_name, render_every=1000, render_fps=30):
+
+class TrainStats:
+    """
+    训练各环节的计时与计数（可选）：get_action、env.step、agent.update、经验回放、渲染的累计耗时，
+    以及步数、更新次数和新出现的 Q 表状态数。未启用时训练循环不做任何计时
+    并行模式下各环节耗时由工作进程分别计时后累加（merge），占比按所有工作进程的训练总用时（busy_time）计算
+    """
+    STAGES = ('get_action', 'step', 'update', 'replay', 'render')
+
+    def __init__(self):
+        self.times = dict.fromkeys(self.STAGES, 0.0)
+        self.episodes = 0
+        self.steps = 0
+        self.updates = 0
+        self.new_states = 0
+        self.wall_time = 0.0
+        self.busy_time = 0.0
+        self._start_time = None
+        self._start_states = 0
+
+    @staticmethod
+    def _count_states(agent):
+        # 没有 Q 表的智能体（如 neural_agent.MLPAgent）不统计状态数
+        q_table = getattr(agent, 'q_table', None)
+        return 0 if q_table is None else int(np.count_nonzero(q_table.any(axis=1)))
+
+    def start(self, agent):
+        self._start_time = time.perf_counter()
+        self._start_states = self._count_states(agent)
+
+    def stop(self, agent):
+        self.wall_time += time.perf_counter() - self._start_time
+        self.new_states += self._count_states(agent) - self._start_states
+
+    def merge(self, worker_stats):
+        """累加一个工作进程任务的统计（_run_episodes 返回的字典：各环节耗时、步数、更新次数、总用时）"""
+        for stage in self.STAGES:
+            self.times[stage] += worker_stats['times'][stage]
+        self.steps += worker_stats['steps']
+        self.updates += worker_stats['updates']
+        self.busy_time += worker_stats['busy_time']
+
+    def report(self, phase_name):
+        wall = max(self.wall_time, 1e-9)
+        print(f"[{phase_name}] 统计: {self.episodes} 轮, {self.steps} 步, {self.updates} 次更新, "
+              f"新增 Q 状态 {self.new_states}, 用时 {self.wall_time:.2f} 秒, {self.steps / wall:.0f} 步/秒")
+        if self.steps > 0:
+            # 串行模式的分母为墙钟时间；并行模式为各工作进程训练用时之和
+            total = self.busy_time if self.busy_time > 0 else wall
+            if self.busy_time > 0:
+                print(f"    各环节为所有工作进程合计（共 {total:.2f} 秒）")
+            measured = 0.0
+            for stage in self.STAGES:
+                t = self.times[stage]
+                measured += t
+                print(f"    {stage:<11} {t:8.2f} 秒 ({t / total:6.1%})  {t / self.steps * 1e6:8.2f} us/步")
+            print(f"    {'other':<11} {total - measured:8.2f} 秒 ({(total - measured) / total:6.1%})")
+
+
+def train_phase(env_config, agent, episodes, phase_name, render_every=1000, render_fps=30,
+                start_episode=0, metrics=None, checkpoint_every=0, on_checkpoint=None, stats=None,
+                spectator=None, recorder=None, seed=None, sink=None, log_every=100, episode_offset=0,
+                replay=None, replay_batch=32, replay_every=4):
     """
     单个阶段的训练函数
     env_config: 环境参数字典
     agent: 智能体实例
     episodes: 本阶段训练轮数
     phase_name: 阶段名称（用于显示）
-    render_every: 渲染间隔
+    render_every: 渲染间隔：每隔多少轮把一整局的局面推送到观察窗口（Spectator，独立进程，不拖慢训练）
+    render_fps: 观察窗口的帧率
+    start_episode, metrics: 断点续训时已完成的轮数及已有的 PhaseMetrics；返回 (智能体, 本阶段的 PhaseMetrics)
+    checkpoint_every, on_checkpoint: 每隔多少轮调用 on_checkpoint(episode, metrics)
+    stats: TrainStats 实例，传入时记录各环节耗时和计数
+    spectator: 已打开的 Spectator（多阶段训练共用一个窗口）；为 None 且需要渲染时本阶段自行创建
+    recorder: EpisodeRecorder 实例，传入时把每一局记录到录像文件
+    seed: 本阶段的种子，每一局的环境和探索随机数都由 (seed, 轮次) 派生，
+          因此结果与是否续训、串行还是并行无关；None 表示随机生成
+    sink, log_every, episode_offset: 每隔 log_every 轮把一行指标写入 MetricsSink，
+          episode_offset 为本阶段之前的总轮数（用于全局轮次）
+    replay, replay_batch, replay_every: ReplayBuffer 实例，传入时每一步的转移都存入缓冲区，
+          并每隔 replay_every 步从中采样 replay_batch 条做一次批量更新（QLAgent.update_batch）
     """
+    if seed is None:
+        seed = make_seed()
     env = SnakeGame(**env_config)
-    scores = []
-    avg_scores = []
-    record_points = []
-
-    # 初始化渲染
-    if render_every > 0:
-        pygame.init()
-        screen = pygame.display.set_mode((env.width, env.height))
-        pygame.display.set_caption(f"训练 - {phase_name}")
-        clock = pygame.time.Clock()
-    else:
-        screen = None
-        clock = None
-
-    for episode in range(1, episodes + 1):
-        state = env.reset()
+    if metrics is None:
+        metrics = PhaseMetrics(phase_name)
+
+    # 观察窗口在独立进程中绘制（pygame 只在观察进程中导入，训练进程不依赖 pygame）
+    own_spectator = False
+    if render_every <= 0:
+        spectator = None
+    elif spectator is None:
+        from spectator import Spectator
+        spectator = Spectator(grid_size=env.grid_size, cell_size=env.cell_size, fps=render_fps)
+        own_spectator = True
+
+    if stats is not None:
+        stats.start(agent)
+    perf_counter = time.perf_counter
+
+    for episode in range(start_episode + 1, episodes + 1):
+        env_seed = derive_seed(seed, episode, 0)
+        agent.rng.seed(derive_seed(seed, episode, 1))
+        if replay is not None:
+            replay.rng = np.random.default_rng(derive_seed(seed, episode, 2))
+        state = env.reset(env_seed) if recorder is None else recorder.reset(env, env_seed)
         done = False
+        watched = spectator is not None and episode % render_every == 0 and spectator.begin_episode()
+        if watched:
+            label = f"{phase_name} Episode {episode}"
+            spectator.push(env, label)
 
         while not done:
-            action = agent.get_action(state)
-            next_state, reward, done = env.step(action)
-            agent.update(state, action, reward, next_state, done)
+            if stats is None:
+                action = agent.get_action(state)
+                next_state, reward, done = env.step(action)
+                agent.update(state, action, reward, next_state, done)
+            else:
+                t0 = perf_counter()
+                action = agent.get_action(state)
+                t1 = perf_counter()
+                next_state, reward, done = env.step(action)
+                t2 = perf_counter()
+                agent.update(state, action, reward, next_state, done)
+                t3 = perf_counter()
+                stats.times['get_action'] += t1 - t0
+                stats.times['step'] += t2 - t1
+                stats.times['update'] += t3 - t2
+                stats.steps += 1
+                stats.updates += 1
+            if replay is not None:
+                if stats is not None:
+                    replay_start = perf_counter()
+                replay.add(agent.state_key(state), action, reward, agent.state_key(next_state), done)
+                if replay.count % replay_every == 0 and len(replay) >= replay_batch:
+                    agent.update_batch(*replay.sample(replay_batch))
+                    if stats is not None:
+                        stats.updates += replay_batch
+                if stats is not None:
+                    stats.times['replay'] += perf_counter() - replay_start
             state = next_state
+            if recorder is not None:
+                recorder.record(action)
+
+            if watched:
+                if stats is not None:
+                    render_start = perf_counter()
+                spectator.push(env, label)
+                if stats is not None:
+                    stats.times['render'] += perf_counter() - render_start
+
+        metrics.add(env.score, env.steps)
+        if stats is not None:
+            stats.episodes += 1
+
+        _report_episode(metrics, agent.epsilon, getattr(agent, 'q_table', None), episodes, sink, log_every,
+                        episode_offset)
+        if on_checkpoint is not None and checkpoint_every > 0 and episode % checkpoint_every == 0:
+            on_checkpoint(episode, metrics)
+
+    if own_spectator:
+        spectator.close()
+    if stats is not None:
+        stats.stop(agent)
+    return agent, metrics
+
 
-            if render_every > 0 and episode % render_every == 0:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        sys.exit()
-                env.render(screen)
-                font = pygame.font.Font(None, 36)
-                score_text = font.render(f"Score: {env.score}", True, (0, 0, 0))
-                screen.blit(score_text, (10, 10))
-                pygame.display.flip()
-                clock.tick(render_fps)
+def _report_episode(metrics, epsilon, q_table, episodes, sink, log_every, episode_offset):
+    """一局结束后：每 log_every 轮向 sink 写一行指标，每 metrics.window 轮输出一次最近的平均得分"""
+    episode = metrics.episodes
+    if sink is not None and log_every > 0 and episode % log_every == 0:
+        sink.write(metrics.row(epsilon, q_table, episode_offset))
+    if episode % metrics.window == 0:
+        print(f"[{metrics.phase}] Episode {episode}/{episodes} | 平均得分(最近{metrics.window}轮): "
+              f"{metrics.avg_scores[-1]:.2f} | Epsilon: {epsilon:.3f}")
 
+
+# 工作进程中连接到的共享 Q 表（由 _init_worker 设置）
+_worker_shm = None
+_worker_q_table = None
+
+
+def _init_worker(shm_name, shape):
+    """进程池初始化：连接共享内存中的 Q 表"""
+    global _worker_shm, _worker_q_table
+    from multiprocessing import shared_memory
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_q_table = np.ndarray(shape, dtype=np.float32, buffer=_worker_shm.buf)
+
+
+def _run_episodes(task):
+    """
+    工作进程：在共享 Q 表上连续训练第 start+1 到 start+episodes 轮（无锁更新），
+    返回 (每轮得分, 每轮步数, 统计)；timing 为 True 时统计为 TrainStats.merge 使用的字典，否则为 None
+    每一局的随机数与串行训练（train_phase）的同一轮相同
+    """
+    env_config, start, episodes, agent_params, epsilon, seed, timing = task
+    env = SnakeGame(**env_config)
+    agent = QLAgent(epsilon=epsilon, **agent_params)
+    agent.q_table = _worker_q_table
+    scores = []
+    lengths = []
+    times = dict.fromkeys(TrainStats.STAGES, 0.0)
+    perf_counter = time.perf_counter
+    busy_start = perf_counter()
+    for episode in range(start + 1, start + episodes + 1):
+        agent.rng.seed(derive_seed(seed, episode, 1))
+        state = env.reset(derive_seed(seed, episode, 0))
+        done = False
+        while not done:
+            if not timing:
+                action = agent.get_action(state)
+                next_state, reward, done = env.step(action)
+                agent.update(state, action, reward, next_state, done)
+            else:
+                t0 = perf_counter()
+                action = agent.get_action(state)
+                t1 = perf_counter()
+                next_state, reward, done = env.step(action)
+                t2 = perf_counter()
+                agent.update(state, action, reward, next_state, done)
+                t3 = perf_counter()
+                times['get_action'] += t1 - t0
+                times['step'] += t2 - t1
+                times['update'] += t3 - t2
+            state = next_state
         scores.append(env.score)
+        lengths.append(env.steps)
+    worker_stats = None
+    if timing:
+        worker_stats = {'times': times, 'steps': sum(lengths), 'updates': sum(lengths),
+                        'busy_time': perf_counter() - busy_start}
+    return scores, lengths, worker_stats
+
+
+def train_phase_parallel(env_config, agent, episodes, phase_name, num_workers, chunk_size=250,
+                         start_episode=0, metrics=None, checkpoint_every=0, on_checkpoint=None, stats=None,
+                         seed=None, sink=None, log_every=100, episode_offset=0):
+    """
+    单个阶段的多进程并行训练（Hogwild 式），返回值及续训、检查点、统计、种子、指标参数同 train_phase
+    （并行模式下各环节耗时由工作进程计时后合并到 stats，见 TrainStats.merge）
+    num_workers: 工作进程数，所有进程无锁更新同一张共享内存中的 Q 表
+    chunk_size: 每个任务的轮数，任务起始 epsilon 按串行训练的衰减进度计算
+    检查点在收到完整任务结果后写入，Q 表中可能已包含后续任务的部分更新
+    """
+    from multiprocessing import Pool, shared_memory
+
+    if seed is None:
+        seed = make_seed()
+    start_epsilon = agent.epsilon
 
-        if episode % 1000 == 0:
-            avg_score = np.mean(scores[-1000:])
-            avg_scores.append(avg_score)
-            record_points.append(episode)
-            print(f"[{phase_name}] Episode {episode}/{episodes} | 平均得分(最近1000轮): {avg_score:.2f} | Epsilon: {agent.epsilon:.3f}")
+    def epsilon_after(n):
+        return max(agent.epsilon_min, start_epsilon * agent.epsilon_decay ** (n - start_episode))
 
-    return agent, scores, avg_scores, record_points
+    agent_params = {
+        'action_size': agent.action_size,
+        'alpha': agent.alpha,
+        'gamma': agent.gamma,
+        'epsilon_min': agent.epsilon_min,
+        'epsilon_decay': agent.epsilon_decay,
+    }
+    tasks = []
+    for start in range(start_episode, episodes, chunk_size):
+        n = min(chunk_size, episodes - start)
+        tasks.append((env_config, start, n, agent_params, epsilon_after(start), seed, stats is not None))
 
+    if metrics is None:
+        metrics = PhaseMetrics(phase_name)
+
+    if stats is not None:
+        stats.start(agent)
+    shm = shared_memory.SharedMemory(create=True, size=agent.q_table.nbytes)
+    try:
+        q_table = np.ndarray(agent.q_table.shape, dtype=np.float32, buffer=shm.buf)
+        q_table[:] = agent.q_table
+        # 训练期间智能体直接引用共享 Q 表，检查点读取的即是最新数据
+        agent.q_table = q_table
+        start_time = time.perf_counter()
+        with Pool(num_workers, initializer=_init_worker, initargs=(shm.name, q_table.shape)) as pool:
+            # 按任务顺序接收结果，进度输出与串行训练一致
+            for chunk_scores, chunk_lengths, worker_stats in pool.imap(_run_episodes, tasks):
+                if stats is not None:
+                    stats.episodes += len(chunk_scores)
+                    stats.merge(worker_stats)
+                last_episode = metrics.episodes
+                for score, length in zip(chunk_scores, chunk_lengths):
+                    episode = metrics.add(score, length)
+                    _report_episode(metrics, epsilon_after(episode), q_table, episodes, sink, log_every,
+                                    episode_offset)
+                if on_checkpoint is not None and checkpoint_every > 0 and \
+                        metrics.episodes // checkpoint_every > last_episode // checkpoint_every:
+                    agent.epsilon = epsilon_after(metrics.episodes)
+                    on_checkpoint(metrics.episodes, metrics)
+        elapsed = time.perf_counter() - start_time
+    finally:
+        agent.q_table = np.array(agent.q_table)
+        del q_table
+        shm.close()
+        shm.unlink()
 
-def multi_stage_train(total_episodes=30000, render_every=1000):
+    if stats is not None:
+        stats.stop(agent)
+    agent.epsilon = epsilon_after(episodes)
+    print(f"[{phase_name}] {num_workers} 个进程完成 {episodes - start_episode} 轮，用时 {elapsed:.1f} 秒，"
+          f"{(episodes - start_episode) / elapsed:.0f} 轮/秒")
+    return agent, metrics
+
+
+class CheckpointWriter:
+    """后台线程写检查点：主线程只负责复制数据，序列化和写盘在后台完成，训练不会因此停顿"""
+    def __init__(self, path):
+        from concurrent.futures import ThreadPoolExecutor
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = None
+
+    def submit(self, snapshot):
+        # 上一个检查点尚未写完时先等待，保证按顺序落盘
+        if self._pending is not None:
+            self._pending.result()
+        self._pending = self._executor.submit(self._write, snapshot)
+
+    def _write(self, snapshot):
+        import pickle
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        if self._pending is not None:
+            self._pending.result()
+        self._executor.shutdown()
+
+
+def load_checkpoint(path):
+    import pickle
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+# 多阶段课程：每个阶段的轮数比例（最后一个阶段取剩余轮数）、开始时重置的 epsilon、环境参数和 Q 表保存文件
+PHASES = [
+    {
+        'name': "Phase1-NoPoison",
+        'title': "阶段1：无毒药",
+        'summary': "阶段1 (无毒药)",
+        'label': 'Phase1 (No Poison)',
+        'marker': 'o',
+        'ratio': 0.4,      # 40% 无毒药
+        'epsilon': None,   # 沿用初始 epsilon
+        'config': {
+            'grid_size': 20,
+            'cell_size': 25,
+            'poison_enabled': False,
+            'poison_immediate': False,  # 设为True也不影响，因为poison_enabled=False
+            'clock_mode': 'sim',        # 虚拟时钟：物品生命周期按步数计算，与训练速度无关
+            'discrete_state': True,     # 环境直接返回离散状态键，省去 14 维数组的创建和离散化
+        },
+        'save_path': "qtable_phase1.qtb",
+    },
+    {
+        'name': "Phase2-PoisonDelayed",
+        'title': "阶段2：毒药延迟出现 (10秒后)",
+        'summary': "阶段2 (毒药延迟10秒)",
+        'label': 'Phase2 (Delayed Poison)',
+        'marker': 's',
+        'ratio': 0.3,      # 30% 毒药延迟
+        'epsilon': 0.3,    # 提高探索率，让AI适应新环境
+        'config': {
+            'grid_size': 20,
+            'cell_size': 25,
+            'poison_enabled': True,
+            'poison_immediate': False,  # 延迟出现
+            'clock_mode': 'sim',
+            'discrete_state': True,
+        },
+        'save_path': "qtable_phase2.qtb",
+    },
+    {
+        'name': "Phase3-PoisonImmediate",
+        'title': "阶段3：毒药立即出现",
+        'summary': "阶段3 (毒药立即出现)",
+        'label': 'Phase3 (Immediate Poison)',
+        'marker': '^',
+        'ratio': None,     # 剩余 30% 毒药立即
+        'epsilon': 0.1,    # 降低探索，更多利用已学知识
+        'config': {
+            'grid_size': 20,
+            'cell_size': 25,
+            'poison_enabled': True,
+            'poison_immediate': True,   # 立即出现
+            'clock_mode': 'sim',
+            'discrete_state': True,
+        },
+        'save_path': "qtable_final.qtb",
+    },
+]
+
+
+# 智能体的默认超参数（multi_stage_train 的 agent_params 可逐项覆盖）
+AGENT_PARAMS = {
+    'alpha': 0.05,
+    'gamma': 0.95,
+    'epsilon': 1.0,
+    'epsilon_min': 0.01,
+    'epsilon_decay': 0.999,
+}
+
+
+def split_episodes(total_episodes, ratios):
+    """按比例分配各阶段轮数：ratios 为除最后一个阶段以外各阶段的比例，最后一个阶段取剩余轮数"""
+    phase_episodes = [int(total_episodes * ratio) for ratio in ratios]
+    phase_episodes.append(total_episodes - sum(phase_episodes))
+    return phase_episodes
+
+
+def multi_stage_train(total_episodes=30000, render_every=1000, num_workers=1,
+                      checkpoint_path='checkpoint.pkl', checkpoint_every=1000, resume=False,
+                      timing=False, profile=False, record_path=None, keyframe_every=0, seed=None,
+                      agent_params=None, phase_ratios=None, phase_epsilons=None, output_dir='.', plot=True,
+                      metrics_path=None, log_every=100, replay_capacity=0, replay_batch=32, replay_every=4):
     """
-    多阶段训练
+    多阶段训练，返回 (智能体, 各阶段的 PhaseMetrics 列表)
     total_episodes: 总训练轮数，按比例分配
+    num_workers: 大于 1 时各阶段使用多进程并行训练（不渲染）
+    checkpoint_path / checkpoint_every: 每隔多少轮在后台写一次检查点（0 表示不写）
+    resume: 从 checkpoint_path 恢复训练（串行模式下与未中断的训练完全一致）
+    timing: 每个阶段结束时输出各环节耗时和计数（TrainStats）
+    profile: 用 cProfile 分析每个阶段，结果保存为 output_dir 下的 profile_<阶段名>.prof（并行模式下只分析主进程）
+    record_path / keyframe_every: 把每一局追加记录到录像文件（.snkr，仅串行模式），可用 replay.py 回放
+    seed: 总种子，各阶段的种子由它派生；None 表示随机生成（会打印出来以便复现）
+    agent_params: 覆盖 AGENT_PARAMS 中的智能体超参数，如 {'alpha': 0.1}
+    phase_ratios: 除最后一个阶段以外各阶段的轮数比例，默认取 PHASES 中的 ratio
+    phase_epsilons: 各阶段开始时重置的 epsilon（None 表示沿用），默认取 PHASES 中的 epsilon
+    output_dir: Q 表、指标文件和学习曲线的保存目录
+    plot: 训练结束后是否用指标文件绘制并显示学习曲线（超参数搜索等批量运行时关闭）
+    metrics_path / log_every: 每隔 log_every 轮向指标文件（.jsonl 或 .csv，默认 <output_dir>/train_metrics.jsonl）
+          追加一行滚动统计，训练中途即可用 plot_metrics.py 绘图；log_every 为 0 时不写
+    replay_capacity / replay_batch / replay_every: 经验回放缓冲区容量（0 表示不使用，仅串行模式），
+          每隔 replay_every 步采样 replay_batch 条转移做一次批量更新；缓冲区在各阶段间保留
     """
-    # 各阶段轮数分配
-    phase1_episodes = int(total_episodes * 0.4)   # 40% 无毒药
-    phase2_episodes = int(total_episodes * 0.3)   # 30% 毒药延迟
-    phase3_episodes = total_episodes - phase1_episodes - phase2_episodes  # 剩余 30% 毒药立即
+    # 检查点内容：Q 表、epsilon、当前阶段、阶段内已完成轮数、总种子、训练参数、各阶段的 PhaseMetrics
+    checkpoint = None
+    if resume:
+        checkpoint = load_checkpoint(checkpoint_path)
+        total_episodes = checkpoint['total_episodes']
+        agent_params = checkpoint.get('agent_params', agent_params)
+        phase_ratios = checkpoint.get('phase_ratios', phase_ratios)
+        phase_epsilons = checkpoint.get('phase_epsilons', phase_epsilons)
+        replay_batch = checkpoint.get('replay_batch', replay_batch)
+        replay_every = checkpoint.get('replay_every', replay_every)
 
+    agent_params = {**AGENT_PARAMS, **(agent_params or {})}
+    if phase_ratios is None:
+        phase_ratios = [phase['ratio'] for phase in PHASES[:-1]]
+    if phase_epsilons is None:
+        phase_epsilons = [phase['epsilon'] for phase in PHASES]
+    agent = QLAgent(**agent_params)
+
+    if checkpoint is not None:
+        agent.q_table = checkpoint['q_table']
+        agent.epsilon = checkpoint['epsilon']
+        seed = checkpoint['seed']
+        if checkpoint['phase'] < len(PHASES):
+            print(f"从检查点 {checkpoint_path} 恢复：阶段{checkpoint['phase'] + 1}，第 {checkpoint['episode']} 轮")
+        else:
+            print(f"检查点 {checkpoint_path} 中的训练已全部完成")
+
+    phase_episodes = split_episodes(total_episodes, phase_ratios)
+
+    if seed is None:
+        seed = make_seed()
     print("===== 多阶段训练开始 =====")
-    print(f"阶段1 (无毒药): {phase1_episodes} 轮")
-    print(f"阶段2 (毒药延迟10秒): {phase2_episodes} 轮")
-    print(f"阶段3 (毒药立即出现): {phase3_episodes} 轮")
-
-    # 创建智能体（初始参数）
-    agent = QLAgent(alpha=0.05, gamma=0.95, epsilon=1.0,
-                    epsilon_min=0.01, epsilon_decay=0.999)
-
-    # 阶段1：无毒药
-    print("\n====== 阶段1：无毒药 ======")
-    config1 = {
-        'grid_size': 20,
-        'cell_size': 25,
-        'poison_enabled': False,
-        'poison_immediate': False   # 设为True也不影响，因为poison_enabled=False
-    }
-    agent, scores1, avg1, points1 = train_phase(config1, agent, phase1_episodes, "Phase1-NoPoison", render_every)
-    agent.save("qtable_phase1.pkl")
-    print("阶段1完成，Q表已保存为 qtable_phase1.pkl")
-
-    # 阶段2：毒药延迟出现
-    print("\n====== 阶段2：毒药延迟出现 (10秒后) ======")
-    # 加载阶段1的Q表（agent已经是训练后的，无需重新加载，但可以重置epsilon以保持探索）
-    agent.epsilon = 0.3   # 提高探索率，让AI适应新环境
-    config2 = {
-        'grid_size': 20,
-        'cell_size': 25,
-        'poison_enabled': True,
-        'poison_immediate': False   # 延迟出现
-    }
-    agent, scores2, avg2, points2 = train_phase(config2, agent, phase2_episodes, "Phase2-PoisonDelayed", render_every)
-    agent.save("qtable_phase2.pkl")
-    print("阶段2完成，Q表已保存为 qtable_phase2.pkl")
-
-    # 阶段3：毒药立即出现
-    print("\n====== 阶段3：毒药立即出现 ======")
-    agent.epsilon = 0.1   # 降低探索，更多利用已学知识
-    config3 = {
-        'grid_size': 20,
-        'cell_size': 25,
-        'poison_enabled': True,
-        'poison_immediate': True    # 立即出现
-    }
-    agent, scores3, avg3, points3 = train_phase(config3, agent, phase3_episodes, "Phase3-PoisonImmediate", render_every)
-    agent.save("qtable_final.pkl")
-    print("\n多阶段训练完成！最终Q表保存为 qtable_final.pkl")
-
-    # 绘制各阶段学习曲线
-    plt.figure(figsize=(12, 6))
-    # 由于各阶段记录点可能不同，分别绘图
-    # 将各阶段记录点的episode编号转换为全局episode编号
-    global_points1 = points1
-    global_points2 = [p + phase1_episodes for p in points2]
-    global_points3 = [p + phase1_episodes + phase2_episodes for p in points3]
-
-    plt.plot(global_points1, avg1, label='Phase1 (No Poison)', marker='o')
-    plt.plot(global_points2, avg2, label='Phase2 (Delayed Poison)', marker='s')
-    plt.plot(global_points3, avg3, label='Phase3 (Immediate Poison)', marker='^')
-    plt.xlabel('Global Episode')
-    plt.ylabel('Average Score (last 1000 episodes)')
-    plt.title('Multi-Stage Training Progress')
-    plt.legend()
-    plt.grid(True)
-    plt.savefig('multi_stage_curve.png')
-    plt.show()
-
-    return agent
-
-
-def demo(agent_path='qtable_final.pkl', grid_size=20):
+    print(f"随机种子: {seed}（使用 --seed {seed} 可复现）")
+    for phase, episodes in zip(PHASES, phase_episodes):
+        print(f"{phase['summary']}: {episodes} 轮")
+
+    history = []
+    if checkpoint is not None:
+        # 旧版检查点保存的是 (scores, avg_scores, record_points)
+        history = [h if isinstance(h, PhaseMetrics) else PhaseMetrics.from_history(phase['name'], h)
+                   for phase, h in zip(PHASES, checkpoint['history'])]
+    if metrics_path is None:
+        metrics_path = os.path.join(output_dir, 'train_metrics.jsonl')
+    sink = None
+    if log_every > 0:
+        resume_from = None
+        if checkpoint is not None:
+            resume_from = sum(phase_episodes[:checkpoint['phase']]) + checkpoint['episode']
+        sink = MetricsSink(metrics_path, resume_from)
+    writer = CheckpointWriter(checkpoint_path) if checkpoint_every > 0 else None
+    # 各阶段共用一个观察窗口（并行模式不渲染）
+    spectator = None
+    if render_every > 0 and num_workers <= 1:
+        from spectator import Spectator
+        grid_size = PHASES[0]['config']['grid_size']
+        spectator = Spectator(grid_size=grid_size)
+    replay = None
+    if checkpoint is not None:
+        replay = checkpoint.get('replay')
+    elif replay_capacity > 0:
+        from replay_buffer import ReplayBuffer
+        replay = ReplayBuffer(replay_capacity)
+    if replay is not None and num_workers > 1:
+        print("并行模式不支持经验回放，已忽略 --replay")
+        replay = None
+    recorder = None
+    if record_path is not None:
+        if num_workers > 1:
+            print("并行模式不支持录像，已忽略 --record")
+        else:
+            from recorder import EpisodeRecorder
+            recorder = EpisodeRecorder(record_path, keyframe_every)
+
+    def save_checkpoint(phase_index, episode, current=None):
+        # 在主线程中复制一份（环形缓冲区很小），后台线程写盘时训练可继续修改原对象
+        phases = copy.deepcopy(history if current is None else history + [current])
+        writer.submit({
+            'total_episodes': total_episodes,
+            'phase': phase_index,
+            'episode': episode,
+            'epsilon': agent.epsilon,
+            'q_table': np.array(agent.q_table),
+            'seed': seed,
+            'agent_params': agent_params,
+            'phase_ratios': list(phase_ratios),
+            'phase_epsilons': list(phase_epsilons),
+            'replay': None if replay is None else replay.snapshot(),
+            'replay_batch': replay_batch,
+            'replay_every': replay_every,
+            'history': phases,
+        })
+
+    try:
+        for i, (phase, episodes) in enumerate(zip(PHASES, phase_episodes)):
+            start_episode = 0
+            current = None
+            if checkpoint is not None:
+                if i < checkpoint['phase']:
+                    continue
+                if i == checkpoint['phase'] and checkpoint['episode'] > 0:
+                    start_episode = checkpoint['episode']
+                    current = history.pop()
+
+            print(f"\n====== {phase['title']} ======")
+            if start_episode == 0 and phase_epsilons[i] is not None:
+                agent.epsilon = phase_epsilons[i]
+
+            on_checkpoint = None
+            if writer is not None:
+                def on_checkpoint(episode, metrics, phase_index=i):
+                    save_checkpoint(phase_index, episode, metrics)
+
+            stats = TrainStats() if timing else None
+            profiler = None
+            if profile:
+                import cProfile
+                profiler = cProfile.Profile()
+                profiler.enable()
+
+            episode_offset = sum(phase_episodes[:i])
+            if num_workers > 1:
+                agent, metrics = train_phase_parallel(
+                    phase['config'], agent, episodes, phase['name'], num_workers,
+                    start_episode=start_episode, metrics=current,
+                    checkpoint_every=checkpoint_every, on_checkpoint=on_checkpoint, stats=stats,
+                    seed=derive_seed(seed, i), sink=sink, log_every=log_every, episode_offset=episode_offset)
+            else:
+                agent, metrics = train_phase(
+                    phase['config'], agent, episodes, phase['name'], render_every,
+                    start_episode=start_episode, metrics=current,
+                    checkpoint_every=checkpoint_every, on_checkpoint=on_checkpoint, stats=stats,
+                    spectator=spectator, recorder=recorder, seed=derive_seed(seed, i),
+                    sink=sink, log_every=log_every, episode_offset=episode_offset,
+                    replay=replay, replay_batch=replay_batch, replay_every=replay_every)
+            history.append(metrics)
+
+            if profiler is not None:
+                profiler.disable()
+                profile_path = os.path.join(output_dir, f"profile_{phase['name']}.prof")
+                profiler.dump_stats(profile_path)
+                print(f"[{phase['name']}] cProfile 结果已保存为 {profile_path}（可用 python -m pstats 或 snakeviz 查看）")
+            if stats is not None:
+                stats.report(phase['name'])
+
+            save_path = os.path.join(output_dir, phase['save_path'])
+            agent.save(save_path)
+            if i < len(PHASES) - 1:
+                print(f"阶段{i + 1}完成，Q表已保存为 {save_path}")
+            else:
+                # 同时导出最终 Q 表的贪心策略（main.py 的 AI 演示直接加载）
+                policy_path = os.path.join(output_dir, 'policy_final.qpol')
+                save_policy(policy_path, compile_policy(agent.q_table))
+                print(f"\n多阶段训练完成！最终Q表保存为 {save_path}，贪心策略保存为 {policy_path}")
+            if writer is not None:
+                save_checkpoint(i + 1, 0)
+    finally:
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+        if spectator is not None:
+            spectator.close()
+        if recorder is not None:
+            recorder.close()
+            print(f"共录制 {recorder.episodes} 局，保存在 {record_path}")
+
+    # 学习曲线由指标文件离线绘制（也可随时单独运行 plot_metrics.py）
+    if plot and sink is not None:
+        from plot_metrics import plot_metrics
+        plot_metrics(metrics_path, os.path.join(output_dir, 'multi_stage_curve.png'), show=True)
+
+    return agent, history
+
+
+def demo(agent_path=None, grid_size=20):
     """
     加载训练好的智能体并演示（供main.py调用）
+    agent_path: 贪心策略（.qpol）或 Q 表文件路径，默认依次查找 qtable_final.qtb、qtable_final.pkl
     """
-    env = SnakeGame(grid_size=grid_size, cell_size=25, poison_enabled=True, poison_immediate=True)
-    agent = QLAgent()
+    import pygame
+    from renderer import SnakeRenderer, render_text
+
+    env = SnakeGame(grid_size=grid_size, cell_size=25, poison_enabled=True, poison_immediate=True,
+                    discrete_state=True)
+    if agent_path is None:
+        agent_path = find_qtable('qtable_final') or 'qtable_final.qtb'
     try:
-        agent.load(agent_path)
+        # Q 表编译为按状态编号查动作的数组，每步只需一次索引
+        policy = load_policy(agent_path, mmap=True)
         print("模型加载成功，开始演示...")
     except Exception as e:
         print(f"模型加载失败：{e}")
         return
+    renderer = SnakeRenderer(env)
 
     pygame.init()
     screen = pygame.display.set_mode((env.width, env.height))
     pygame.display.set_caption("AI Demonstration - Snake")
     clock = pygame.time.Clock()
+    # 计时文字延伸到了第一行格子，擦除区域也要覆盖这一行
+    hud_top = pygame.Rect(0, 0, env.width, env.margin + env.cell_size)
 
     state = env.reset()
     done = False
@@ -174,34 +668,58 @@ def demo(agent_path='qtable_final.pkl', grid_size=20):
                 sys.exit()
 
         if not done:
-            state_key = agent._discretize_state(state)  # noqa
-            q_values = agent.q_table[state_key]
-            action = int(np.argmax(q_values))
-            next_state, reward, done = env.step(action)
+            next_state, reward, done = env.step(int(policy[state]))
             state = next_state
             play_time = (current_time - play_start_time) / 1000.0
         else:
-            font = pygame.font.Font(None, 36)
-            text = font.render(f"Game Over! Score: {env.score}", True, (255, 255, 255))
+            text = render_text(f"Game Over! Score: {env.score}", 36, (255, 255, 255))
             screen.blit(text, (env.width // 2 - 100, env.height // 2))
             pygame.display.flip()
             pygame.time.wait(3000)
+            renderer.invalidate()
             state = env.reset()
             done = False
             play_start_time = pygame.time.get_ticks()
 
-        env.render(screen)
-        font = pygame.font.Font(None, 30)
-        score_text = font.render(f"Score: {env.score}", True, (255, 255, 255))
+        dirty = renderer.render(screen)
+        dirty.append(renderer.clear(screen, hud_top))
+        score_text = render_text(f"Score: {env.score}", 30, (255, 255, 255))
         screen.blit(score_text, (10, 10))
-        time_text = font.render(f"Time: {int(play_time//60):02d}:{int(play_time%60):02d}", True, (255, 255, 255))
+        time_text = render_text(f"Time: {int(play_time//60):02d}:{int(play_time%60):02d}", 30, (255, 255, 255))
         screen.blit(time_text, (10, 40))
-        pygame.display.flip()
+        pygame.display.update(dirty)
         clock.tick(10)
 
 
 if __name__ == "__main__":
-    # 开始多阶段训练（总轮数30000）
-    final_agent = multi_stage_train(total_episodes=30000, render_every=1000)
+    parser = argparse.ArgumentParser(description="贪吃蛇 Q-learning 多阶段训练")
+    parser.add_argument('--episodes', type=int, default=30000, help="总训练轮数")
+    parser.add_argument('--render-every', type=int, default=1000, help="渲染间隔，0 表示不渲染")
+    parser.add_argument('--workers', type=int, default=1, help="并行训练的进程数，大于 1 时不渲染")
+    parser.add_argument('--checkpoint', default='checkpoint.pkl', help="检查点文件路径")
+    parser.add_argument('--checkpoint-every', type=int, default=1000, help="检查点间隔轮数，0 表示不写检查点")
+    parser.add_argument('--resume', action='store_true', help="从检查点继续训练")
+    parser.add_argument('--timing', action='store_true', help="输出每个阶段各环节的耗时和计数")
+    parser.add_argument('--profile', action='store_true', help="用 cProfile 分析每个阶段并保存 .prof 文件")
+    parser.add_argument('--record', default=None, help="把每一局记录到该录像文件（.snkr），用 replay.py 回放")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子，相同种子得到相同的训练结果（并行模式下各局随机数相同）")
+    parser.add_argument('--keyframe-every', type=int, default=0, help="录像中每隔多少步保存一个关键帧（同时记录物品放置位置），0 表示不保存；不影响生成的对局")
+    parser.add_argument('--metrics', default='train_metrics.jsonl', help="训练指标文件（.jsonl 或 .csv）")
+    parser.add_argument('--log-every', type=int, default=100, help="每隔多少轮写一行训练指标，0 表示不写")
+    parser.add_argument('--no-plot', action='store_true', help="训练结束后不绘制学习曲线")
+    parser.add_argument('--replay', type=int, default=0, help="经验回放缓冲区容量（转移数），0 表示不使用（仅串行模式）")
+    parser.add_argument('--replay-batch', type=int, default=32, help="每次批量更新采样的转移数")
+    parser.add_argument('--replay-every', type=int, default=4, help="每隔多少步做一次批量更新")
+    args = parser.parse_args()
+
+    # 开始多阶段训练（默认总轮数30000）
+    final_agent, _ = multi_stage_train(total_episodes=args.episodes, render_every=args.render_every,
+                                       num_workers=args.workers, checkpoint_path=args.checkpoint,
+                                       checkpoint_every=args.checkpoint_every, resume=args.resume,
+                                       timing=args.timing, profile=args.profile,
+                                       record_path=args.record, keyframe_every=args.keyframe_every, seed=args.seed,
+                                       metrics_path=args.metrics, log_every=args.log_every, plot=not args.no_plot,
+                                       replay_capacity=args.replay, replay_batch=args.replay_batch,
+                                       replay_every=args.replay_every)
     # 训练完成后自动进入演示（可取消注释）
-    # demo('qtable_final.pkl')
+    # demo('qtable_final.qtb')
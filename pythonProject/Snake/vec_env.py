@@ -0,0 +1,357 @@
+import numpy as np
+from state_encoding import direction_octants, encode_state
+
+
+class VecSnakeGame:
+    """
+    批量贪吃蛇环境：用 NumPy 数组同时模拟 num_envs 个棋盘。
+    规则与 SnakeGame.step 一致（碰撞、食物/毒药、引导奖励），
+    物品生命周期使用虚拟时钟：每局从 0 开始，每一步前进 tick_ms 毫秒，
+    即与 SnakeGame(clock_mode='sim', tick_ms=tick_ms) 逐步等价。
+    step(actions) 返回 (states[N,14], rewards[N], dones[N])，结束的棋盘自动重置。
+    discrete_state=True 时 states 改为 QLAgent 的离散状态键（int64[N]，同 SnakeGame(discrete_state=True)）。
+    max_steps > 0 时走满 max_steps 步的棋盘也按结束处理（超时），蛇身占满棋盘时同 SnakeGame 一样结束，结束原因见 final_cause。
+    随机数：所有棋盘共用一个 NumPy 生成器（seed），用拒绝采样放置物品。相同 seed 和参数的 VecSnakeGame 结果可复现，
+    但与 SnakeGame（random.Random + 空格表）抽取随机数的方式不同，同一种子得到的对局与 SnakeGame 不同
+    """
+    # 动作 0-3 对应 上、下、左、右（与 SnakeGame.step 的 action_map 相同）
+    ACTION_DX = np.array([0, 0, -1, 1], dtype=np.int64)
+    ACTION_DY = np.array([-1, 1, 0, 0], dtype=np.int64)
+    # 射线方向顺序与 _get_state 中的 dirs 相同：右、左、下、上
+    RAY_DIRS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+    # final_cause 的取值：撞墙、撞到自身、超时、占满棋盘
+    CAUSE_WALL = 0
+    CAUSE_SELF = 1
+    CAUSE_TIMEOUT = 2
+    CAUSE_FULL = 3
+
+    def __init__(self, num_envs=1024, grid_size=20, poison_enabled=False, poison_immediate=False,
+                 tick_ms=100, seed=None, discrete_state=False, max_steps=0):
+        self.num_envs = num_envs
+        self.grid_size = grid_size
+        self.num_cells = grid_size * grid_size
+        self.poison_enabled = poison_enabled
+        self.poison_immediate = poison_immediate
+        self.tick_ms = tick_ms
+        self.discrete_state = discrete_state
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+
+        self.FOOD_LIFETIME = 5000
+        self.FOOD_BLINK = 3000
+        self.POISON_LIFETIME = 5000
+        self.POISON_BLINK = 3000
+        self.POISON_START_DELAY = 10000
+
+        n = num_envs
+        # 蛇身：环形缓冲区保存格子编号（y * grid_size + x），head_idx 指向蛇头
+        self.body = np.zeros((n, self.num_cells), dtype=np.int32)
+        self.head_idx = np.zeros(n, dtype=np.int64)
+        self.length = np.zeros(n, dtype=np.int64)
+        # 占用表：与蛇身同步，用于 O(1) 碰撞检测和射线检测
+        self.occupied = np.zeros((n, self.num_cells), dtype=bool)
+
+        self.head_x = np.zeros(n, dtype=np.int64)
+        self.head_y = np.zeros(n, dtype=np.int64)
+        self.dir_x = np.zeros(n, dtype=np.int64)
+        self.dir_y = np.zeros(n, dtype=np.int64)
+        self.food_x = np.zeros(n, dtype=np.int64)
+        self.food_y = np.zeros(n, dtype=np.int64)
+        self.has_poison = np.zeros(n, dtype=bool)
+        self.poison_x = np.zeros(n, dtype=np.int64)
+        self.poison_y = np.zeros(n, dtype=np.int64)
+
+        self.score = np.zeros(n, dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.foods = np.zeros(n, dtype=np.int64)
+        self.prev_food_dist = np.zeros(n, dtype=np.int64)
+
+        # 虚拟时钟（毫秒）及物品生命周期状态
+        self.time = np.zeros(n, dtype=np.int64)
+        self.food_generate_time = np.zeros(n, dtype=np.int64)
+        self.food_state = np.zeros(n, dtype=np.int8)
+        self.food_blink_start = np.zeros(n, dtype=np.int64)
+        self.poison_generate_time = np.zeros(n, dtype=np.int64)
+        self.poison_state = np.zeros(n, dtype=np.int8)
+        self.poison_blink_start = np.zeros(n, dtype=np.int64)
+
+        # 上一次 step 中结束的棋盘在重置前的得分、步数、吃到的食物数和结束原因
+        self.final_score = np.zeros(n, dtype=np.int64)
+        self.final_steps = np.zeros(n, dtype=np.int64)
+        self.final_foods = np.zeros(n, dtype=np.int64)
+        self.final_cause = np.zeros(n, dtype=np.int8)
+
+        self.reset()
+
+    def reset(self):
+        self._reset_boards(np.arange(self.num_envs))
+        return self._get_state_keys() if self.discrete_state else self._get_states()
+
+    def _reset_boards(self, idx):
+        g = self.grid_size
+        mid = g // 2
+        start_cells = np.array([mid * g + mid, mid * g + mid - 1, mid * g + mid - 2])
+
+        self.occupied[idx] = False
+        self.body[idx, :3] = start_cells
+        self.occupied[np.ix_(idx, start_cells)] = True
+        self.head_idx[idx] = 0
+        self.length[idx] = 3
+        self.head_x[idx] = mid
+        self.head_y[idx] = mid
+        self.dir_x[idx] = 1
+        self.dir_y[idx] = 0
+        self.score[idx] = 0
+        self.steps[idx] = 0
+        self.foods[idx] = 0
+
+        self.time[idx] = 0
+        self._place_food(idx)
+        self.food_generate_time[idx] = 0
+        self.food_state[idx] = 0
+        self.food_blink_start[idx] = 0
+
+        self.has_poison[idx] = False
+        if self.poison_enabled and self.poison_immediate:
+            self._place_poison(idx)
+        self.poison_generate_time[idx] = 0
+        self.poison_state[idx] = 0
+        self.poison_blink_start[idx] = 0
+
+        self.prev_food_dist[idx] = np.abs(mid - self.food_x[idx]) + np.abs(mid - self.food_y[idx])
+
+    def _sample_free_cells(self, idx, avoid_food=False):
+        """
+        为 idx 中的每个棋盘随机选一个空格（拒绝采样，分布与 _place_food/_place_poison 相同）
+        调用方须保证每个棋盘都有可选的空格，否则不会结束
+        """
+        cells = np.empty(len(idx), dtype=np.int64)
+        pending = np.arange(len(idx))
+        while len(pending) > 0:
+            boards = idx[pending]
+            cand = self.rng.integers(0, self.num_cells, size=len(pending))
+            ok = ~self.occupied[boards, cand]
+            if avoid_food:
+                ok &= cand != self.food_y[boards] * self.grid_size + self.food_x[boards]
+            cells[pending[ok]] = cand[ok]
+            pending = pending[~ok]
+        return cells
+
+    def _place_food(self, idx):
+        if len(idx) == 0:
+            return
+        cells = self._sample_free_cells(idx)
+        self.food_x[idx] = cells % self.grid_size
+        self.food_y[idx] = cells // self.grid_size
+
+    def _place_poison(self, idx):
+        # 除食物外没有空格的棋盘不放毒药（同 SnakeGame._place_poison 返回 None）
+        self.has_poison[idx] = False
+        idx = idx[self.num_cells - self.length[idx] > 1]
+        if len(idx) == 0:
+            return
+        cells = self._sample_free_cells(idx, avoid_food=True)
+        self.poison_x[idx] = cells % self.grid_size
+        self.poison_y[idx] = cells // self.grid_size
+        self.has_poison[idx] = True
+
+    def _get_states(self, idx=None):
+        if idx is None:
+            idx = np.arange(self.num_envs)
+        g = self.grid_size
+        hx, hy = self.head_x[idx], self.head_y[idx]
+        fx, fy = self.food_x[idx], self.food_y[idx]
+
+        states = np.zeros((len(idx), 14), dtype=np.float32)
+        states[:, 0] = hx / g
+        states[:, 1] = hy / g
+        states[:, 2] = fx / g
+        states[:, 3] = fy / g
+        states[:, 4] = (fx - hx) / g
+        states[:, 5] = (fy - hy) / g
+
+        # 四个方向的空格数，最多看 3 格
+        for r, (ddx, ddy) in enumerate(self.RAY_DIRS):
+            free = np.ones(len(idx), dtype=bool)
+            dist = np.zeros(len(idx), dtype=np.int64)
+            for k in range(1, 4):
+                x = hx + k * ddx
+                y = hy + k * ddy
+                in_bounds = (x >= 0) & (x < g) & (y >= 0) & (y < g)
+                cell = np.where(in_bounds, y * g + x, 0)
+                free &= in_bounds & ~self.occupied[idx, cell]
+                dist += free
+            states[:, 6 + r] = dist
+
+        p = self.has_poison[idx]
+        px, py = self.poison_x[idx], self.poison_y[idx]
+        states[:, 10] = p
+        states[:, 11] = np.where(p, (px - hx) / g, 0.0)
+        states[:, 12] = np.where(p, (py - hy) / g, 0.0)
+        states[:, 13] = np.where(p, (np.abs(px - hx) + np.abs(py - hy)) / (2 * g), 0.0)
+        return states
+
+    def _get_state_keys(self, idx=None):
+        """批量计算离散状态键，与 SnakeGame._get_state_key 逐棋盘相同（整数运算，不创建 14 维状态）"""
+        if idx is None:
+            idx = np.arange(self.num_envs)
+        g = self.grid_size
+        hx, hy = self.head_x[idx], self.head_y[idx]
+        food_dir = direction_octants(self.food_x[idx] - hx, self.food_y[idx] - hy)
+
+        # 四个方向（右、左、下、上）的距离等级依次占 2 位；占用表按一维下标访问，比二维花式索引快
+        occupied = self.occupied.reshape(-1)
+        head = idx * self.num_cells + hy * g + hx
+        danger_code = np.zeros(len(idx), dtype=np.int64)
+        for r, (ddx, ddy) in enumerate(self.RAY_DIRS):
+            free = np.ones(len(idx), dtype=bool)
+            for k in range(1, 4):
+                x = hx + k * ddx
+                y = hy + k * ddy
+                in_bounds = (x >= 0) & (x < g) & (y >= 0) & (y < g)
+                free &= in_bounds
+                free[free] = ~occupied[head[free] + k * (ddy * g + ddx)]
+                danger_code += free.astype(np.int64) << (2 * r)
+
+        p = self.has_poison[idx]
+        pdx, pdy = self.poison_x[idx] - hx, self.poison_y[idx] - hy
+        poison_dir = np.where(p, direction_octants(pdx, pdy), 8)
+        poison_dist_level = np.where(p, 5 * (np.abs(pdx) + np.abs(pdy)) // (2 * g), 5)
+        return encode_state(food_dir, danger_code, poison_dir, poison_dist_level)
+
+    def _handle_item_lifetime(self):
+        t = self.time
+
+        blinking = self.food_state == 1
+        start_blink = ~blinking & (t - self.food_generate_time > self.FOOD_LIFETIME)
+        respawn = np.nonzero(blinking & (t - self.food_blink_start > self.FOOD_BLINK))[0]
+        self.food_state[start_blink] = 1
+        self.food_blink_start[start_blink] = t[start_blink]
+        self._place_food(respawn)
+        self.food_generate_time[respawn] = t[respawn]
+        self.food_state[respawn] = 0
+
+        if self.poison_enabled:
+            # 仅在非立即模式下，且毒药不存在时，检查延迟生成（每局时钟从 0 开始）
+            if not self.poison_immediate:
+                spawn = np.nonzero(~self.has_poison & (t > self.POISON_START_DELAY))[0]
+                self._place_poison(spawn)
+                self.poison_generate_time[spawn] = t[spawn]
+                self.poison_state[spawn] = 0
+
+            blinking = self.has_poison & (self.poison_state == 1)
+            start_blink = self.has_poison & (self.poison_state == 0) & \
+                (t - self.poison_generate_time > self.POISON_LIFETIME)
+            respawn = np.nonzero(blinking & (t - self.poison_blink_start > self.POISON_BLINK))[0]
+            self.poison_state[start_blink] = 1
+            self.poison_blink_start[start_blink] = t[start_blink]
+            self._place_poison(respawn)
+            self.poison_generate_time[respawn] = t[respawn]
+            self.poison_state[respawn] = 0
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        g = self.grid_size
+        n = self.num_envs
+        all_idx = np.arange(n)
+
+        # 禁止直接掉头
+        new_dx = self.ACTION_DX[actions]
+        new_dy = self.ACTION_DY[actions]
+        reverse = (new_dx == -self.dir_x) & (new_dy == -self.dir_y)
+        self.dir_x = np.where(reverse, self.dir_x, new_dx)
+        self.dir_y = np.where(reverse, self.dir_y, new_dy)
+        nx = self.head_x + self.dir_x
+        ny = self.head_y + self.dir_y
+
+        self.steps += 1
+        self.time += self.tick_ms
+        t = self.time
+
+        self._handle_item_lifetime()
+
+        ate_food = (nx == self.food_x) & (ny == self.food_y)
+        ate_poison = self.has_poison & (nx == self.poison_x) & (ny == self.poison_y)
+
+        in_bounds = (nx >= 0) & (nx < g) & (ny >= 0) & (ny < g)
+        new_cell = np.where(in_bounds, ny * g + nx, 0)
+        collided = ~in_bounds | self.occupied[all_idx, new_cell]
+
+        rewards = np.zeros(n, dtype=np.float64)
+        rewards[collided] = -200
+
+        # 蛇头前进
+        alive = np.nonzero(~collided)[0]
+        self.head_idx[alive] = (self.head_idx[alive] - 1) % self.num_cells
+        self.body[alive, self.head_idx[alive]] = new_cell[alive]
+        self.occupied[alive, new_cell[alive]] = True
+        self.head_x[alive] = nx[alive]
+        self.head_y[alive] = ny[alive]
+
+        # 吃到食物；蛇身占满棋盘时没有空格放新食物，对局结束
+        eat_food = np.nonzero(~collided & ate_food)[0]
+        self.length[eat_food] += 1
+        self.foods[eat_food] += 1
+        self.score[eat_food] += 10
+        rewards[eat_food] = 50
+        full = np.zeros(n, dtype=bool)
+        full[eat_food] = self.length[eat_food] >= self.num_cells
+        eat_food = eat_food[~full[eat_food]]
+        self._place_food(eat_food)
+        self.food_generate_time[eat_food] = t[eat_food]
+        self.food_state[eat_food] = 0
+        self.prev_food_dist[eat_food] = np.abs(nx[eat_food] - self.food_x[eat_food]) + \
+            np.abs(ny[eat_food] - self.food_y[eat_food])
+
+        # 吃到毒药（食物优先）
+        eat_poison = np.nonzero(~collided & ~ate_food & ate_poison)[0]
+        self.length[eat_poison] += 1
+        self.score[eat_poison] -= 5
+        rewards[eat_poison] = -50
+        self._place_poison(eat_poison)
+        self.poison_generate_time[eat_poison] = t[eat_poison]
+        self.poison_state[eat_poison] = 0
+
+        # 普通移动：移除蛇尾并计算引导奖励
+        move = np.nonzero(~collided & ~ate_food & ~ate_poison)[0]
+        tail_pos = (self.head_idx[move] + self.length[move]) % self.num_cells
+        self.occupied[move, self.body[move, tail_pos]] = False
+
+        mx, my = nx[move], ny[move]
+        new_food_dist = np.abs(mx - self.food_x[move]) + np.abs(my - self.food_y[move])
+        new_poison_dist = np.abs(mx - self.poison_x[move]) + np.abs(my - self.poison_y[move])
+        has_poison = self.has_poison[move]
+
+        guide_reward = np.where(new_food_dist == 1, 0.5, np.where(new_food_dist == 2, 0.3, 0.0))
+        penalty = np.where(new_food_dist > self.prev_food_dist[move], -0.3, 0.0)
+        poison_penalty = np.where(has_poison & (new_poison_dist <= 1), -0.5,
+                                  np.where(has_poison & (new_poison_dist == 2), -0.3, 0.0))
+        guide_reward = guide_reward + np.minimum(penalty, poison_penalty)
+        rewards[move] = -0.1 + guide_reward
+        self.prev_food_dist[move] = new_food_dist
+
+        get_states = self._get_state_keys if self.discrete_state else self._get_states
+        states = get_states()
+
+        # 结束的棋盘记录最终得分和结束原因后自动重置
+        dones = collided | full
+        if self.max_steps > 0:
+            dones |= self.steps >= self.max_steps
+        done_idx = np.nonzero(dones)[0]
+        if len(done_idx) > 0:
+            self.final_score[done_idx] = self.score[done_idx]
+            self.final_steps[done_idx] = self.steps[done_idx]
+            self.final_foods[done_idx] = self.foods[done_idx]
+            self.final_cause[done_idx] = np.where(
+                collided[done_idx], np.where(in_bounds[done_idx], self.CAUSE_SELF, self.CAUSE_WALL),
+                np.where(full[done_idx], self.CAUSE_FULL, self.CAUSE_TIMEOUT))
+            self._reset_boards(done_idx)
+            states[done_idx] = get_states(done_idx)
+
+        return states, rewards, dones
+
+    def snake(self, i):
+        """返回第 i 个棋盘的蛇身坐标列表（蛇头在前），格式与 SnakeGame.snake 相同"""
+        g = self.grid_size
+        pos = (self.head_idx[i] + np.arange(self.length[i])) % self.num_cells
+        return [(int(c % g), int(c // g)) for c in self.body[i, pos]]